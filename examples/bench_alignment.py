@@ -0,0 +1,54 @@
+"""Benchmark KModel length regulation: dense alignment matmul vs index gather.
+
+KModel used to build a dense (n_tokens, n_frames) one-hot pred_aln_trg and
+expand features with two matmuls. It now gathers columns by token index.
+This script times both on random features shaped like a real chunk and
+reports the extra memory the dense path allocates.
+
+python examples/bench_alignment.py --tokens 512 --speed 0.5
+"""
+import argparse
+import time
+import torch
+
+def dense(d, t_en, pred_dur):
+    indices = torch.repeat_interleave(torch.arange(pred_dur.shape[0]), pred_dur)
+    pred_aln_trg = torch.zeros((pred_dur.shape[0], indices.shape[0]))
+    pred_aln_trg[indices, torch.arange(indices.shape[0])] = 1
+    pred_aln_trg = pred_aln_trg.unsqueeze(0)
+    return d.transpose(-1, -2) @ pred_aln_trg, t_en @ pred_aln_trg, pred_aln_trg.nbytes
+
+def gather(d, t_en, pred_dur):
+    indices = torch.repeat_interleave(torch.arange(pred_dur.shape[0]), pred_dur)
+    return d.transpose(-1, -2).index_select(-1, indices), t_en.index_select(-1, indices), indices.nbytes
+
+def bench(fn, args, repeat):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn(*args)
+    return (time.perf_counter() - start) / repeat * 1000, out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=512, help="input_ids length, including <bos>/<eos>")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    # Shapes from Kokoro-82M: d is [1, T, 640], t_en is [1, 512, T]
+    d = torch.randn(1, args.tokens, 640)
+    t_en = torch.randn(1, 512, args.tokens)
+    # Typical durations are 1-10 frames per token at speed 1
+    pred_dur = torch.round(torch.randint(1, 11, (args.tokens,)) / args.speed).clamp(min=1).long()
+
+    with torch.no_grad():
+        dense_ms, (en_a, asr_a, dense_bytes) = bench(dense, (d, t_en, pred_dur), args.repeat)
+        gather_ms, (en_b, asr_b, gather_bytes) = bench(gather, (d, t_en, pred_dur), args.repeat)
+    assert torch.allclose(en_a, en_b) and torch.allclose(asr_a, asr_b)
+
+    print(f"tokens={args.tokens} frames={int(pred_dur.sum())} speed={args.speed}")
+    print(f"dense : {dense_ms:8.2f} ms  alignment {dense_bytes / 2**20:8.2f} MiB")
+    print(f"gather: {gather_ms:8.2f} ms  indices   {gather_bytes / 2**20:8.2f} MiB")
+    print(f"speedup: {dense_ms / gather_ms:.1f}x")
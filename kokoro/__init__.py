@@ -19,5 +19,38 @@ logger.add(
 # Disable before release or as needed
 logger.disable("kokoro")
 
-from .model import KModel
-from .pipeline import KPipeline
+# Public classes are imported on first access, so that `import kokoro` (and
+# `python -m kokoro --help`) does not pay for torch, transformers, misaki or
+# huggingface_hub until they are actually used
+_LAZY = dict(
+    KModel='.model',
+    KPipeline='.pipeline',
+    KBatcher='.batcher',
+    KPool='.pool',
+    KOnnxModel='.onnx',
+    AudioCache='.cache',
+    G2PCache='.cache',
+    VoiceCache='.cache',
+)
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .model import KModel
+    from .pipeline import KPipeline
+    from .batcher import KBatcher
+    from .pool import KPool
+    from .onnx import KOnnxModel
+    from .cache import AudioCache, G2PCache, VoiceCache
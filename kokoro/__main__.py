@@ -3,7 +3,34 @@ Example usage:
 python3 -m kokoro --text "The sky above the port was the color of television, tuned to a dead channel." -o file.wav --debug
 
 echo "Bom dia mundo, como vão vocês" > text.txt
-python3 -m kokoro -i text.txt -l p --voice pm_alex > audio.wav
+python3 -m kokoro -i text.txt -l p --voice pm_alex -o audio.wav
+
+Stream WAV (or --format pcm for raw s16le at 24 kHz) to stdout as chunks finish:
+python3 -m kokoro -t "Hello world!" --stream | aplay
+
+Batch mode loads the model once and prints one JSON line per file with its real-time factor.
+Input is a directory of .txt files, or a JSONL manifest of {"text" or "input", "output", "voice"?, "speed"?}:
+python3 -m kokoro --batch texts/ --output-dir wavs/
+
+Benchmark (JSON report of TTFA, RTF, peak RSS and per-stage timings, see kokoro/bench.py):
+python3 -m kokoro bench -l a b --repeat 5
+
+Convert weights to a memory-mapped safetensors file (pip install safetensors, see kokoro/convert.py):
+python3 -m kokoro convert -o kokoro-v1_0.safetensors
+
+Check int8 or bfloat16 inference against float32 (exits 1 on failure, see kokoro/fidelity.py):
+python3 -m kokoro fidelity --quantize int8
+python3 -m kokoro fidelity --dtype bfloat16
+
+Export to ONNX and check parity with onnxruntime, for KOnnxModel (see kokoro/onnx.py):
+python3 -m kokoro export-onnx -o kokoro.onnx
+python3 -m kokoro export-onnx -o kokoro.onnx --split  # encoder and decoder graphs
+
+Pack voices into one memory-mapped voice bank for KPipeline(voice_bank=...), see kokoro/voices.py:
+python3 -m kokoro pack-voices -o voices.kvb
+
+Serve over HTTP with chunked WAV/PCM and server-sent events, see kokoro/server.py:
+python3 -m kokoro serve -l a b --port 8880
 
 Common issues:
 pip not installed: `uv pip install pip`
@@ -13,11 +40,14 @@ espeak not installed: `apt-get install espeak-ng`
 """
 
 import argparse
+import json
+import sys
+import time
 import wave
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Generator, TYPE_CHECKING
+from typing import BinaryIO, Dict, Generator, Iterator, List, Optional, TYPE_CHECKING
 
-import numpy as np
 from loguru import logger
 
 languages = [
@@ -32,40 +62,193 @@ languages = [
     "z",  # Mandarin Chinese
 ]
 
+# python3 -m kokoro <subcommand> ..., each with its own --help
+SUBCOMMANDS = {
+    "bench": "kokoro.bench",
+    "convert": "kokoro.convert",
+    "export-onnx": "kokoro.onnx",
+    "fidelity": "kokoro.fidelity",
+    "pack-voices": "kokoro.voices",
+    "serve": "kokoro.server",
+}
+
 if TYPE_CHECKING:
     from kokoro import KPipeline
 
 
+def load_pipeline(kokoro_language: str, pipelines: Dict[str, "KPipeline"]) -> "KPipeline":
+    """Return the pipeline for kokoro_language, sharing one KModel across all of them."""
+    if kokoro_language not in pipelines:
+        from kokoro import KPipeline
+
+        model = next((p.model for p in pipelines.values()), True)
+        pipelines[kokoro_language] = KPipeline(lang_code=kokoro_language, model=model)
+    return pipelines[kokoro_language]
+
+
 def generate_audio(
-    text: str, kokoro_language: str, voice: str, speed=1
+    text: str, kokoro_language: str, voice: str, speed=1, pipeline: Optional["KPipeline"] = None, prefetch: int = 0
 ) -> Generator["KPipeline.Result", None, None]:
-    from kokoro import KPipeline
-
     if not voice.startswith(kokoro_language):
         logger.warning(f"Voice {voice} is not made for language {kokoro_language}")
-    pipeline = KPipeline(lang_code=kokoro_language)
-    yield from pipeline(text, voice=voice, speed=speed, split_pattern=r"\n+")
+    if pipeline is None:
+        pipeline = load_pipeline(kokoro_language, {})
+    yield from pipeline(text, voice=voice, speed=speed, split_pattern=r"\n+", prefetch=prefetch)
+
+
+def open_wav(output_file: Path) -> wave.Wave_write:
+    wav_file = wave.open(str(output_file.resolve()), "wb")
+    wav_file.setnchannels(1)  # Mono audio
+    wav_file.setsampwidth(2)  # 2 bytes per sample (16-bit audio)
+    wav_file.setframerate(24000)  # Sample rate
+    return wav_file
 
 
 def generate_and_save_audio(
-    output_file: Path, text: str, kokoro_language: str, voice: str, speed=1
+    output_file: Path, text: str, kokoro_language: str, voice: str, speed=1, pipeline: Optional["KPipeline"] = None
 ) -> None:
-    with wave.open(str(output_file.resolve()), "wb") as wav_file:
-        wav_file.setnchannels(1)  # Mono audio
-        wav_file.setsampwidth(2)  # 2 bytes per sample (16-bit audio)
-        wav_file.setframerate(24000)  # Sample rate
+    from kokoro.audio import pcm16
 
+    with open_wav(output_file) as wav_file:
         for result in generate_audio(
-            text, kokoro_language=kokoro_language, voice=voice, speed=speed
+            text, kokoro_language=kokoro_language, voice=voice, speed=speed, pipeline=pipeline
         ):
             logger.debug(result.phonemes)
             if result.audio is None:
                 continue
-            audio_bytes = (result.audio.numpy() * 32767).astype(np.int16).tobytes()
-            wav_file.writeframes(audio_bytes)
+            wav_file.writeframes(pcm16(result.audio))
+
+
+def stream_audio(
+    text: str, kokoro_language: str, voice: str, speed=1, fmt: str = "wav", out: Optional[BinaryIO] = None
+) -> None:
+    """Write audio to out (default: stdout) as each chunk finishes."""
+    from kokoro.audio import pcm16, wav_header
+
+    out = out or sys.stdout.buffer
+    if fmt == "wav":
+        out.write(wav_header())
+    for result in generate_audio(text, kokoro_language=kokoro_language, voice=voice, speed=speed, prefetch=1):
+        if result.audio is None:
+            continue
+        out.write(pcm16(result.audio))
+        out.flush()
+
+
+def read_text(path: Path, job: dict) -> dict:
+    """Set job["text"] from path, or job["error"] if it can't be read."""
+    try:
+        job["text"] = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        job["error"] = f"{type(e).__name__}: {e}"
+    return job
+
+
+def read_batch(source: Path, output_dir: Optional[Path]) -> Iterator[dict]:
+    """
+    Yield batch jobs as dicts with text, output and optionally voice and speed.
+    A job whose input file can't be read, or a manifest line that is not valid
+    JSON with "output" and "text" or "input", has an error instead of text.
+    """
+    if source.is_dir():
+        assert output_dir is not None, "--output-dir is required with a directory of texts"
+        for path in sorted(source.glob("*.txt")):
+            yield read_text(path, dict(input=str(path), output=output_dir / f"{path.stem}.wav"))
+        return
+    with open(source, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError("expected a JSON object")
+                if "text" not in job and "input" not in job:
+                    raise KeyError("text or input")
+                output = Path(job["output"])
+            except (ValueError, KeyError, TypeError) as e:
+                yield dict(input=f"{source}:{number}", output=None, error=f"{type(e).__name__}: {e}")
+                continue
+            job["output"] = output if output_dir is None or output.is_absolute() else output_dir / output
+            yield job if "text" in job else read_text(Path(job["input"]), job)
+
+
+def write_wav(output_file: Path, frames: List[bytes]) -> None:
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open_wav(output_file) as wav_file:
+        wav_file.writeframes(b"".join(frames))
+
+
+def run_batch(
+    source: Path, output_dir: Optional[Path], kokoro_language: Optional[str], voice: str, speed=1
+) -> List[dict]:
+    """
+    Render every job of read_batch with one model. Each file is written on a
+    background thread while the next one is synthesized; a JSON line with its
+    real-time factor is printed as soon as it is written. A file that fails to
+    read, synthesize or write gets an error in its JSON line instead, and the
+    batch moves on to the next one.
+    """
+    from kokoro.audio import SAMPLE_RATE, pcm16
+
+    pipelines = {}
+    reports = []
+
+    def finish(report: dict, frames: Optional[List[bytes]]) -> None:
+        # Runs on the writer thread, so lines come out in job order
+        if frames is not None:
+            try:
+                write_wav(Path(report["output"]), frames)
+            except Exception as e:
+                report.update(error=f"{type(e).__name__}: {e}")
+        if "error" in report:
+            logger.error(f"{report['input'] or report['output']}: {report['error']}")
+        reports.append(report)
+        print(json.dumps(report), flush=True)
+
+    writing: Optional[Future] = None
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="kokoro-writer") as writer:
+        for job in read_batch(source, output_dir):
+            report = dict(input=job.get("input"), output=None if job["output"] is None else str(job["output"]))
+            error = job.get("error")
+            frames, samples = [], 0
+            start = time.perf_counter()
+            if error is None:
+                try:
+                    job_voice = job.get("voice", voice)
+                    lang = kokoro_language or job_voice[0]
+                    for result in generate_audio(
+                        job["text"], kokoro_language=lang, voice=job_voice, speed=job.get("speed", speed),
+                        pipeline=load_pipeline(lang, pipelines), prefetch=1
+                    ):
+                        if result.audio is not None:
+                            frames.append(pcm16(result.audio))
+                            samples += len(result.audio)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            if error is None:
+                wall = time.perf_counter() - start
+                report.update(
+                    audio_s=round(samples / SAMPLE_RATE, 3), wall_s=round(wall, 3),
+                    rtf=round(wall * SAMPLE_RATE / samples, 4) if samples else None
+                )
+            else:
+                report.update(error=error)
+                frames = None
+            if writing is not None:
+                writing.result()
+            writing = writer.submit(finish, report, frames)
+        if writing is not None:
+            writing.result()
+    return reports
 
 
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        import importlib
+        importlib.import_module(SUBCOMMANDS[sys.argv[1]]).main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-m",
@@ -84,8 +267,29 @@ def main() -> None:
         "--output-file",
         "--output_file",
         type=Path,
-        help="Path to output WAV file",
-        required=True,
+        help="Path to output WAV file (required unless --stream or --batch)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write audio to stdout as each chunk finishes instead of to --output-file",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["wav", "pcm"],
+        default="wav",
+        help="Format for --stream: WAV with an open-ended header, or raw s16le mono at 24 kHz",
+    )
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        help="Directory of .txt files or JSONL manifest to render with one model",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "--output_dir",
+        type=Path,
+        help="Directory for --batch outputs",
     )
     parser.add_argument(
         "-i",
@@ -116,6 +320,12 @@ def main() -> None:
         logger.level("DEBUG")
     logger.debug(args)
 
+    if args.batch is not None:
+        run_batch(args.batch, args.output_dir, args.language, args.voice, args.speed)
+        return
+    if args.output_file is None and not args.stream:
+        parser.error("one of --output-file, --stream or --batch is required")
+
     lang = args.language or args.voice[0]
 
     if args.text is not None and args.input_file is not None:
@@ -126,12 +336,15 @@ def main() -> None:
         file: Path = args.input_file
         text = file.read_text()
     else:
-        import sys
-        print("Press Ctrl+D to stop reading input and start generating", flush=True)
+        print("Press Ctrl+D to stop reading input and start generating", file=sys.stderr, flush=True)
         text = '\n'.join(sys.stdin)
 
     logger.debug(f"Input text: {text!r}")
 
+    if args.stream:
+        stream_audio(text, kokoro_language=lang, voice=args.voice, speed=args.speed, fmt=args.format)
+        return
+
     out_file: Path = args.output_file
     if not out_file.suffix == ".wav":
         logger.warning("The output file name should end with .wav")
@@ -0,0 +1,14 @@
+"""PCM and WAV encoding shared by the CLI and the HTTP server."""
+
+import struct
+
+SAMPLE_RATE = 24000
+
+def wav_header(sample_rate: int = SAMPLE_RATE) -> bytes:
+    # Length fields are unknown while streaming; 0xFFFFFFFF is what most players expect
+    return b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + b'fmt ' + struct.pack(
+        '<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16
+    ) + b'data' + struct.pack('<I', 0xFFFFFFFF)
+
+def pcm16(audio) -> bytes:
+    return (audio.clamp(-1, 1) * 32767).short().numpy().tobytes()
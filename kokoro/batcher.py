@@ -0,0 +1,165 @@
+from .model import KModel
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from loguru import logger
+from typing import List, Union
+import queue
+import threading
+import time
+import torch
+
+@dataclass
+class _Request:
+    phonemes: str
+    ref_s: torch.FloatTensor
+    speed: float
+    future: Future = field(default_factory=Future)
+    arrival: float = field(default_factory=time.monotonic)
+
+class KBatcher:
+    '''
+    KBatcher is an in-process micro-batching scheduler in front of one KModel.
+
+    Chunks submitted from many threads are grouped by phoneme length into
+    buckets, held for at most max_wait seconds, and run together through
+    KModel.forward_batch on a single worker thread.
+
+    KBatcher has the same call contract as KModel, so it can be passed as the
+    model of any number of KPipelines. Run each pipeline generator on its own
+    thread: every generator blocks on its own chunk, so results come back to
+    the right generator in the right order.
+
+        model = KModel(repo_id='hexgrad/Kokoro-82M').eval()
+        with KBatcher(model) as batcher:
+            pipeline = KPipeline(lang_code='a', model=batcher)
+            # share pipeline/batcher across request threads
+    '''
+    def __init__(
+        self,
+        model: KModel,
+        max_batch_size: int = 16,
+        max_wait: float = 0.005,
+        bucket_size: int = 64
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.bucket_size = bucket_size
+        self._queue = queue.Queue()
+        # Held across the closed check and the put, so nothing lands after the sentinel
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='KBatcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    @property
+    def repo_id(self):
+        return self.model.repo_id
+
+    @property
+    def fingerprint(self) -> str:
+        return self.model.fingerprint
+
+    def submit(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1
+    ) -> Future:
+        request = _Request(phonemes=phonemes, ref_s=ref_s, speed=speed)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('KBatcher is closed')
+            self._queue.put(request)
+        return request.future
+
+    def __call__(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        return_output: bool = False
+    ) -> Union[KModel.Output, torch.FloatTensor]:
+        output = self.submit(phonemes, ref_s, speed).result()
+        return output if return_output else output.audio
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _bucket(self, request: _Request) -> int:
+        return len(request.phonemes) // self.bucket_size
+
+    def _run(self):
+        try:
+            self._serve()
+        finally:
+            # Whatever is still queued when the worker stops would never resolve
+            while True:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is not None and request.future.set_running_or_notify_cancel():
+                    request.future.set_exception(RuntimeError('KBatcher is closed'))
+
+    def _serve(self):
+        pending: List[_Request] = []
+        closing = False
+        while pending or not closing:
+            if not pending:
+                request = self._queue.get()
+                if request is None:
+                    return
+                pending.append(request)
+            # Oldest request picks the bucket and sets the deadline
+            key = self._bucket(pending[0])
+            deadline = pending[0].arrival + self.max_wait
+            while not closing and sum(self._bucket(r) == key for r in pending) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                else:
+                    pending.append(request)
+            batch = [r for r in pending if self._bucket(r) == key][:self.max_batch_size]
+            pending = [r for r in pending if not any(r is b for b in batch)]
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Request]):
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        logger.debug(f"Running batch of {len(batch)}: {[len(r.phonemes) for r in batch]}")
+        try:
+            outputs = self.model.forward_batch(
+                [r.phonemes for r in batch],
+                torch.stack([r.ref_s.view(-1) for r in batch]),
+                [r.speed for r in batch],
+                return_output=True
+            )
+        except Exception as e:
+            for r in batch:
+                r.future.set_exception(e)
+            return
+        for r, output in zip(batch, outputs):
+            r.future.set_result(output)
@@ -0,0 +1,265 @@
+"""Kokoro benchmark suite
+Runs a fixed corpus per language through KPipeline and prints JSON with
+time-to-first-audio, real-time factor, chunks/s, peak RSS and a per-stage
+time breakdown, so that builds can be compared run to run.
+
+python3 -m kokoro bench
+python3 -m kokoro bench -l a b --repeat 5 --device cpu -o bench.json
+python3 -m kokoro bench -l a -i demo/gatsby5k.md
+python3 -m kokoro bench -l a --device cpu --quantize int8
+python3 -m kokoro bench -l a --device cpu --dtype bfloat16
+python3 -m kokoro bench -l a --compile
+"""
+
+from collections import defaultdict
+from . import __version__
+from .profiling import StageEvent
+from loguru import logger
+from typing import Callable, Dict, List, Optional
+import argparse
+import functools
+import inspect
+import json
+import platform
+import statistics
+import sys
+import time
+import torch
+
+SAMPLE_RATE = 24000
+
+# Short fixed paragraphs, one line per chunk, so TTFA covers a single chunk
+CORPORA = dict(
+    a=(
+        "In my younger and more vulnerable years my father gave me some advice that I've been turning over in my mind ever since.\n"
+        "Whenever you feel like criticizing anyone, he told me, just remember that all the people in this world haven't had the advantages that you've had.\n"
+        "He didn't say any more, but we've always been unusually communicative in a reserved way, and I understood that he meant a great deal more than that."
+    ),
+    b=(
+        "You will rejoice to hear that no disaster has accompanied the commencement of an enterprise which you have regarded with such evil forebodings.\n"
+        "I arrived here yesterday, and my first task is to assure my dear sister of my welfare and increasing confidence in the success of my undertaking.\n"
+        "I am already far north of London, and as I walk in the streets of Petersburgh, I feel a cold northern breeze play upon my cheeks."
+    ),
+    e=(
+        "En un lugar de la Mancha, de cuyo nombre no quiero acordarme, no ha mucho tiempo que vivía un hidalgo de los de lanza en astillero.\n"
+        "Tenía en su casa una ama que pasaba de los cuarenta, y una sobrina que no llegaba a los veinte."
+    ),
+    f=(
+        "Longtemps, je me suis couché de bonne heure. Parfois, à peine ma bougie éteinte, mes yeux se fermaient si vite que je n'avais pas le temps de me dire: je m'endors.\n"
+        "Et, une demi-heure après, la pensée qu'il était temps de chercher le sommeil m'éveillait."
+    ),
+    h=(
+        "भारत एक विशाल देश है जहाँ अनेक भाषाएँ बोली जाती हैं और अनेक संस्कृतियाँ एक साथ रहती हैं।\n"
+        "हर सुबह लोग अपने काम पर निकलते हैं और शाम को परिवार के साथ समय बिताते हैं।"
+    ),
+    i=(
+        "Nel mezzo del cammin di nostra vita mi ritrovai per una selva oscura, ché la diritta via era smarrita.\n"
+        "Ahi quanto a dir qual era è cosa dura esta selva selvaggia e aspra e forte che nel pensier rinova la paura!"
+    ),
+    p=(
+        "Uma noite destas, vindo da cidade para o Engenho Novo, encontrei no trem da Central um rapaz aqui do bairro, que eu conheço de vista e de chapéu.\n"
+        "Cumprimentou-me, sentou-se ao pé de mim, falou da lua e dos ministros, e acabou recitando-me versos."
+    ),
+    j=(
+        "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。\n"
+        "何でも薄暗いじめじめした所でニャーニャー泣いていた事だけは記憶している。"
+    ),
+    z=(
+        "我们的生活充满了各种各样的挑战和机遇，每一天都是一个新的开始。\n"
+        "只要我们坚持努力，就一定能够实现自己的梦想。"
+    ),
+)
+
+VOICES = dict(a='af_heart', b='bf_emma', e='ef_dora', f='ff_siwis', h='hf_alpha', i='if_sara', p='pf_dora', j='jf_alpha', z='zf_xiaobei')
+
+class StageTimer:
+    '''
+    Wall time per named stage, from KModel StageEvents (as a profiler
+    callback) and by wrapping bound methods on the given instances. Stages
+    nest: stft runs inside generator, so totals are inclusive and do not add
+    up to the chunk time. Generator methods (en_tokenize) are timed across
+    all of their steps.
+    '''
+    def __init__(self, sync: Optional[Callable[[], None]] = None):
+        self.sync = sync or (lambda: None)
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._patched = []
+
+    def __call__(self, event: StageEvent):
+        self.totals[event.name] += event.duration
+        self.calls[event.name] += 1
+
+    def wrap(self, obj, name: str, stage: str):
+        fn = getattr(obj, name)
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                gen = fn(*args, **kwargs)
+                self.calls[stage] += 1
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        self.totals[stage] += time.perf_counter() - start
+                        return
+                    self.totals[stage] += time.perf_counter() - start
+                    yield item
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self.sync()
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.sync()
+                    self.totals[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def reset(self):
+        self.totals.clear()
+        self.calls.clear()
+
+    def restore(self):
+        for obj, name, original in reversed(self._patched):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self._patched.clear()
+
+def instrument(pipeline, sync=None) -> StageTimer:
+    timer = StageTimer(sync)
+    timer.wrap(pipeline, 'g2p', 'g2p')
+    if pipeline.lang_code in 'ab':
+        timer.wrap(pipeline, 'en_tokenize', 'en_tokenize')
+    model = pipeline.model
+    stft = model.decoder.generator.stft
+    timer.wrap(stft, 'transform', 'stft')
+    timer.wrap(stft, 'inverse', 'stft')
+    return timer
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return rss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def run_once(pipeline, text: str, voice: str, speed: float) -> dict:
+    start = time.perf_counter()
+    ttfa = None
+    chunks = samples = 0
+    for result in pipeline(text, voice=voice, speed=speed, split_pattern=r'\n+'):
+        if result.audio is None:
+            continue
+        if ttfa is None:
+            ttfa = time.perf_counter() - start
+        chunks += 1
+        samples += len(result.audio)
+    return dict(wall=time.perf_counter() - start, ttfa=ttfa, chunks=chunks, samples=samples)
+
+def bench_language(model, lang_code: str, text: str, voice: str, repeat: int, warmup: int, speed: float) -> dict:
+    from .pipeline import KPipeline
+    pipeline = KPipeline(lang_code=lang_code, repo_id=model.repo_id, model=model)
+    sync = torch.cuda.synchronize if model.device.type == 'cuda' else None
+    for _ in range(warmup):
+        run_once(pipeline, text.splitlines()[0], voice, speed)
+    timer = instrument(pipeline, sync)
+    runs, stages = [], defaultdict(list)
+    try:
+        with model.profile(timer):
+            for _ in range(repeat):
+                timer.reset()
+                runs.append(run_once(pipeline, text, voice, speed))
+                for stage, total in timer.totals.items():
+                    stages[stage].append(total)
+    finally:
+        timer.restore()
+    wall = statistics.median(r['wall'] for r in runs)
+    audio = runs[0]['samples'] / SAMPLE_RATE
+    chunks = runs[0]['chunks']
+    return dict(
+        voice=voice,
+        chars=len(text),
+        chunks=chunks,
+        audio_s=round(audio, 3),
+        wall_s=round(wall, 4),
+        ttfa_ms=round(1000 * statistics.median(r['ttfa'] for r in runs if r['ttfa'] is not None), 2) if chunks else None,
+        rtf=round(wall / audio, 4) if audio else None,
+        chunks_per_s=round(chunks / wall, 3) if wall else None,
+        stages_ms={k: round(1000 * statistics.median(v), 2) for k, v in stages.items()},
+        calls=dict(timer.calls),
+    )
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(prog='kokoro bench', description='Benchmark KPipeline per language and print JSON')
+    parser.add_argument('-l', '--language', nargs='+', default=list(CORPORA), choices=list(CORPORA),
+                        help='Languages to run (default: all)')
+    parser.add_argument('-i', '--input-file', '--input_file', help='Use this text for every language instead of the built-in corpus')
+    parser.add_argument('-m', '--voice', help='Voice to use for every language (default: one per language)')
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--device', help="'cpu', 'cuda' or 'mps' (default: auto)")
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per language; medians are reported')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per language')
+    parser.add_argument('-s', '--speed', type=float, default=1.0)
+    parser.add_argument('--quantize', choices=['int8'], help='Quantize the model (CPU only, see KModel.quantize)')
+    parser.add_argument('--dtype', choices=['bfloat16', 'float16'], help='Run the model in this dtype (see KModel.set_dtype)')
+    parser.add_argument('--compile', action='store_true', help='torch.compile with length buckets, compiled before timing (see KModel.compile)')
+    parser.add_argument('-o', '--output-file', '--output_file', help='Also write the JSON report here')
+    args = parser.parse_args(argv)
+
+    from .model import KModel
+    device = args.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    start = time.perf_counter()
+    model = KModel(repo_id=args.repo_id).to(device).prepare_for_inference()
+    if args.dtype:
+        model.set_dtype(args.dtype)
+    if args.quantize:
+        model.quantize(args.quantize)
+    if args.compile:
+        model.compile(warmup=True)
+    load_s = time.perf_counter() - start
+    text = open(args.input_file, encoding='utf-8').read().strip() if args.input_file else None
+
+    results = {}
+    for lang_code in args.language:
+        try:
+            results[lang_code] = bench_language(
+                model, lang_code, text or CORPORA[lang_code], args.voice or VOICES[lang_code],
+                args.repeat, args.warmup, args.speed
+            )
+        except Exception as e:
+            logger.warning(f"Skipping {lang_code!r}: {e!r}")
+            results[lang_code] = dict(error=repr(e))
+
+    report = dict(
+        kokoro=__version__,
+        torch=torch.__version__,
+        python=platform.python_version(),
+        machine=platform.machine(),
+        device=device,
+        quantize=args.quantize,
+        dtype=args.dtype,
+        compile_s=round(sum(model.compile_stats.values()), 3) if args.compile else None,
+        threads=torch.get_num_threads(),
+        model_load_s=round(load_s, 3),
+        peak_rss_mb=peak_rss_mb(),
+        cuda_peak_mb=torch.cuda.max_memory_allocated() / 2**20 if device == 'cuda' else None,
+        languages=results,
+    )
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    print(out)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(out + '\n')
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
+import hashlib
+import json
+import numpy as np
+import os
+import sqlite3
+import threading
+import time
+import torch
+
+if TYPE_CHECKING:
+    from .model import KModel
+
+def file_digest(path: str, sample: int = 1 << 20) -> str:
+    '''
+    Cheap content id of a large file: sha256 of its size and first and last
+    sample bytes, so the same checkpoint gets the same id on every host.
+    '''
+    h = hashlib.sha256()
+    size = os.path.getsize(path)
+    h.update(str(size).encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(sample))
+        f.seek(max(size - sample, 0))
+        h.update(f.read(sample))
+    return h.hexdigest()[:16]
+
+class G2PCache:
+    '''
+    G2PCache is a two-tier string cache for KPipeline G2P results:
+    1. A bounded in-memory LRU of up to maxsize entries
+    2. An optional SQLite file at path, shared safely by many processes
+
+    Keys are tuples of JSON-serializable parts and values are strings;
+    KPipeline owns the (de)serialization of phonemes and tokens, so any object
+    with the same get/put methods can be plugged in instead.
+
+    Counters: hits (memory), disk_hits and misses.
+    '''
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = self.disk_hits = self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        # Connections must not cross a fork, so each process opens its own
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def _remember(self, key: str, value: str):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key: tuple) -> Optional[str]:
+        key = json.dumps(key, ensure_ascii=False)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            db = self._connect()
+            row = db.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone() if db else None
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: tuple, value: str):
+        key = json.dumps(key, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value)
+            db = self._connect()
+            if db:
+                db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', (key, value))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._connect()
+            if db:
+                db.execute('DELETE FROM cache')
+
+    @property
+    def stats(self) -> dict:
+        return dict(hits=self.hits, disk_hits=self.disk_hits, misses=self.misses, size=len(self._memory))
+
+class AudioCache:
+    '''
+    AudioCache is a content-addressed cache of KModel.Output, used by KPipeline
+    to skip model calls for chunks it has already rendered:
+    1. A bounded in-memory LRU holding at most max_bytes of encoded audio
+    2. An optional SQLite file at path, evicted least recently used first once
+       it holds more than max_disk_bytes (unbounded if None)
+
+    Keys hash the phonemes, the selected ref_s row, the speed, the model's
+    fingerprint (weights, dtype, quantization, backend, see KModel.fingerprint)
+    and the seed. Audio is stored as dtype 'float32', 'float16' or 'int16',
+    with pred_dur.
+
+    Apart from the random phase and noise in SineGen, audio is a function of
+    its key. Use KPipeline(seed=...) so that cached and fresh renders agree;
+    unseeded renders never share entries with seeded ones. The default
+    float16 storage is lossy (about 2e-4 relative), so a hit is close to but
+    not identical with a fresh render; only dtype='float32' returns exactly
+    the audio that was rendered.
+    '''
+    DTYPES = dict(float32=np.float32, float16=np.float16, int16=np.int16)
+
+    def __init__(
+        self,
+        max_bytes: int = 256 << 20,
+        path: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None,
+        dtype: str = 'float16'
+    ):
+        assert dtype in self.DTYPES, (dtype, list(self.DTYPES))
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.dtype = dtype
+        self.hits = self.disk_hits = self.misses = 0
+        self.nbytes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    @staticmethod
+    def key(
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float,
+        model_id: Optional[str],
+        seed: Optional[int] = None
+    ) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps([phonemes, float(speed), model_id, seed], ensure_ascii=False).encode())
+        h.update(ref_s.detach().float().cpu().numpy().tobytes())
+        return h.hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS audio (key TEXT PRIMARY KEY, dtype TEXT NOT NULL, '
+                'audio BLOB NOT NULL, pred_dur BLOB, size INTEGER NOT NULL, used REAL NOT NULL)'
+            )
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def _encode(self, output: KModel.Output) -> Tuple[str, bytes, Optional[bytes]]:
+        audio = output.audio.detach().float().cpu().numpy()
+        if self.dtype == 'int16':
+            audio = np.round(np.clip(audio, -1, 1) * 32767)
+        audio = audio.astype(self.DTYPES[self.dtype]).tobytes()
+        pred_dur = None if output.pred_dur is None else output.pred_dur.cpu().numpy().astype(np.int32).tobytes()
+        return self.dtype, audio, pred_dur
+
+    def _decode(self, dtype: str, audio: bytes, pred_dur: Optional[bytes]) -> KModel.Output:
+        from .model import KModel
+        audio = np.frombuffer(audio, dtype=self.DTYPES[dtype]).astype(np.float32)
+        if dtype == 'int16':
+            audio /= 32767
+        if pred_dur is not None:
+            pred_dur = torch.from_numpy(np.frombuffer(pred_dur, dtype=np.int32).astype(np.int64))
+        return KModel.Output(audio=torch.from_numpy(audio), pred_dur=pred_dur)
+
+    def _remember(self, key: str, entry: Tuple[str, bytes, Optional[bytes]]):
+        if key in self._memory:
+            self.nbytes -= self._size(self._memory.pop(key))
+        self._memory[key] = entry
+        self.nbytes += self._size(entry)
+        while self.nbytes > self.max_bytes and self._memory:
+            self.nbytes -= self._size(self._memory.popitem(last=False)[1])
+
+    @staticmethod
+    def _size(entry: Tuple[str, bytes, Optional[bytes]]) -> int:
+        return len(entry[1]) + len(entry[2] or b'')
+
+    def get(self, key: str) -> Optional[KModel.Output]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._decode(*self._memory[key])
+            db = self._connect()
+            row = db.execute('SELECT dtype, audio, pred_dur FROM audio WHERE key = ?', (key,)).fetchone() if db else None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute('UPDATE audio SET used = ? WHERE key = ?', (time.time(), key))
+            self.disk_hits += 1
+            self._remember(key, row)
+            return self._decode(*row)
+
+    def put(self, key: str, output: KModel.Output):
+        entry = self._encode(output)
+        with self._lock:
+            self._remember(key, entry)
+            db = self._connect()
+            if db:
+                db.execute(
+                    'INSERT OR REPLACE INTO audio (key, dtype, audio, pred_dur, size, used) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, *entry, self._size(entry), time.time())
+                )
+                self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection):
+        if self.max_disk_bytes is None:
+            return
+        excess = db.execute('SELECT COALESCE(SUM(size), 0) FROM audio').fetchone()[0] - self.max_disk_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in db.execute('SELECT key, size FROM audio ORDER BY used'):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany('DELETE FROM audio WHERE key = ?', stale)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.nbytes = 0
+            db = self._connect()
+            if db:
+                db.execute('DELETE FROM audio')
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            hits=self.hits, disk_hits=self.disk_hits, misses=self.misses,
+            size=len(self._memory), nbytes=self.nbytes
+        )
+
+class VoiceCache:
+    '''
+    VoiceCache is the bounded LRU behind KPipeline.load_voice. It holds voice
+    packs (single voices and blends) already moved to the device they are used
+    on, keyed by (voice spec, device), so repeated requests neither reload nor
+    copy them. Entries are evicted least recently used first once there are
+    more than maxsize, or once they hold more than max_bytes (if set).
+
+    Counters: hits, misses and evictions.
+    '''
+    def __init__(self, maxsize: int = 64, max_bytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(pack) -> int:
+        # Lazy packs such as BankVoice hold no tensor memory of their own
+        return pack.numel() * pack.element_size() if isinstance(pack, torch.Tensor) else 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, pack):
+        with self._lock:
+            if key in self._memory:
+                self.nbytes -= self._size(self._memory.pop(key))
+            self._memory[key] = pack
+            self.nbytes += self._size(pack)
+            while len(self._memory) > 1 and (
+                len(self._memory) > self.maxsize or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                _, evicted = self._memory.popitem(last=False)
+                self.nbytes -= self._size(evicted)
+                self.evictions += 1
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._memory
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self._memory), nbytes=self.nbytes)
@@ -0,0 +1,33 @@
+"""Convert a Kokoro .pth checkpoint to safetensors
+The output is loaded by KModel(model='....safetensors') through a read-only
+memory map instead of torch.load, so loading is near instant and prefork
+workers share a single physical copy of the weights. By default the weights
+are saved with weight_norm already folded (see KModel.prepare_for_inference).
+
+python3 -m kokoro convert -o kokoro-v1_0.safetensors
+python3 -m kokoro convert --repo-id hexgrad/Kokoro-82M-v1.1-zh --model kokoro-v1_1-zh.pth -o kokoro-v1_1-zh.safetensors
+"""
+
+from typing import List, Optional
+import argparse
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='kokoro convert', description='Convert a .pth checkpoint to safetensors')
+    parser.add_argument('-o', '--output-file', '--output_file', required=True, help='Path to the .safetensors file to write')
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--config', help='Path to config.json (default: download from --repo-id)')
+    parser.add_argument('--model', help='Path to the .pth checkpoint (default: download from --repo-id)')
+    parser.add_argument('--no-fold', action='store_true', help='Keep weight_norm parametrizations')
+    args = parser.parse_args(argv)
+
+    from .model import KModel
+    from .modules import save_safetensors
+    assert args.output_file.endswith('.safetensors'), args.output_file
+    model = KModel(repo_id=args.repo_id, config=args.config, model=args.model).eval()
+    if not args.no_fold:
+        model.prepare_for_inference()
+    save_safetensors(model, args.output_file, metadata=dict(repo_id=args.repo_id))
+    print(args.output_file)
+
+if __name__ == '__main__':
+    main()
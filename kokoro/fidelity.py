@@ -0,0 +1,152 @@
+"""Audio fidelity check for reduced-precision models
+Renders a fixed phoneme corpus with a float32 reference KModel and with a
+candidate (e.g. quantize='int8'), under the same random seed, and reports how
+far the candidate drifts and how much faster it is. Exits 1 if the candidate
+fails the thresholds, so it can gate CI or a deploy.
+
+python3 -m kokoro fidelity --quantize int8
+python3 -m kokoro fidelity --dtype bfloat16
+python3 -m kokoro fidelity --quantize int8 --max-lsd 1.5 --threads 4 -o fidelity.json
+
+Metrics, per corpus line and overall:
+duration_match  fraction of tokens whose predicted duration (in frames) is
+                identical to the reference
+lsd_db          log-spectral distance in dB over lines whose durations all
+                match (otherwise the two waveforms are not time-aligned)
+speedup         reference wall time / candidate wall time
+"""
+
+from loguru import logger
+from typing import List, Optional
+import argparse
+import json
+import statistics
+import sys
+import time
+import torch
+
+# Phonemes rather than text, so the check does not depend on G2P versions
+CORPUS = [
+    "ðə skˈI əbˈʌv ðə pˈɔɹt wʌz ðə kˈʌlɚ ʌv tˈɛləvˌɪʒən, tˈund tə ə dˈɛd ʧˈænᵊl.",
+    "ɪn mI jˈʌŋɡɚ ænd mˈɔɹ vˈʌlnɚəbᵊl jˈɪɹz mI fˈɑðɚ ɡˈAv mi sˈʌm ədvˈIs.",
+    "hˈɛlO! wˌʌn, tˈu, θɹˈi; ˈIm ɹˈɛdi wɛn jˈʊɹ ɹˈɛdi?",
+    "ʃˈi sˈɛlz sˈi ʃˈɛlz bI ðə sˈi ʃˈɔɹ, ænd ðə ʃˈɛlz ʃi sˈɛlz ɑɹ ʃˈʊɹli sˈi ʃˈɛlz.",
+    "ðə kwˈɪk bɹˈWn fˈɑks ʤˈʌmps ˌOvɚ ðə lˈAzi dˈɔɡ.",
+]
+
+def log_spectral_distance(a: torch.FloatTensor, b: torch.FloatTensor, n_fft: int = 1024, hop: int = 256) -> float:
+    '''Mean over frames of the RMS difference of the log power spectra, in dB.'''
+    n = min(len(a), len(b))
+    window = torch.hann_window(n_fft)
+    spectra = [
+        torch.stft(x[:n].float().cpu(), n_fft, hop, window=window, return_complex=True).abs().pow(2).clamp(min=1e-10).log10() * 10
+        for x in (a, b)
+    ]
+    return (spectra[0] - spectra[1]).pow(2).mean(dim=0).sqrt().mean().item()
+
+def render(model, ref_s: torch.FloatTensor, phonemes: str, speed: float, seed: int):
+    # The generator's sine source draws random phases and noise
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)
+        with torch.no_grad():
+            return model(phonemes, ref_s, speed, return_output=True)
+
+def compare(
+    reference,
+    candidate,
+    pack: torch.FloatTensor,
+    corpus: List[str] = CORPUS,
+    speed: float = 1,
+    seed: int = 0,
+    repeat: int = 3
+) -> dict:
+    '''
+    Render every line of corpus with both models, return per-line and overall
+    metrics (see module docstring). Wall times are medians over repeat runs.
+    '''
+    lines = []
+    times = dict(reference=[], candidate=[])
+    for phonemes in corpus:
+        ref_s = pack[len(phonemes) - 1]
+        outputs = {}
+        for name, model in (('reference', reference), ('candidate', candidate)):
+            walls = []
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                outputs[name] = render(model, ref_s, phonemes, speed, seed)
+                walls.append(time.perf_counter() - start)
+            times[name].append(statistics.median(walls))
+        ref, out = outputs['reference'], outputs['candidate']
+        match = (ref.pred_dur == out.pred_dur).float().mean().item()
+        lines.append(dict(
+            phonemes=phonemes,
+            duration_match=round(match, 4),
+            lsd_db=round(log_spectral_distance(ref.audio, out.audio), 3) if match == 1 else None,
+            audio_s=round(len(ref.audio) / 24000, 3),
+        ))
+    lsd = [line['lsd_db'] for line in lines if line['lsd_db'] is not None]
+    return dict(
+        duration_match=round(statistics.mean(line['duration_match'] for line in lines), 4),
+        lsd_db=round(statistics.mean(lsd), 3) if lsd else None,
+        lsd_lines=len(lsd),
+        reference_s=round(sum(times['reference']), 4),
+        candidate_s=round(sum(times['candidate']), 4),
+        speedup=round(sum(times['reference']) / sum(times['candidate']), 3),
+        lines=lines,
+    )
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(prog='kokoro fidelity', description='Compare a reduced-precision KModel against float32')
+    parser.add_argument('--quantize', choices=['int8'], help='Quantize the candidate (see KModel.quantize)')
+    parser.add_argument('--dtype', choices=['bfloat16', 'float16'], help='Run the candidate in this dtype (see KModel.set_dtype)')
+    parser.add_argument('-m', '--voice', default='af_heart')
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--model', help='Path to a .pth or .safetensors checkpoint (default: download from --repo-id)')
+    parser.add_argument('--threads', type=int, help='torch intra-op threads (default: torch default)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per line; medians are reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-lsd', '--max_lsd', type=float, default=2.0, help='Fail above this mean LSD in dB')
+    parser.add_argument('--min-duration-match', '--min_duration_match', type=float, default=0.95,
+                        help='Fail below this fraction of matching token durations')
+    parser.add_argument('-o', '--output-file', '--output_file', help='Also write the JSON report here')
+    args = parser.parse_args(argv)
+    if not (args.quantize or args.dtype):
+        parser.error('one of --quantize or --dtype is required')
+
+    from huggingface_hub import hf_hub_download
+    from .model import KModel
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    reference = KModel(repo_id=args.repo_id, model=args.model).prepare_for_inference()
+    # Fold weight_norm in float32 before any cast
+    candidate = KModel(repo_id=args.repo_id, model=args.model).prepare_for_inference()
+    if args.dtype:
+        candidate.set_dtype(args.dtype)
+    if args.quantize:
+        candidate.quantize(args.quantize)
+    pack = torch.load(hf_hub_download(repo_id=args.repo_id, filename=f'voices/{args.voice}.pt'), weights_only=True)
+
+    # Untimed pass so one-off allocations and packing do not count
+    compare(reference, candidate, pack, CORPUS[:1], seed=args.seed, repeat=1)
+    report = compare(reference, candidate, pack, seed=args.seed, repeat=args.repeat)
+    failures = []
+    if report['lsd_db'] is None or report['lsd_db'] > args.max_lsd:
+        failures.append(f"lsd_db {report['lsd_db']} > {args.max_lsd}")
+    if report['duration_match'] < args.min_duration_match:
+        failures.append(f"duration_match {report['duration_match']} < {args.min_duration_match}")
+    report = dict(
+        quantize=args.quantize, dtype=args.dtype, voice=args.voice, torch=torch.__version__, threads=torch.get_num_threads(),
+        passed=not failures, failures=failures, **report
+    )
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    print(out)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(out + '\n')
+    if failures:
+        logger.error(f"Fidelity check failed: {failures}")
+        sys.exit(1)
+    return report
+
+if __name__ == '__main__':
+    main()
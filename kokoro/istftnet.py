@@ -1,6 +1,9 @@
 # ADAPTED from https://github.com/yl4579/StyleTTS2/blob/main/Modules/istftnet.py
+from dataclasses import dataclass, field
 from kokoro.custom_stft import CustomSTFT
 from torch.nn.utils.parametrizations import weight_norm
+from typing import Dict
+import functools
 import math
 import torch
 import torch.nn as nn
@@ -16,6 +19,38 @@ def init_weights(m, mean=0.0, std=0.01):
 def get_padding(kernel_size, dilation=1):
     return int((kernel_size*dilation - dilation)/2)
 
+def length_to_mask(lengths, max_len):
+    # True at padded positions, same convention as text_mask in KModel
+    return torch.arange(max_len, device=lengths.device).unsqueeze(0) >= lengths.unsqueeze(-1)
+
+
+def full_precision(fn):
+    '''
+    Run fn in float32 whatever the model dtype (see KModel.set_dtype): every
+    floating tensor argument is upcast, and outputs are left in float32 for
+    the caller to cast back where it feeds reduced-precision layers.
+    '''
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        args = [a.float() if torch.is_tensor(a) and a.is_floating_point() else a for a in args]
+        kwargs = {k: v.float() if torch.is_tensor(v) and v.is_floating_point() else v for k, v in kwargs.items()}
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@dataclass
+class Style:
+    '''
+    A [1, style_dim] style vector with its projections precomputed for one
+    voice pack row (see prepare_style). Style-conditioned modules accept it in
+    place of the plain tensor: AdaIN1d and AdaLayerNorm read fc(s) from h,
+    and an LSTM whose input ends with s is swapped for its entry in lstm,
+    which takes the other inputs only and has s folded into bias_ih.
+    '''
+    s: torch.FloatTensor
+    h: Dict[nn.Module, torch.FloatTensor] = field(default_factory=dict)
+    lstm: Dict[nn.Module, nn.LSTM] = field(default_factory=dict)
+
 
 class AdaIN1d(nn.Module):
     def __init__(self, style_dim, num_features):
@@ -24,11 +59,20 @@ class AdaIN1d(nn.Module):
         self.norm = nn.InstanceNorm1d(num_features, affine=True)
         self.fc = nn.Linear(style_dim, num_features*2)
 
-    def forward(self, x, s):
-        h = self.fc(s)
+    def forward(self, x, s, m=None):
+        h = s.h[self] if isinstance(s, Style) else self.fc(s)
         h = h.view(h.size(0), h.size(1), 1)
         gamma, beta = torch.chunk(h, chunks=2, dim=1)
-        return (1 + gamma) * self.norm(x) + beta
+        if m is None:
+            return (1 + gamma) * self.norm(x) + beta
+        # Padded batch: instance statistics over valid frames only, pads zeroed
+        keep = (~m).type_as(x)
+        n = keep.sum(-1, keepdim=True).clamp(min=1)
+        mean = (x * keep).sum(-1, keepdim=True) / n
+        var = (((x - mean) * keep) ** 2).sum(-1, keepdim=True) / n
+        x = (x - mean) * torch.rsqrt(var + self.norm.eps)
+        x = x * self.norm.weight.view(1, -1, 1) + self.norm.bias.view(1, -1, 1)
+        return ((1 + gamma) * x + beta).masked_fill(m, 0.0)
 
 
 class AdaINResBlock1(nn.Module):
@@ -65,12 +109,12 @@ class AdaINResBlock1(nn.Module):
         self.alpha1 = nn.ParameterList([nn.Parameter(torch.ones(1, channels, 1)) for i in range(len(self.convs1))])
         self.alpha2 = nn.ParameterList([nn.Parameter(torch.ones(1, channels, 1)) for i in range(len(self.convs2))])
 
-    def forward(self, x, s):
+    def forward(self, x, s, m=None):
         for c1, c2, n1, n2, a1, a2 in zip(self.convs1, self.convs2, self.adain1, self.adain2, self.alpha1, self.alpha2):
-            xt = n1(x, s)
+            xt = n1(x, s, m)
             xt = xt + (1 / a1) * (torch.sin(a1 * xt) ** 2)  # Snake1D
             xt = c1(xt)
-            xt = n2(xt, s)
+            xt = n2(xt, s, m)
             xt = xt + (1 / a2) * (torch.sin(a2 * xt) ** 2)  # Snake1D
             xt = c2(xt)
             x = xt + x
@@ -136,7 +180,7 @@ class SineGen(nn.Module):
 
     def _f02uv(self, f0):
         # generate uv signal
-        uv = (f0 > self.voiced_threshold).type(torch.float32)
+        uv = (f0 > self.voiced_threshold).type_as(f0)
         return uv
 
     def _f02sine(self, f0_values):
@@ -182,6 +226,7 @@ class SineGen(nn.Module):
             sines = torch.cos(i_phase * 2 * torch.pi)
         return sines
 
+    @full_precision
     def forward(self, f0):
         """ sine_tensor, uv = forward(f0)
         input F0: tensor(batchsize=1, length, dim=1)
@@ -189,9 +234,8 @@ class SineGen(nn.Module):
         output sine_tensor: tensor(batchsize=1, length, dim)
         output uv: tensor(batchsize=1, length, 1)
         """
-        f0_buf = torch.zeros(f0.shape[0], f0.shape[1], self.dim, device=f0.device)
         # fundamental component
-        fn = torch.multiply(f0, torch.FloatTensor([[range(1, self.harmonic_num + 2)]]).to(f0.device))
+        fn = torch.multiply(f0, torch.arange(1, self.harmonic_num + 2, dtype=f0.dtype, device=f0.device))
         # generate sine waveforms
         sine_waves = self._f02sine(fn) * self.sine_amp
         # generate uv signal
@@ -296,32 +340,107 @@ class Generator(nn.Module):
             else TorchSTFT(filter_length=gen_istft_n_fft, hop_length=gen_istft_hop_size, win_length=gen_istft_n_fft)
         )
 
-    def forward(self, x, s, f0):
+    def _source(self, f0):
         with torch.no_grad():
             f0 = self.f0_upsamp(f0[:, None]).transpose(1, 2)  # bs,n,t
             har_source, noi_source, uv = self.m_source(f0)
             har_source = har_source.transpose(1, 2).squeeze(1)
-            har_spec, har_phase = self.stft.transform(har_source)
-            har = torch.cat([har_spec, har_phase], dim=1)
+            # The source and both STFTs run in float32 (see KModel.set_dtype)
+            har_spec, har_phase = self.stft.transform(har_source.float())
+            return torch.cat([har_spec, har_phase], dim=1)
+
+    def source(self, f0, m=None):
+        ''' Harmonic source spectrum for f0, at x's rate (see _generate)
+        With a padded batch (m True past each row's end), each row is built
+        from its own frames and zero padded, as forward would see it alone:
+        the sine phase interpolation and the STFT's edge padding near the end
+        of a row depend on what follows it, and noise_convs read past it.
+        '''
+        if m is None:
+            return self._source(f0)
+        lengths = (~m).sum(-1).flatten().tolist()
+        rows = [self._source(f0[i:i+1, :n]) for i, n in enumerate(lengths)]
+        width = f0.shape[-1] * ((rows[0].shape[-1] - 1) // lengths[0]) + 1
+        return torch.cat([F.pad(row, (0, width - row.shape[-1])) for row in rows])
+
+    def forward(self, x, s, f0, m=None):
+        return self._generate(x, s, self.source(f0, m), m)
+
+    def stream(self, x, s, f0, window=80, overlap=8):
+        """ Yields the waveform of forward(x, s, f0) in pieces
+        window: input frames generated per piece
+        overlap: context frames on each side of a window; the middle half of
+            the overlap is crossfaded between neighbouring windows
+        The harmonic source is built once for the whole chunk so phase stays
+        continuous across pieces. Peak activation memory is bounded by
+        window + 2 * overlap frames. Instance norm statistics are per window,
+        so pieces match forward exactly only when one window covers x;
+        otherwise they drift by a few percent, which a wider overlap does not
+        fix (whole-chunk statistics would need the whole chunk generated).
+        """
+        har = self._source(f0)
+        T = x.shape[-1]
+        har_hop = (har.shape[-1] - 1) // T
+        spf = har_hop * self.stft.hop_length  # samples per input frame
+        fade = overlap * spf // 2
+        assert window >= overlap, (window, overlap)
+        starts = list(range(0, T, window))
+        if len(starts) > 1 and T - starts[-1] < overlap:
+            starts.pop()  # fold a short remainder into the last full window
+        tail = None
+        for a, b in zip(starts, starts[1:] + [T]):
+            lo, hi = max(a - overlap, 0), min(b + overlap, T)
+            audio = self._generate(x[..., lo:hi], s, har[..., lo*har_hop:hi*har_hop+1])
+            left = (a - lo) * spf - (fade if a > 0 else 0)
+            right = (b - lo) * spf + (fade if b < T else 0)
+            piece = audio[..., left:right]
+            if tail is not None:
+                ramp = (torch.arange(2*fade, device=piece.device) + 0.5) / (2*fade)
+                piece[..., :2*fade] = tail * (1 - ramp) + piece[..., :2*fade] * ramp
+                tail = None
+            if b < T and fade > 0:
+                n = piece.shape[-1] - 2*fade
+                piece, tail = piece[..., :n], piece[..., n:]
+            yield piece
+
+    def _generate(self, x, s, har, m=None):
+        har = har.type_as(x)
+        if m is not None:
+            lengths = (~m).sum(-1)
         for i in range(self.num_upsamples):
+            if m is not None:
+                # Pads must be zero wherever a conv can see past a row's end
+                x = x.masked_fill(m, 0.0)
             x = F.leaky_relu(x, negative_slope=0.1) 
             x_source = self.noise_convs[i](har)
-            x_source = self.noise_res[i](x_source, s)
             x = self.ups[i](x)
             if i == self.num_upsamples - 1:
                 x = self.reflection_pad(x)
+            if m is not None:
+                lengths = lengths * self.ups[i].stride[0] + (1 if i == self.num_upsamples - 1 else 0)
+                m = length_to_mask(lengths, x.shape[-1])
+            x_source = self.noise_res[i](x_source, s, m)
             x = x + x_source
             xs = None
             for j in range(self.num_kernels):
                 if xs is None:
-                    xs = self.resblocks[i*self.num_kernels+j](x, s)
+                    xs = self.resblocks[i*self.num_kernels+j](x, s, m)
                 else:
-                    xs += self.resblocks[i*self.num_kernels+j](x, s)
+                    xs += self.resblocks[i*self.num_kernels+j](x, s, m)
             x = xs / self.num_kernels
+        if m is not None:
+            x = x.masked_fill(m, 0.0)
         x = F.leaky_relu(x)
         x = self.conv_post(x)
+        return self._spectrum(x, m)
+
+    @full_precision
+    def _spectrum(self, x, m=None):
+        # exp overflows and loses the quiet bins in reduced precision
         spec = torch.exp(x[:,:self.post_n_fft // 2 + 1, :])
         phase = torch.sin(x[:, self.post_n_fft // 2 + 1:, :])
+        if m is not None:
+            spec = spec.masked_fill(m, 0.0)
         return self.stft.inverse(spec, phase)
 
 
@@ -365,19 +484,28 @@ class AdainResBlk1d(nn.Module):
             x = self.conv1x1(x)
         return x
 
-    def _residual(self, x, s):
-        x = self.norm1(x, s)
+    def _upsample_mask(self, m):
+        return m if m is None or self.upsample_type == 'none' else m.repeat_interleave(2, dim=-1)
+
+    def _residual(self, x, s, m=None):
+        x = self.norm1(x, s, m)
         x = self.actv(x)
         x = self.pool(x)
+        m = self._upsample_mask(m)
+        if m is not None:
+            x = x.masked_fill(m, 0.0)
         x = self.conv1(self.dropout(x))
-        x = self.norm2(x, s)
+        x = self.norm2(x, s, m)
         x = self.actv(x)
         x = self.conv2(self.dropout(x))
         return x
 
-    def forward(self, x, s):
-        out = self._residual(x, s)
+    def forward(self, x, s, m=None):
+        out = self._residual(x, s, m)
         out = (out + self._shortcut(x)) * torch.rsqrt(torch.tensor(2))
+        m = self._upsample_mask(m)
+        if m is not None:
+            out = out.masked_fill(m, 0.0)
         return out
 
 
@@ -404,18 +532,30 @@ class Decoder(nn.Module):
                                    upsample_initial_channel, resblock_dilation_sizes, 
                                    upsample_kernel_sizes, gen_istft_n_fft, gen_istft_hop_size, disable_complex=disable_complex)
 
-    def forward(self, asr, F0_curve, N, s):
-        F0 = self.F0_conv(F0_curve.unsqueeze(1))
+    def forward(self, asr, F0_curve, N, s, m=None):
+        x, m = self._decode(asr, F0_curve, N, s, m)
+        x = self.generator(x, s, F0_curve, m)
+        return x
+
+    def stream(self, asr, F0_curve, N, s, window=40, overlap=4):
+        # window and overlap count asr frames; the generator runs at twice that rate.
+        # Only the generator is windowed: the decode blocks run over the whole
+        # chunk first, so their memory and latency still scale with its length
+        x, _ = self._decode(asr, F0_curve, N, s)
+        yield from self.generator.stream(x, s, F0_curve, window=2*window, overlap=2*overlap)
+
+    def _decode(self, asr, F0_curve, N, s, m=None):
+        F0 = self.F0_conv(F0_curve.unsqueeze(1).type_as(asr))
         N = self.N_conv(N.unsqueeze(1))
         x = torch.cat([asr, F0, N], axis=1)
-        x = self.encode(x, s)
+        x = self.encode(x, s, m)
         asr_res = self.asr_res(asr)
         res = True
         for block in self.decode:
             if res:
                 x = torch.cat([x, asr_res, F0, N], axis=1)
-            x = block(x, s)
+            x = block(x, s, m)
             if block.upsample_type != "none":
                 res = False
-        x = self.generator(x, s, F0_curve)
-        return x
+                m = block._upsample_mask(m)
+        return x, m
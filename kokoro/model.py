@@ -1,19 +1,52 @@
-from .istftnet import Decoder
-from .modules import CustomAlbert, ProsodyPredictor, TextEncoder
+from .cache import file_digest
+from .istftnet import Decoder, Style, full_precision, length_to_mask
+from .modules import CustomAlbert, ProsodyPredictor, TextEncoder, flatten_parameters, fold_weight_norm, load_safetensors, prepare_style
+from .profiling import StageEvent, run_stage
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from huggingface_hub import hf_hub_download
 from loguru import logger
 from transformers import AlbertConfig
-from typing import Dict, Optional, Union
+from typing import Callable, Dict, Generator, List, Optional, Union
 import json
+import threading
+import time
 import torch
 
+def bucket(n: int, buckets: List[int]) -> int:
+    '''The smallest bucket >= n, or n rounded up to a multiple of the last step.'''
+    for b in buckets:
+        if b >= n:
+            return b
+    step = buckets[-1] - buckets[-2] if len(buckets) > 1 else buckets[-1]
+    return buckets[-1] + -(-(n - buckets[-1]) // step) * step
+
 class KModel(torch.nn.Module):
     '''
     KModel is a torch.nn.Module with 2 main responsibilities:
     1. Init weights, downloading config.json + model.pth from HF if needed
     2. forward(phonemes: str, ref_s: FloatTensor) -> (audio: FloatTensor)
 
+    forward_batch runs several phoneme strings through a single padded pass.
+
+    With voice_cache_size > 0, KModel keeps an LRU of prepared voices (see
+    prepare_voice) so style projections are computed once per voice pack row.
+
+    compile() opts in to torch.compile with inputs padded to length buckets.
+
+    Callbacks in self.profilers receive a StageEvent (wall time and tensor
+    shapes) for each sub-stage of forward_with_tokens and forward_batch; see
+    profile(). With no profilers, each stage costs one list check.
+
+    model may be a .pth checkpoint or a .safetensors file written by
+    `python -m kokoro convert`, which is memory-mapped rather than copied.
+
+    quantize='int8' (or quantize() after loading) runs Linear and LSTM layers
+    with dynamic int8 weights on CPU, and dtype='bfloat16' (or set_dtype())
+    runs most of the model in bfloat16; check audio with `python -m kokoro
+    fidelity` before shipping either.
+
     You likely only need one KModel instance, and it can be reused across
     multiple KPipelines to avoid redundant memory allocation.
 
@@ -33,7 +66,10 @@ class KModel(torch.nn.Module):
         repo_id: Optional[str] = None,
         config: Union[Dict, str, None] = None,
         model: Optional[str] = None,
-        disable_complex: bool = False
+        disable_complex: bool = False,
+        voice_cache_size: int = 0,
+        quantize: Optional[str] = None,
+        dtype: Union[str, torch.dtype, None] = None
     ):
         super().__init__()
         if repo_id is None:
@@ -65,31 +101,288 @@ class KModel(torch.nn.Module):
         )
         if not model:
             model = hf_hub_download(repo_id=repo_id, filename=KModel.MODEL_NAMES[repo_id])
-        for key, state_dict in torch.load(model, map_location='cpu', weights_only=True).items():
-            assert hasattr(self, key), key
-            try:
-                getattr(self, key).load_state_dict(state_dict)
-            except:
-                logger.debug(f"Did not load {key} from state_dict")
-                state_dict = {k[7:]: v for k, v in state_dict.items()}
-                getattr(self, key).load_state_dict(state_dict, strict=False)
+        self.checkpoint = file_digest(model)
+        if str(model).endswith('.safetensors'):
+            # Zero-copy: weights stay in the page cache, shared across processes
+            metadata = load_safetensors(self, model)
+            logger.debug(f"Loaded {model} with metadata {metadata}")
+        else:
+            for key, state_dict in torch.load(model, map_location='cpu', weights_only=True).items():
+                assert hasattr(self, key), key
+                try:
+                    getattr(self, key).load_state_dict(state_dict)
+                except:
+                    logger.debug(f"Did not load {key} from state_dict")
+                    state_dict = {k[7:]: v for k, v in state_dict.items()}
+                    getattr(self, key).load_state_dict(state_dict, strict=False)
+        self.voice_cache_size = voice_cache_size
+        self.voice_cache = OrderedDict()
+        self._voice_lock = threading.Lock()
+        self._style_weights = {}
+        self.profilers: List[Callable[[StageEvent], None]] = []
+        self.quantized = False
+        self.dtype = torch.float32
+        self.style_dim = config['style_dim']
+        self._compiled = None
+        self.compile_stats: Dict[str, float] = {}
+        if dtype:
+            self.prepare_for_inference().set_dtype(dtype)
+        if quantize:
+            self.quantize(quantize)
 
     @property
     def device(self):
         return self.bert.device
 
+    @property
+    def fingerprint(self) -> str:
+        '''
+        Everything besides the inputs that changes this model's audio: weights,
+        dtype, quantization, STFT and device. Keys AudioCache entries.
+        '''
+        return json.dumps(dict(
+            backend='torch', repo_id=self.repo_id, checkpoint=self.checkpoint, dtype=str(self.dtype),
+            quantized=self.quantized, stft=type(self.decoder.generator.stft).__name__, device=self.device.type
+        ))
+
+    def prepare_for_inference(self) -> 'KModel':
+        '''
+        Switch to eval mode and fold all weight_norm parametrizations (text
+        encoder, predictor and decoder convs, generator ups and conv_post) into
+        plain weights. Outputs are unchanged up to float rounding. Call after
+        weights are loaded; returns self so it chains like .eval().
+        '''
+        folded = fold_weight_norm(self)
+        logger.debug(f"Folded weight_norm into {folded} layers")
+        return self.eval()
+
+    def quantize(self, dtype: str = 'int8') -> 'KModel':
+        '''
+        Replace every Linear and LSTM (ALBERT, bert_encoder, the predictor and
+        text encoder LSTMs, and the AdaIN/AdaLayerNorm style projections) with
+        torch's dynamic int8 versions: weights are stored as int8 and
+        activations are quantized per batch at run time, so no calibration
+        data is needed. Conv1d layers stay float32, since torch has no dynamic
+        quantized conv and static quantization would need calibrated
+        activation ranges for every decoder block. Those convolutions
+        dominate CPU time, so expect a small end-to-end gain: the only
+        measured number is 1.06x, on the tiny random-init test model with
+        one thread (within timing noise). Measure the full model on the
+        target machine with `kokoro fidelity`. CPU only; implies
+        prepare_for_inference. Returns self.
+        '''
+        assert dtype == 'int8', dtype
+        assert self.device.type == 'cpu', 'Dynamic quantization runs on CPU only'
+        assert self.dtype == torch.float32, 'Quantize a float32 model'
+        if self.quantized:
+            return self
+        self.prepare_for_inference()
+        torch.ao.quantization.quantize_dynamic(
+            self, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8, inplace=True
+        )
+        self.quantized = True
+        # Prepared voices hold fp32 projections of the replaced modules
+        with self._voice_lock:
+            self.voice_cache.clear()
+        self._style_weights.clear()
+        return self
+
+    # Kept in float32 by set_dtype, see the policy table there
+    FLOAT32_MODULES = (
+        'predictor.duration_proj',
+        'predictor.F0_proj',
+        'decoder.generator.m_source',
+        'decoder.generator.stft',
+    )
+
+    def set_dtype(self, dtype: Union[str, torch.dtype]) -> 'KModel':
+        '''
+        Run the model in dtype ('bfloat16', 'float16' or back to 'float32'),
+        with the numerically sensitive parts kept in float32:
+
+            stage                                  dtype
+            bert, bert_encoder                     dtype
+            predictor LSTMs, AdaLayerNorm          dtype
+            predictor F0/N blocks, N_proj          dtype
+            predictor.duration_proj + sigmoid sum  float32  (rounded to frames)
+            predictor.F0_proj                      float32  (F0 in Hz)
+            text_encoder                           dtype
+            decoder blocks, AdaIN1d, generator     dtype
+            SineGen phase cumsum, source linear    float32  (m_source)
+            STFT of the harmonic source            float32
+            conv_post exp/sin head and iSTFT       float32  (Generator._spectrum)
+
+        Norm statistics run in dtype; torch accumulates them in float32.
+        Audio is always returned as float32. bfloat16 pays off on CPUs with
+        AVX512-BF16 or AMX (and on recent GPUs); float16 is for GPUs. Call
+        after prepare_for_inference so weight_norm is folded in float32.
+        Returns self.
+        '''
+        dtype = getattr(torch, dtype) if isinstance(dtype, str) else dtype
+        assert dtype in (torch.float32, torch.bfloat16, torch.float16), dtype
+        assert not self.quantized, 'A quantized model runs in float32'
+        if dtype == torch.bfloat16 and self.device.type == 'cpu':
+            try:
+                supported = torch.ops.mkldnn._is_mkldnn_bf16_supported()
+            except (AttributeError, RuntimeError):
+                supported = False
+            if not supported:
+                logger.warning("This CPU has no native bfloat16 support; expect bfloat16 to be slower than float32")
+        self.to(dtype)
+        for name in KModel.FLOAT32_MODULES:
+            self.get_submodule(name).float()
+        self.dtype = dtype
+        # Prepared voices hold projections in the old dtype
+        with self._voice_lock:
+            self.voice_cache.clear()
+        self._style_weights.clear()
+        return self
+
+    @full_precision
+    def _durations(self, x: torch.FloatTensor, speed) -> torch.FloatTensor:
+        duration = self.predictor.duration_proj(x)
+        return torch.sigmoid(duration).sum(axis=-1) / speed
+
+    # Buckets for compile(), about 1.5x apart so padding adds at most half
+    TOKEN_BUCKETS = (32, 48, 64, 96, 128, 192, 256, 384, 512)
+    FRAME_BUCKETS = (64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)
+
     @dataclass
     class Output:
         audio: torch.FloatTensor
         pred_dur: Optional[torch.LongTensor] = None
 
+    @dataclass
+    class Voice:
+        ref_s: torch.FloatTensor
+        predictor: Style
+        decoder: Style
+
+    def prepare_voice(self, ref_s: torch.FloatTensor) -> 'KModel.Voice':
+        '''
+        Precompute everything that depends only on one voice pack row ref_s:
+        every AdaIN1d/AdaLayerNorm fc(s), and the style half of the input
+        projections of the DurationEncoder, predictor.lstm and predictor.shared
+        LSTMs, folded into their biases. The result can be passed anywhere
+        ref_s is accepted on the single-row path and skips those branches.
+        With voice_cache_size > 0, results are kept in an LRU keyed by the
+        contents of ref_s, and forward uses it automatically.
+        '''
+        ref_s = ref_s.to(self.device).view(1, -1)
+        key = ref_s.float().cpu().numpy().tobytes()
+        ref_s = ref_s.to(self.dtype)
+        with self._voice_lock:
+            if key in self.voice_cache:
+                self.voice_cache.move_to_end(key)
+                return self.voice_cache[key]
+        # Quantized LSTMs have packed weights, so the style stays an input there
+        lstms = [] if self.quantized else [
+            m for m in self.predictor.text_encoder.lstms if isinstance(m, torch.nn.LSTM)
+        ] + [self.predictor.lstm, self.predictor.shared]
+        voice = KModel.Voice(
+            ref_s=ref_s,
+            predictor=prepare_style(
+                self.predictor, ref_s[:, 128:], lstms, self._style_weights
+            ),
+            decoder=prepare_style(self.decoder, ref_s[:, :128])
+        )
+        if self.voice_cache_size > 0:
+            with self._voice_lock:
+                self.voice_cache[key] = voice
+                while len(self.voice_cache) > self.voice_cache_size:
+                    self.voice_cache.popitem(last=False)
+        return voice
+
+    @contextmanager
+    def profile(self, callback: Callable[[StageEvent], None]):
+        '''
+        Call callback with a StageEvent for every model stage while the
+        context is active, e.g. with a kokoro.profiling.ChromeTrace.
+        '''
+        self.profilers.append(callback)
+        try:
+            yield callback
+        finally:
+            self.profilers.remove(callback)
+
+    def _stage(self, name: str, fn: Callable, *args, **kwargs):
+        if not self.profilers:
+            return fn(*args, **kwargs)
+        return run_stage(self.profilers, name, fn, *args, **kwargs)
+
+    @dataclass
+    class Features:
+        '''
+        The contract between encode and decode, for one chunk of n frames (40
+        per second of audio): asr [1, hidden_dim, n] is the text encoding
+        aligned to frames, F0 and N [1, 2n] are the pitch (Hz) and energy
+        curves, s is the decoder half of ref_s ([1, 128], or a prepared Style)
+        and pred_dur [tokens] holds the frames per input id.
+        '''
+        asr: torch.FloatTensor
+        F0: torch.FloatTensor
+        N: torch.FloatTensor
+        s: Union[torch.FloatTensor, Style]
+        pred_dur: Optional[torch.LongTensor] = None
+
+    def _input_ids(self, phonemes: str) -> torch.LongTensor:
+        input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
+        logger.debug(f"phonemes: {phonemes} -> input_ids: {input_ids}")
+        assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
+        return torch.LongTensor([[0, *input_ids, 0]]).to(self.device)
+
+    @torch.no_grad()
+    def encode(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1
+    ) -> 'KModel.Features':
+        '''
+        First stage of forward: ALBERT, the prosody predictor, durations, F0/N
+        and the text encoder, at token cost. decode(features) does the rest.
+        The two stages can run on different threads, executors or (exported
+        with `kokoro export-onnx --split`) processes; see KPipeline.staged.
+        '''
+        ref_s = self.prepare_voice(ref_s) if self.voice_cache_size > 0 else ref_s.to(self.device)
+        return self.encode_tokens(self._input_ids(phonemes), ref_s, speed)
+
+    @torch.no_grad()
+    def encode_tokens(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: Union[torch.FloatTensor, 'KModel.Voice'],
+        speed: float = 1
+    ) -> 'KModel.Features':
+        if not isinstance(ref_s, KModel.Voice):
+            ref_s = ref_s.to(self.dtype)
+        asr, F0_pred, N_pred, pred_dur = self._encode(input_ids, ref_s, speed)
+        s = ref_s.decoder if isinstance(ref_s, KModel.Voice) else ref_s[:, :128]
+        return KModel.Features(asr=asr, F0=F0_pred, N=N_pred, s=s, pred_dur=pred_dur)
+
+    @torch.no_grad()
+    def decode(self, features: 'KModel.Features') -> torch.FloatTensor:
+        '''Second stage of forward: Decoder and Generator, at frame cost.'''
+        f = features
+        x, m = self._stage('decoder.encode/decode', self.decoder._decode, f.asr, f.F0, f.N, f.s)
+        return self._stage('generator', self.decoder.generator, x, f.s, f.F0, m).squeeze()
+
     @torch.no_grad()
     def forward_with_tokens(
         self,
         input_ids: torch.LongTensor,
-        ref_s: torch.FloatTensor,
+        ref_s: Union[torch.FloatTensor, 'KModel.Voice'],
         speed: float = 1
     ) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        features = self.encode_tokens(input_ids, ref_s, speed)
+        return self.decode(features), features.pred_dur
+
+    def _encode(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: Union[torch.FloatTensor, 'KModel.Voice'],
+        speed: float = 1
+    ) -> tuple[torch.FloatTensor, torch.FloatTensor, torch.FloatTensor, torch.LongTensor]:
         input_lengths = torch.full(
             (input_ids.shape[0],), 
             input_ids.shape[-1], 
@@ -99,24 +392,26 @@ class KModel(torch.nn.Module):
 
         text_mask = torch.arange(input_lengths.max()).unsqueeze(0).expand(input_lengths.shape[0], -1).type_as(input_lengths)
         text_mask = torch.gt(text_mask+1, input_lengths.unsqueeze(1)).to(self.device)
-        bert_dur = self.bert(input_ids, attention_mask=(~text_mask).int())
-        d_en = self.bert_encoder(bert_dur).transpose(-1, -2)
-        s = ref_s[:, 128:]
-        d = self.predictor.text_encoder(d_en, s, input_lengths, text_mask)
-        x, _ = self.predictor.lstm(d)
-        duration = self.predictor.duration_proj(x)
-        duration = torch.sigmoid(duration).sum(axis=-1) / speed
+        bert_dur = self._stage('bert', self.bert, input_ids, attention_mask=(~text_mask).int())
+        d_en = self._stage('bert_encoder', self.bert_encoder, bert_dur).transpose(-1, -2)
+        if isinstance(ref_s, KModel.Voice):
+            s = ref_s.predictor
+            lstm = s.lstm.get(self.predictor.lstm, self.predictor.lstm)
+        else:
+            s = ref_s[:, 128:]
+            lstm = self.predictor.lstm
+        d = self._stage('predictor.text_encoder', self.predictor.text_encoder, d_en, s, input_lengths, text_mask)
+        x, _ = self._stage('predictor.lstm', lstm, d)
+        duration = self._durations(x, speed)
         pred_dur = torch.round(duration).clamp(min=1).long().squeeze()
+        # Length regulation: frame f reads token indices[f], a gather rather
+        # than a matmul with a dense one-hot (n_tokens, n_frames) alignment
         indices = torch.repeat_interleave(torch.arange(input_ids.shape[1], device=self.device), pred_dur)
-        pred_aln_trg = torch.zeros((input_ids.shape[1], indices.shape[0]), device=self.device)
-        pred_aln_trg[indices, torch.arange(indices.shape[0])] = 1
-        pred_aln_trg = pred_aln_trg.unsqueeze(0).to(self.device)
-        en = d.transpose(-1, -2) @ pred_aln_trg
-        F0_pred, N_pred = self.predictor.F0Ntrain(en, s)
-        t_en = self.text_encoder(input_ids, input_lengths, text_mask)
-        asr = t_en @ pred_aln_trg
-        audio = self.decoder(asr, F0_pred, N_pred, ref_s[:, :128]).squeeze()
-        return audio, pred_dur
+        en = d.transpose(-1, -2).index_select(-1, indices)
+        F0_pred, N_pred = self._stage('F0Ntrain', self.predictor.F0Ntrain, en, s)
+        t_en = self._stage('text_encoder', self.text_encoder, input_ids, input_lengths, text_mask)
+        asr = t_en.index_select(-1, indices)
+        return asr, F0_pred, N_pred, pred_dur
 
     def forward(
         self,
@@ -125,17 +420,210 @@ class KModel(torch.nn.Module):
         speed: float = 1,
         return_output: bool = False
     ) -> Union['KModel.Output', torch.FloatTensor]:
-        input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
-        logger.debug(f"phonemes: {phonemes} -> input_ids: {input_ids}")
-        assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
-        input_ids = torch.LongTensor([[0, *input_ids, 0]]).to(self.device)
-        ref_s = ref_s.to(self.device)
+        if self._compiled:
+            # Bucketed shapes, so that each bucket compiles once (see compile)
+            output = self.forward_batch([phonemes], ref_s.view(1, -1), speed, return_output=True)[0]
+            return output if return_output else output.audio
+        input_ids = self._input_ids(phonemes)
+        ref_s = self.prepare_voice(ref_s) if self.voice_cache_size > 0 else ref_s.to(self.device)
         audio, pred_dur = self.forward_with_tokens(input_ids, ref_s, speed)
         audio = audio.squeeze().cpu()
         pred_dur = pred_dur.cpu() if pred_dur is not None else None
         logger.debug(f"pred_dur: {pred_dur}")
         return self.Output(audio=audio, pred_dur=pred_dur) if return_output else audio
 
+    @torch.no_grad()
+    def forward_stream(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        window: int = 40,
+        overlap: int = 4
+    ) -> Generator[torch.FloatTensor, None, None]:
+        '''
+        Like forward, but yields the audio in pieces as the generator finishes
+        each window of frames (40 frames per second of audio). Only the
+        generator is windowed: the decoder's encode/decode blocks still run
+        over the whole chunk before the first piece, so their memory and that
+        part of time to first audio scale with chunk length; the windowing
+        caps the generator's memory and its share of the wait. Not sample
+        exact: instance norm statistics are per window, so with the defaults
+        the pieces are within about 5% (relative L2) and 1 dB (log spectral
+        distance) of forward under the same seed; tests/test_streaming.py
+        checks this.
+        See Generator.stream.
+        '''
+        f = self.encode(phonemes, ref_s, speed)
+        for audio in self.decoder.stream(f.asr, f.F0, f.N, f.s, window=window, overlap=overlap):
+            yield audio.squeeze().cpu()
+
+    @torch.no_grad()
+    def forward_batch(
+        self,
+        phonemes: List[str],
+        ref_s: torch.FloatTensor,
+        speed: Union[float, List[float]] = 1,
+        return_output: bool = False
+    ) -> Union[List['KModel.Output'], List[torch.FloatTensor]]:
+        '''
+        Batched forward over variable-length phoneme strings.
+        ref_s is [B, 256], one voice pack row per string, and speed is either
+        shared or given per string. Rows are padded and masked end to end, so
+        each returned audio is trimmed to its own predicted length.
+        '''
+        batch = [list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), ps))) for ps in phonemes]
+        for ids in batch:
+            assert len(ids)+2 <= self.context_length, (len(ids)+2, self.context_length)
+        input_lengths = torch.LongTensor([len(ids)+2 for ids in batch])
+        width = input_lengths.max().item()
+        if self._compiled:
+            width = bucket(width, self.token_buckets)
+        input_ids = torch.zeros((len(batch), width), dtype=torch.long)
+        for i, ids in enumerate(batch):
+            input_ids[i, 1:len(ids)+1] = torch.LongTensor(ids)
+        input_ids = input_ids.to(self.device)
+        ref_s = ref_s.view(len(batch), -1).to(self.device, self.dtype)
+        speed = torch.as_tensor(speed, dtype=torch.float, device=self.device).expand(len(batch)).unsqueeze(1)
+
+        text_mask = length_to_mask(input_lengths, input_ids.shape[1]).to(self.device)
+        encode, decode, generate = self._compiled or (self._encode_batch, self._decode_batch, self._generate_batch)
+        d, t_en, pred_dur = encode(input_ids, input_lengths, text_mask, ref_s, speed)
+
+        # Per-row alignment: frame f of row b reads token searchsorted(cumsum(pred_dur[b]), f)
+        frame_lengths = pred_dur.sum(-1)
+        n_frames = frame_lengths.max().item()
+        if self._compiled:
+            n_frames = bucket(n_frames, self.frame_buckets)
+        frames = torch.arange(n_frames, device=self.device).expand(len(batch), -1)
+        indices = torch.searchsorted(pred_dur.cumsum(-1), frames.contiguous(), right=True)
+        indices = indices.clamp(max=input_ids.shape[1]-1)
+        frame_mask = length_to_mask(frame_lengths, frames.shape[1]).unsqueeze(1)
+        en = torch.gather(d.transpose(-1, -2), 2, indices.unsqueeze(1).expand(-1, d.shape[-1], -1))
+        en = en.masked_fill(frame_mask, 0.0)
+        asr = torch.gather(t_en, 2, indices.unsqueeze(1).expand(-1, t_en.shape[1], -1))
+        asr = asr.masked_fill(frame_mask, 0.0)
+        x, m, F0_pred = decode(en, asr, frame_mask, ref_s)
+        # Per row and data dependent, so it stays eager between the compiled halves
+        har = self._stage('generator.source', self.decoder.generator.source, F0_pred, m)
+        audio = generate(x, har, m, ref_s).squeeze(1)
+
+        samples_per_frame = audio.shape[-1] // frames.shape[1]
+        audio, pred_dur = audio.cpu(), pred_dur.cpu()
+        outputs = []
+        for i, (n, f) in enumerate(zip(input_lengths.tolist(), frame_lengths.tolist())):
+            output = self.Output(audio=audio[i, :f*samples_per_frame], pred_dur=pred_dur[i, :n])
+            outputs.append(output if return_output else output.audio)
+        return outputs
+
+    def _encode_batch(
+        self,
+        input_ids: torch.LongTensor,
+        input_lengths: torch.LongTensor,
+        text_mask: torch.BoolTensor,
+        ref_s: torch.FloatTensor,
+        speed: torch.FloatTensor
+    ) -> tuple[torch.FloatTensor, torch.FloatTensor, torch.LongTensor]:
+        bert_dur = self._stage('bert', self.bert, input_ids, attention_mask=(~text_mask).int())
+        d_en = self._stage('bert_encoder', self.bert_encoder, bert_dur).transpose(-1, -2)
+        s = ref_s[:, 128:]
+        d = self._stage('predictor.text_encoder', self.predictor.text_encoder, d_en, s, input_lengths, text_mask)
+        x = torch.nn.utils.rnn.pack_padded_sequence(d, input_lengths, batch_first=True, enforce_sorted=False)
+        flatten_parameters(self.predictor.lstm)
+        x, _ = self._stage('predictor.lstm', self.predictor.lstm, x)
+        x, _ = torch.nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=input_ids.shape[1])
+        duration = self._durations(x, speed)
+        pred_dur = torch.round(duration).clamp(min=1).long().masked_fill(text_mask, 0)
+        t_en = self._stage('text_encoder', self.text_encoder, input_ids, input_lengths, text_mask)
+        return d, t_en, pred_dur
+
+    def _decode_batch(
+        self,
+        en: torch.FloatTensor,
+        asr: torch.FloatTensor,
+        frame_mask: torch.BoolTensor,
+        ref_s: torch.FloatTensor
+    ) -> tuple[torch.FloatTensor, torch.BoolTensor, torch.FloatTensor]:
+        F0_pred, N_pred = self._stage('F0Ntrain', self.predictor.F0Ntrain, en, ref_s[:, 128:], frame_mask)
+        x, m = self._stage('decoder.encode/decode', self.decoder._decode, asr, F0_pred, N_pred, ref_s[:, :128], frame_mask)
+        return x, m, F0_pred
+
+    def _generate_batch(
+        self,
+        x: torch.FloatTensor,
+        har: torch.FloatTensor,
+        m: torch.BoolTensor,
+        ref_s: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        return self._stage('generator', self.decoder.generator._generate, x, ref_s[:, :128], har, m)
+
+    def compile(
+        self,
+        token_buckets: Optional[List[int]] = None,
+        frame_buckets: Optional[List[int]] = None,
+        warmup: bool = False,
+        **kwargs
+    ) -> 'KModel':
+        '''
+        Opt in to torch.compile. forward and forward_batch then pad token ids
+        up to the next of token_buckets and frames up to the next of
+        frame_buckets, run the padded, masked batch path (see forward_batch)
+        and trim the audio back to each predicted length, so the encoder and
+        the decoder and generator each compile once per bucket (and batch
+        size) instead of once per chunk; the generator's per-row harmonic
+        source runs eagerly in between (see Generator.source). kwargs go to
+        torch.compile (dynamic=False by default).
+        A bucket that was not warmed compiles on first use, which stalls that
+        request: 99-110s per new shape on one CPU thread, measured on the
+        tiny test model; the full model has not been measured. With
+        warmup, every bucket is compiled now instead; see warmup(). Padding
+        to a bucket costs compute, and on a single CPU thread the compiled
+        path measured slower than eager, so check `kokoro bench --compile`
+        on the target machine before turning it on.
+        forward_stream and forward_with_tokens stay eager. Returns self.
+        '''
+        self.token_buckets = sorted(token_buckets or KModel.TOKEN_BUCKETS)
+        if self.token_buckets[-1] < self.context_length:
+            self.token_buckets.append(self.context_length)
+        self.frame_buckets = sorted(frame_buckets or KModel.FRAME_BUCKETS)
+        import torch._dynamo
+        config = torch._dynamo.config
+        name = 'recompile_limit' if hasattr(config, 'recompile_limit') else 'cache_size_limit'
+        setattr(config, name, max(getattr(config, name), len(self.token_buckets) + 1, len(self.frame_buckets) + 1))
+        kwargs.setdefault('dynamic', False)
+        self._compiled = tuple(torch.compile(fn, **kwargs) for fn in (self._encode_batch, self._decode_batch, self._generate_batch))
+        if warmup:
+            self.warmup()
+        return self
+
+    @torch.no_grad()
+    def warmup(self, batch_size: int = 1) -> Dict[str, float]:
+        '''
+        Compile every bucket ahead of time with dummy inputs, so no request
+        pays for it. Returns seconds per bucket, also kept in compile_stats.
+        '''
+        assert self._compiled, 'Call compile() first'
+        encode, decode, generate = self._compiled
+        ref_s = torch.zeros(batch_size, 2 * self.style_dim, device=self.device, dtype=self.dtype)
+        speed = torch.ones(batch_size, 1, device=self.device)
+        for n in self.token_buckets:
+            input_lengths = torch.full((batch_size,), n, dtype=torch.long)
+            input_ids = torch.zeros((batch_size, n), dtype=torch.long, device=self.device)
+            start = time.perf_counter()
+            encode(input_ids, input_lengths, length_to_mask(input_lengths, n).to(self.device), ref_s, speed)
+            self.compile_stats[f'tokens={n}'] = time.perf_counter() - start
+        d_channels, asr_channels = self.predictor.lstm.input_size, self.bert_encoder.out_features
+        for n in self.frame_buckets:
+            en = torch.zeros((batch_size, d_channels, n), device=self.device, dtype=self.dtype)
+            asr = torch.zeros((batch_size, asr_channels, n), device=self.device, dtype=self.dtype)
+            frame_mask = torch.zeros((batch_size, 1, n), dtype=torch.bool, device=self.device)
+            start = time.perf_counter()
+            x, m, F0_pred = decode(en, asr, frame_mask, ref_s)
+            generate(x, self.decoder.generator.source(F0_pred, m), m, ref_s)
+            self.compile_stats[f'frames={n}'] = time.perf_counter() - start
+        logger.debug(f"Compiled {len(self.compile_stats)} buckets in {sum(self.compile_stats.values()):.1f}s")
+        return self.compile_stats
+
 class KModelForONNX(torch.nn.Module):
     def __init__(self, kmodel: KModel):
         super().__init__()
@@ -149,3 +637,33 @@ class KModelForONNX(torch.nn.Module):
     ) -> tuple[torch.FloatTensor, torch.LongTensor]:
         waveform, duration = self.kmodel.forward_with_tokens(input_ids, ref_s, speed)
         return waveform, duration
+
+class KModelEncoderForONNX(torch.nn.Module):
+    '''KModel.encode_tokens as a graph: (input_ids, style, speed) -> (asr, F0, N, duration).'''
+    def __init__(self, kmodel: KModel):
+        super().__init__()
+        self.kmodel = kmodel
+
+    def forward(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1
+    ) -> tuple[torch.FloatTensor, torch.FloatTensor, torch.FloatTensor, torch.LongTensor]:
+        f = self.kmodel.encode_tokens(input_ids, ref_s, speed)
+        return f.asr, f.F0, f.N, f.pred_dur
+
+class KModelDecoderForONNX(torch.nn.Module):
+    '''KModel.decode as a graph: (asr, F0, N, style[:, :128]) -> waveform.'''
+    def __init__(self, kmodel: KModel):
+        super().__init__()
+        self.kmodel = kmodel
+
+    def forward(
+        self,
+        asr: torch.FloatTensor,
+        F0: torch.FloatTensor,
+        N: torch.FloatTensor,
+        s: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        return self.kmodel.decode(KModel.Features(asr=asr, F0=F0, N=N, s=s))
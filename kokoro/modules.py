@@ -1,13 +1,119 @@
 # https://github.com/yl4579/StyleTTS2/blob/main/models.py
-from .istftnet import AdainResBlk1d
+from .istftnet import AdaIN1d, AdainResBlk1d, Style
+from torch.nn.utils import parametrize
 from torch.nn.utils.parametrizations import weight_norm
 from transformers import AlbertModel
+from typing import Dict, List, Optional
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+def fold_weight_norm(module: nn.Module) -> int:
+    '''
+    Bake every weight_norm parametrization under module into a plain weight,
+    so g * v / ||v|| is computed once instead of on every forward call.
+    Returns the number of layers folded. The module can no longer load
+    weight-normed state_dicts afterwards, so fold after loading weights.
+    '''
+    folded = 0
+    for m in module.modules():
+        if parametrize.is_parametrized(m, 'weight'):
+            parametrize.remove_parametrizations(m, 'weight', leave_parametrized=True)
+            folded += 1
+    return folded
+
+
+def flatten_parameters(lstm: nn.Module):
+    # Dynamic int8 LSTMs (KModel.quantize) have no cuDNN weights to flatten
+    if hasattr(lstm, 'flatten_parameters'):
+        lstm.flatten_parameters()
+
+
+def save_safetensors(module: nn.Module, path: str, metadata: Optional[Dict[str, str]] = None):
+    '''
+    Write module.state_dict() to path in the safetensors format. Whether
+    module was folded with fold_weight_norm is recorded in the metadata, so
+    that load_safetensors can fold the target module before loading.
+    '''
+    from safetensors.torch import save_file
+    metadata = dict(metadata or {})
+    parametrized = any(parametrize.is_parametrized(m) for m in module.modules())
+    metadata['weight_norm'] = 'parametrized' if parametrized else 'folded'
+    save_file({k: v.detach().contiguous() for k, v in module.state_dict().items()}, path, metadata=metadata)
+
+
+def load_safetensors(module: nn.Module, path: str) -> Dict[str, str]:
+    '''
+    Load a save_safetensors file into module without copying the weights:
+    on CPU, safetensors returns views of a private mmap of path, and
+    assign=True puts those views in place of module's parameters. Every
+    process that loads the same file shares one physical copy through the
+    page cache, as long as nobody writes to the weights. Returns the
+    file's metadata.
+    '''
+    from safetensors import safe_open
+    from safetensors.torch import load_file
+    with safe_open(path, framework='pt') as f:
+        metadata = f.metadata() or {}
+    if metadata.get('weight_norm') == 'folded':
+        fold_weight_norm(module)
+    missing, _ = module.load_state_dict(load_file(path, device='cpu'), strict=False, assign=True)
+    # Buffers such as STFT windows are rebuilt by __init__ and may be absent
+    params = dict(module.named_parameters())
+    missing = [k for k in missing if k in params]
+    assert not missing, f"{path} is missing parameters: {missing}"
+    return metadata
+
+
+def fold_style_lstm(lstm: nn.LSTM, s: torch.FloatTensor, weights: Optional[Dict] = None) -> nn.LSTM:
+    '''
+    For an LSTM whose input is cat([x, s]) with s constant over time, build an
+    LSTM over x alone: W_ih @ [x; s] + b_ih == W_ih[:, :n] @ x + (b_ih + W_ih[:, n:] @ s).
+    The x slice of W_ih is the same for every s, so it is kept in weights
+    (keyed by lstm and parameter name) and shared across calls; W_hh and
+    b_hh are shared with the original LSTM.
+    '''
+    assert lstm.num_layers == 1, lstm.num_layers
+    weights = {} if weights is None else weights
+    n = lstm.input_size - s.shape[-1]
+    folded = nn.LSTM(n, lstm.hidden_size, num_layers=1, batch_first=lstm.batch_first,
+                     bidirectional=lstm.bidirectional, device='meta')
+    with torch.no_grad():
+        for name, p in lstm.named_parameters():
+            if name.startswith('weight_ih'):
+                if (lstm, name) not in weights:
+                    weights[lstm, name] = nn.Parameter(p[:, :n].contiguous(), requires_grad=False)
+                p = weights[lstm, name]
+            elif name.startswith('bias_ih'):
+                w = getattr(lstm, name.replace('bias_ih', 'weight_ih'))
+                p = nn.Parameter(p + w[:, n:] @ s.view(-1), requires_grad=False)
+            setattr(folded, name, p)
+    return folded
+
+
+def prepare_style(
+    module: nn.Module,
+    s: torch.FloatTensor,
+    lstms: List[nn.LSTM] = [],
+    weights: Optional[Dict] = None
+) -> Style:
+    '''
+    Precompute fc(s) for every AdaIN1d and AdaLayerNorm under module, and fold
+    s into each LSTM of lstms (see fold_style_lstm). s must be [1, style_dim].
+    LSTMs not in lstms keep taking the style as concatenated input channels.
+    '''
+    style = Style(s)
+    with torch.no_grad():
+        for m in module.modules():
+            if isinstance(m, (AdaIN1d, AdaLayerNorm)):
+                style.h[m] = m.fc(s)
+        for lstm in lstms:
+            style.lstm[lstm] = fold_style_lstm(lstm, s, weights)
+    return style
+
+
 class LinearNorm(nn.Module):
     def __init__(self, in_dim, out_dim, bias=True, w_init_gain='linear'):
         super(LinearNorm, self).__init__()
@@ -58,11 +164,11 @@ class TextEncoder(nn.Module):
         x = x.transpose(1, 2)  # [B, T, chn]
         lengths = input_lengths if input_lengths.device == torch.device('cpu') else input_lengths.to('cpu')
         x = nn.utils.rnn.pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
-        self.lstm.flatten_parameters()
+        flatten_parameters(self.lstm)
         x, _ = self.lstm(x)
         x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True)
         x = x.transpose(-1, -2)
-        x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
+        x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], dtype=x.dtype, device=x.device)
         x_pad[:, :, :x.shape[-1]] = x
         x = x_pad
         x.masked_fill_(m, 0.0)
@@ -79,7 +185,7 @@ class AdaLayerNorm(nn.Module):
     def forward(self, x, s):
         x = x.transpose(-1, -2)
         x = x.transpose(1, -1)
-        h = self.fc(s)
+        h = s.h[self] if isinstance(s, Style) else self.fc(s)
         h = h.view(h.size(0), h.size(1), 1)
         gamma, beta = torch.chunk(h, chunks=2, dim=1)
         gamma, beta = gamma.transpose(1, -1), beta.transpose(1, -1)
@@ -111,26 +217,43 @@ class ProsodyPredictor(nn.Module):
         m = m.unsqueeze(1)
         lengths = text_lengths if text_lengths.device == torch.device('cpu') else text_lengths.to('cpu')
         x = nn.utils.rnn.pack_padded_sequence(d, lengths, batch_first=True, enforce_sorted=False)
-        self.lstm.flatten_parameters()
+        flatten_parameters(self.lstm)
         x, _ = self.lstm(x)
         x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True)
-        x_pad = torch.zeros([x.shape[0], m.shape[-1], x.shape[-1]], device=x.device)
+        x_pad = torch.zeros([x.shape[0], m.shape[-1], x.shape[-1]], dtype=x.dtype, device=x.device)
         x_pad[:, :x.shape[1], :] = x
         x = x_pad
         duration = self.duration_proj(nn.functional.dropout(x, 0.5, training=False))
         en = (d.transpose(-1, -2) @ alignment)
         return duration.squeeze(-1), en
 
-    def F0Ntrain(self, x, s):
-        x, _ = self.shared(x.transpose(-1, -2))
+    def F0Ntrain(self, x, s, m=None):
+        if isinstance(s, Style) and self.shared in s.lstm:
+            x, _ = s.lstm[self.shared](x.transpose(-1, -2))
+        elif m is None:
+            x, _ = self.shared(x.transpose(-1, -2))
+        else:
+            # Padded batch: m is [B, 1, T] and True at padded frames
+            lengths = (~m).sum(-1).squeeze(1).cpu()
+            x = nn.utils.rnn.pack_padded_sequence(x.transpose(-1, -2), lengths, batch_first=True, enforce_sorted=False)
+            flatten_parameters(self.shared)
+            x, _ = self.shared(x)
+            x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=m.shape[-1])
         F0 = x.transpose(-1, -2)
+        F0_m = m
         for block in self.F0:
-            F0 = block(F0, s)
-        F0 = self.F0_proj(F0)
+            F0 = block(F0, s, F0_m)
+            F0_m = block._upsample_mask(F0_m)
+        # F0 in Hz needs more mantissa than bfloat16 has (see KModel.set_dtype)
+        F0 = self.F0_proj(F0.type_as(self.F0_proj.weight))
         N = x.transpose(-1, -2)
+        N_m = m
         for block in self.N:
-            N = block(N, s)
+            N = block(N, s, N_m)
+            N_m = block._upsample_mask(N_m)
         N = self.N_proj(N)
+        if m is not None:
+            F0, N = F0.masked_fill(F0_m, 0.0), N.masked_fill(N_m, 0.0)
         return F0.squeeze(1), N.squeeze(1)
 
 
@@ -146,30 +269,41 @@ class DurationEncoder(nn.Module):
         self.sty_dim = sty_dim
 
     def forward(self, x, style, text_lengths, m):
+        # With a prepared Style whose LSTMs have the style folded into their
+        # biases, the style channels are never concatenated and the output
+        # has d_model channels instead of d_model + sty_dim
+        folded = isinstance(style, Style) and bool(style.lstm)
         masks = m
         x = x.permute(2, 0, 1)
-        s = style.expand(x.shape[0], x.shape[1], -1)
-        x = torch.cat([x, s], axis=-1)
+        if not folded:
+            s = (style.s if isinstance(style, Style) else style).expand(x.shape[0], x.shape[1], -1)
+            x = torch.cat([x, s], axis=-1)
+        else:
+            x = x.clone()
         x.masked_fill_(masks.unsqueeze(-1).transpose(0, 1), 0.0)
         x = x.transpose(0, 1)
         x = x.transpose(-1, -2)
         for block in self.lstms:
             if isinstance(block, AdaLayerNorm):
                 x = block(x.transpose(-1, -2), style).transpose(-1, -2)
-                x = torch.cat([x, s.permute(1, 2, 0)], axis=1)
+                if not folded:
+                    x = torch.cat([x, s.permute(1, 2, 0)], axis=1)
                 x.masked_fill_(masks.unsqueeze(-1).transpose(-1, -2), 0.0)
             else:
                 lengths = text_lengths if text_lengths.device == torch.device('cpu') else text_lengths.to('cpu')
                 x = x.transpose(-1, -2)
                 x = nn.utils.rnn.pack_padded_sequence(
                     x, lengths, batch_first=True, enforce_sorted=False)
-                block.flatten_parameters()
+                if folded:
+                    block = style.lstm[block]
+                else:
+                    flatten_parameters(block)
                 x, _ = block(x)
                 x, _ = nn.utils.rnn.pad_packed_sequence(
                     x, batch_first=True)
                 x = F.dropout(x, p=self.dropout, training=False)
                 x = x.transpose(-1, -2)
-                x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
+                x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], dtype=x.dtype, device=x.device)
                 x_pad[:, :, :x.shape[-1]] = x
                 x = x_pad
 
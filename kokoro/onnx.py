@@ -0,0 +1,264 @@
+"""ONNX Runtime backend
+Export KModel to ONNX once, then serve it with onnxruntime through KOnnxModel,
+which KPipeline accepts anywhere it accepts a KModel. The export embeds the
+vocab and context length in the model metadata, so KOnnxModel needs neither
+config.json nor transformers. pip install onnx onnxruntime (or kokoro[onnx]).
+
+python3 -m kokoro export-onnx -o kokoro.onnx
+python3 -m kokoro serve --model kokoro.onnx
+
+With --split, the token-level encoder and the frame-level decoder are two
+graphs (kokoro.encoder.onnx, kokoro.decoder.onnx) joined by the
+KModel.Features contract, so they can be scheduled separately:
+
+python3 -m kokoro export-onnx -o kokoro.onnx --split
+KOnnxModel('kokoro.encoder.onnx', decoder='kokoro.decoder.onnx')
+
+The export renders a fixed phoneme corpus with both runtimes and exits 1 if
+predicted durations or spectra drift (see kokoro/fidelity.py).
+"""
+
+from .cache import file_digest
+from dataclasses import dataclass
+from loguru import logger
+from typing import Dict, List, Optional, Union
+import argparse
+import inspect
+import json
+import numpy as np
+import sys
+import threading
+import torch
+
+SAMPLE_RATE = 24000
+
+class KOnnxModel:
+    '''
+    KOnnxModel runs a model written by `python -m kokoro export-onnx` on ONNX
+    Runtime with the KModel call contract:
+
+        model = KOnnxModel('kokoro.onnx', intra_op_threads=4)
+        pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M', model=model)
+
+    Each call binds its inputs without copies and writes the durations into a
+    preallocated per-thread buffer. The waveform length depends on those
+    durations, so ORT allocates it, from its arena when enable_mem_arena is
+    set. Calls from several threads are safe. Batch size is 1, so
+    forward_batch and KBatcher stay KModel only.
+
+    Given a split export (model is the encoder, decoder the decoder), it
+    also has KModel's encode and decode stages, e.g. for KPipeline.staged.
+    '''
+    @dataclass
+    class Output:
+        audio: torch.FloatTensor
+        pred_dur: Optional[torch.LongTensor] = None
+
+    @dataclass
+    class Features:
+        # Same fields and shapes as KModel.Features, as numpy arrays
+        asr: np.ndarray
+        F0: np.ndarray
+        N: np.ndarray
+        s: np.ndarray
+        pred_dur: Optional[torch.LongTensor] = None
+
+    def __init__(
+        self,
+        model: str,
+        config: Union[Dict, str, None] = None,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        enable_mem_arena: bool = True,
+        providers: Optional[List[str]] = None,
+        decoder: Optional[str] = None
+    ):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.enable_cpu_mem_arena = enable_mem_arena
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = providers or ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(model, options, providers=providers)
+        self.decoder = None if decoder is None else ort.InferenceSession(decoder, options, providers=providers)
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if config is None:
+            assert 'vocab' in metadata, f"{model} has no vocab metadata, pass config="
+            config = dict(vocab=json.loads(metadata['vocab']))
+        elif not isinstance(config, dict):
+            with open(config, 'r', encoding='utf-8') as r:
+                config = json.load(r)
+        self.vocab = config['vocab']
+        self.repo_id = metadata.get('repo_id')
+        self.context_length = int(metadata.get('context_length', 512))
+        self.device = torch.device('cpu')
+        self.fingerprint = json.dumps(dict(
+            backend='onnx', repo_id=self.repo_id, checkpoint=file_digest(model),
+            decoder=None if decoder is None else file_digest(decoder), providers=self.session.get_providers()
+        ))
+        self._local = threading.local()
+        logger.debug(f"Loaded {model} with providers {self.session.get_providers()}")
+
+    def _buffer(self) -> np.ndarray:
+        if not hasattr(self._local, 'duration'):
+            self._local.duration = np.empty(self.context_length, dtype=np.int64)
+        return self._local.duration
+
+    def _run(self, input_ids: np.ndarray, ref_s, speed: float, outputs: List[str]) -> tuple[list, torch.LongTensor]:
+        input_ids = np.ascontiguousarray(input_ids, dtype=np.int64).reshape(1, -1)
+        style = np.ascontiguousarray(ref_s, dtype=np.float32).reshape(1, -1)
+        duration = self._buffer()[:input_ids.shape[1]]
+        binding = self.session.io_binding()
+        binding.bind_cpu_input('input_ids', input_ids)
+        binding.bind_cpu_input('style', style)
+        speed = np.array([speed], dtype=np.float32)
+        binding.bind_cpu_input('speed', speed)
+        for name in outputs:
+            binding.bind_output(name, 'cpu')
+        binding.bind_output('duration', 'cpu', 0, np.int64, list(duration.shape), duration.ctypes.data)
+        self.session.run_with_iobinding(binding)
+        return [v.numpy() for v in binding.get_outputs()[:len(outputs)]], torch.from_numpy(duration.copy())
+
+    def forward_with_tokens(self, input_ids: np.ndarray, ref_s, speed: float = 1) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        if self.decoder is not None:
+            features = self.encode_tokens(input_ids, ref_s, speed)
+            return self.decode(features), features.pred_dur
+        (audio,), pred_dur = self._run(input_ids, ref_s, speed, ['waveform'])
+        return torch.from_numpy(audio).squeeze(), pred_dur
+
+    def encode_tokens(self, input_ids: np.ndarray, ref_s, speed: float = 1) -> 'KOnnxModel.Features':
+        assert self.decoder is not None, 'encode needs a split export, see export-onnx --split'
+        style = np.ascontiguousarray(ref_s, dtype=np.float32).reshape(1, -1)
+        (asr, F0, N), pred_dur = self._run(input_ids, style, speed, ['asr', 'F0', 'N'])
+        return self.Features(asr=asr, F0=F0, N=N, s=style[:, :128].copy(), pred_dur=pred_dur)
+
+    def encode(self, phonemes: str, ref_s, speed: float = 1) -> 'KOnnxModel.Features':
+        return self.encode_tokens(self._input_ids(phonemes), self._style(ref_s), speed)
+
+    def decode(self, features: 'KOnnxModel.Features') -> torch.FloatTensor:
+        assert self.decoder is not None, 'decode needs a split export, see export-onnx --split'
+        audio, = self.decoder.run(['waveform'], dict(asr=features.asr, F0=features.F0, N=features.N, style=features.s))
+        return torch.from_numpy(audio).squeeze()
+
+    def _input_ids(self, phonemes: str) -> np.ndarray:
+        input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
+        logger.debug(f"phonemes: {phonemes} -> input_ids: {input_ids}")
+        assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
+        return np.array([[0, *input_ids, 0]])
+
+    @staticmethod
+    def _style(ref_s) -> np.ndarray:
+        return ref_s.detach().float().cpu().numpy() if isinstance(ref_s, torch.Tensor) else ref_s
+
+    def __call__(
+        self,
+        phonemes: str,
+        ref_s,
+        speed: float = 1,
+        return_output: bool = False
+    ) -> Union['KOnnxModel.Output', torch.FloatTensor]:
+        audio, pred_dur = self.forward_with_tokens(self._input_ids(phonemes), self._style(ref_s), speed)
+        return self.Output(audio=audio, pred_dur=pred_dur) if return_output else audio
+
+def _export(kmodel, module: torch.nn.Module, args: tuple, path: str, inputs: List[str], outputs: List[str],
+            dynamic_axes: Dict[str, Dict[int, str]], opset: int):
+    import onnx
+    # Pin the TorchScript exporter these graphs were written for; dynamo is the
+    # default since torch 2.9, and torch before 2.5 has no dynamo argument
+    legacy = dict(dynamo=False) if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        module.eval(),
+        args=args,
+        f=path,
+        export_params=True,
+        input_names=inputs,
+        output_names=outputs,
+        opset_version=opset,
+        dynamic_axes=dynamic_axes,
+        do_constant_folding=True,
+        **legacy,
+    )
+    model = onnx.load(path)
+    onnx.checker.check_model(model)
+    onnx.helper.set_model_props(model, dict(
+        vocab=json.dumps(kmodel.vocab, ensure_ascii=False),
+        context_length=str(kmodel.context_length),
+        repo_id=kmodel.repo_id,
+        sample_rate=str(SAMPLE_RATE),
+    ))
+    onnx.save(model, path)
+
+def split_paths(path: str) -> tuple[str, str]:
+    stem = path[:-len('.onnx')] if path.endswith('.onnx') else path
+    return f'{stem}.encoder.onnx', f'{stem}.decoder.onnx'
+
+def export(kmodel, path: str, opset: int = 17, split: bool = False) -> List[str]:
+    '''
+    Export kmodel (built with disable_complex=True, so that the STFT is plain
+    convolutions) to path, with batch size 1 and any number of tokens. With
+    split, write the encoder and decoder stages to split_paths(path) instead.
+    Returns the paths written.
+    '''
+    from .model import KModelDecoderForONNX, KModelEncoderForONNX, KModelForONNX
+    input_ids = torch.LongTensor([[0, *torch.randint(1, max(kmodel.vocab.values()) + 1, (48,)).tolist(), 0]])
+    style = torch.randn(1, 256)
+    speed = torch.FloatTensor([1])
+    tokens = {'input_ids': {1: 'tokens'}, 'duration': {0: 'tokens'}}
+    if not split:
+        _export(kmodel, KModelForONNX(kmodel), (input_ids, style, speed), path,
+                ['input_ids', 'style', 'speed'], ['waveform', 'duration'],
+                dict(tokens, waveform={0: 'samples'}), opset)
+        return [path]
+    encoder_path, decoder_path = split_paths(path)
+    frames = {'asr': {2: 'frames'}, 'F0': {1: 'frames2'}, 'N': {1: 'frames2'}}
+    _export(kmodel, KModelEncoderForONNX(kmodel), (input_ids, style, speed), encoder_path,
+            ['input_ids', 'style', 'speed'], ['asr', 'F0', 'N', 'duration'], dict(tokens, **frames), opset)
+    with torch.no_grad():
+        features = kmodel.encode_tokens(input_ids, style, speed)
+    _export(kmodel, KModelDecoderForONNX(kmodel), (features.asr, features.F0, features.N, style[:, :128]), decoder_path,
+            ['asr', 'F0', 'N', 'style'], ['waveform'], dict(frames, waveform={0: 'samples'}), opset)
+    return [encoder_path, decoder_path]
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(prog='kokoro export-onnx', description='Export KModel to ONNX and check parity with onnxruntime')
+    parser.add_argument('-o', '--output-file', '--output_file', default='kokoro.onnx')
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--config', help='Path to config.json (default: download from --repo-id)')
+    parser.add_argument('--model', help='Path to a .pth or .safetensors checkpoint (default: download from --repo-id)')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('-m', '--voice', default='af_heart', help='Voice for the parity check')
+    # The runtimes draw different source noise, so spectra never match exactly
+    parser.add_argument('--max-lsd', '--max_lsd', type=float, default=2.0, help='Fail above this mean LSD in dB')
+    parser.add_argument('--min-duration-match', '--min_duration_match', type=float, default=0.99,
+                        help='Fail below this fraction of matching token durations')
+    parser.add_argument('--split', action='store_true', help='Export the encoder and decoder stages as two graphs')
+    parser.add_argument('--no-check', '--no_check', action='store_true', help='Skip the parity check')
+    args = parser.parse_args(argv)
+
+    from .model import KModel
+    kmodel = KModel(repo_id=args.repo_id, config=args.config, model=args.model, disable_complex=True).prepare_for_inference()
+    paths = export(kmodel, args.output_file, args.opset, split=args.split)
+    logger.info(f"Exported {paths}")
+    if args.no_check:
+        return {}
+
+    from .fidelity import compare
+    from huggingface_hub import hf_hub_download
+    pack = torch.load(hf_hub_download(repo_id=args.repo_id, filename=f'voices/{args.voice}.pt'), weights_only=True)
+    candidate = KOnnxModel(paths[0], decoder=paths[1] if args.split else None)
+    report = compare(kmodel, candidate, pack, repeat=1)
+    failures = []
+    if report['lsd_db'] is None or report['lsd_db'] > args.max_lsd:
+        failures.append(f"lsd_db {report['lsd_db']} > {args.max_lsd}")
+    if report['duration_match'] < args.min_duration_match:
+        failures.append(f"duration_match {report['duration_match']} < {args.min_duration_match}")
+    report = dict(output_files=paths, passed=not failures, failures=failures, **report)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if failures:
+        logger.error(f"ONNX parity check failed: {failures}")
+        sys.exit(1)
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,27 @@
-from .model import KModel
+from __future__ import annotations
+from .cache import AudioCache, G2PCache, VoiceCache
+from .voices import BankVoice, VoiceBank
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from huggingface_hub import hf_hub_download
 from loguru import logger
-from misaki import en, espeak
-from typing import Callable, Generator, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Generator, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+import importlib.metadata
+import asyncio
+import functools
+import json
+import numpy as np
+import queue
 import re
+import threading
 import torch
 import os
+import unicodedata
+
+if TYPE_CHECKING:
+    # misaki, transformers and huggingface_hub are imported on first use
+    from .model import KModel
+    from misaki import en
 
 ALIASES = {
     'en-us': 'a',
@@ -39,6 +54,138 @@ LANG_CODES = dict(
     z='Mandarin Chinese',
 )
 
+T = TypeVar('T')
+U = TypeVar('U')
+V = TypeVar('V')
+
+def prefetched(iterable: Iterable[T], size: int) -> Generator[T, None, None]:
+    '''
+    Consumes iterable on a daemon thread, staying at most size items ahead of
+    the caller. Items keep their order and exceptions are re-raised in the
+    caller. Closing the returned generator stops the thread.
+    '''
+    q = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+async def iterate_in_executor(
+    make: Callable[[], Iterator[T]],
+    executor: Optional[Executor] = None
+) -> AsyncGenerator[T, None]:
+    '''
+    Drive a blocking iterator from asyncio: make() and every next() run on
+    executor (a private thread if None), so the event loop stays free
+    between items. If the consumer stops early or is cancelled, the
+    iterator is closed as soon as the item in flight finishes.
+    '''
+    own = executor is None
+    executor = ThreadPoolExecutor(max_workers=1) if own else executor
+    done = object()
+    future = executor.submit(make)
+    it = None
+    try:
+        it = await asyncio.wrap_future(future)
+        while True:
+            future = executor.submit(next, it, done)
+            item = await asyncio.wrap_future(future)
+            if item is done:
+                return
+            yield item
+    finally:
+        def close(_):
+            # Runs once the last submitted call has finished, never alongside it
+            if it is not None and hasattr(it, 'close'):
+                executor.submit(it.close)
+            if own:
+                executor.shutdown(wait=False)
+        future.add_done_callback(close)
+
+# torch's RNG is process-wide, so seeded renders (KPipeline(seed=...)) take turns
+_SEED_LOCK = threading.Lock()
+
+def model_id(model) -> Optional[str]:
+    '''What AudioCache keys a model by: its fingerprint, else its repo_id.'''
+    return getattr(model, 'fingerprint', None) or getattr(model, 'repo_id', None)
+
+def pipelined(
+    items: Iterable[T],
+    first: Callable[[T], U],
+    second: Callable[[U], V],
+    first_executor: Executor,
+    second_executor: Executor,
+    lookahead: int = 2
+) -> Generator[Tuple[T, V], None, None]:
+    '''
+    Run first(item) on first_executor and then second(first(item)) on
+    second_executor for each item, yielding (item, result) in order. Up to
+    lookahead items are in flight, so item k+1 goes through the first stage
+    while item k is in the second. Exceptions are re-raised in the caller;
+    closing the generator cancels items whose first stage has not finished.
+    '''
+    def submit(item: T) -> Future:
+        out = Future()
+
+        def then(f: Future):
+            if not out.set_running_or_notify_cancel():
+                return
+            try:
+                g = second_executor.submit(second, f.result())
+            except BaseException as e:
+                out.set_exception(e)
+                return
+            g.add_done_callback(lambda g: out.set_exception(g.exception()) if g.exception() else out.set_result(g.result()))
+
+        first_executor.submit(first, item).add_done_callback(then)
+        return out
+
+    it = iter(items)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < max(1, lookahead):
+                item = next(it, pending)
+                if item is pending:
+                    break
+                pending.append((item, submit(item)))
+            if not pending:
+                return
+            item, out = pending.popleft()
+            yield item, out.result()
+    finally:
+        for _, out in pending:
+            out.cancel()
+
 class KPipeline:
     '''
     KPipeline is a language-aware support class with 2 main responsibilities:
@@ -53,6 +200,9 @@ class KPipeline:
     1. On init: us_pipeline = KPipeline(lang_code='a', model=model)
     2. On call: us_pipeline(text, voice, model=model)
 
+    A KBatcher wrapping a KModel can be passed anywhere a KModel can, so that
+    concurrent pipeline calls share batched forward passes.
+
     By default, KPipeline will automatically initialize its own KModel. To
     suppress this, construct a "quiet" KPipeline with model=False.
 
@@ -68,7 +218,12 @@ class KPipeline:
         model: Union[KModel, bool] = True,
         trf: bool = False,
         en_callable: Optional[Callable[[str], str]] = None,
-        device: Optional[str] = None
+        device: Optional[str] = None,
+        g2p_cache: Optional[G2PCache] = None,
+        audio_cache: Optional[AudioCache] = None,
+        seed: Optional[int] = None,
+        voice_bank: Union[VoiceBank, str, None] = None,
+        voice_cache: Optional[VoiceCache] = None
     ):
         """Initialize a KPipeline.
         
@@ -79,6 +234,18 @@ class KPipeline:
             device: Override default device selection ('cuda' or 'cpu', or None for auto)
                    If None, will auto-select cuda if available
                    If 'cuda' and not available, will explicitly raise an error
+            g2p_cache: Optional G2PCache (or compatible) to memoize G2P results
+            audio_cache: Optional AudioCache (or compatible) consulted before each model call
+            seed: If set, reseed the RNG before each model call so that identical
+                  chunks render identical audio (recommended with audio_cache).
+                  The RNG is process-wide, so seeded model calls are serialized
+                  and unseeded calls on other threads can still disturb them.
+                  Not supported with a KBatcher model, whose forward runs on
+                  its own thread; KOnnxModel has no torch RNG to seed.
+            voice_bank: Optional VoiceBank (or path to one) to serve voices from
+                        before falling back to voices/*.pt
+            voice_cache: Optional VoiceCache bounding the voices and blends kept
+                         on device (default: VoiceCache(maxsize=64))
         """
         if repo_id is None:
             repo_id = 'hexgrad/Kokoro-82M'
@@ -89,7 +256,8 @@ class KPipeline:
         assert lang_code in LANG_CODES, (lang_code, LANG_CODES)
         self.lang_code = lang_code
         self.model = None
-        if isinstance(model, KModel):
+        if not isinstance(model, bool):
+            # KModel, or anything with its call contract such as a KBatcher or KOnnxModel
             self.model = model
         elif model:
             if device == 'cuda' and not torch.cuda.is_available():
@@ -105,15 +273,22 @@ class KPipeline:
                     device = 'mps'
                 else:
                     device = 'cpu'
+            from .model import KModel
             try:
-                self.model = KModel(repo_id=repo_id).to(device).eval()
+                self.model = KModel(repo_id=repo_id).to(device).prepare_for_inference()
             except RuntimeError as e:
                 if device == 'cuda':
                     raise RuntimeError(f"""Failed to initialize model on CUDA: {e}. 
                                        Try setting device='cpu' or check CUDA installation.""")
                 raise
-        self.voices = {}
+        self.voices = VoiceCache() if voice_cache is None else voice_cache
+        self.voice_bank = VoiceBank(voice_bank) if isinstance(voice_bank, str) else voice_bank
+        self.g2p_cache = g2p_cache
+        self.audio_cache = audio_cache
+        self.seed = seed
+        self.trf = trf
         if lang_code in 'ab':
+            from misaki import en, espeak
             try:
                 fallback = espeak.EspeakFallback(british=lang_code=='b')
             except Exception as e:
@@ -139,42 +314,122 @@ class KPipeline:
                 logger.error("You need to `pip install misaki[zh]` to use lang_code='z'")
                 raise
         else:
+            from misaki import espeak
             language = LANG_CODES[lang_code]
             logger.warning(f"Using EspeakG2P(language='{language}'). Chunking logic not yet implemented, so long texts may be truncated unless you split them with '\\n'.")
             self.g2p = espeak.EspeakG2P(language=language)
 
+    @functools.cached_property
+    def g2p_version(self) -> str:
+        '''G2P flavour in g2p_cache keys, looked up on first cache use only.'''
+        try:
+            version = importlib.metadata.version('misaki')
+        except importlib.metadata.PackageNotFoundError:
+            # Vendored or otherwise not installed as a distribution
+            import misaki
+            version = getattr(misaki, '__version__', 'unknown')
+        return f"misaki-{version}{'-trf' if self.trf else ''}"
+
+    def cached_g2p(self, text: str) -> Tuple[str, Optional[List[en.MToken]]]:
+        """Run self.g2p through self.g2p_cache, if any. Hits return fresh MTokens.
+
+        Text is NFC-normalised and stripped either way, so that enabling the
+        cache never changes what G2P sees.
+        """
+        text = unicodedata.normalize('NFC', text.strip())
+        if self.g2p_cache is None:
+            return self.g2p(text)
+        key = (self.lang_code, self.repo_id, text, self.g2p_version)
+        value = self.g2p_cache.get(key)
+        if value is not None:
+            ps, tokens = json.loads(value)
+            if tokens is not None:
+                from misaki import en
+                tokens = [en.MToken(text=t, tag=g, whitespace=w, phonemes=p) for t, g, w, p in tokens]
+            return ps, tokens
+        ps, tokens = self.g2p(text)
+        # Serialize now, before en_tokenize and join_timestamps mutate tokens
+        value = [ps, [[t.text, t.tag, t.whitespace, t.phonemes] for t in tokens] if self.lang_code in 'ab' else None]
+        self.g2p_cache.put(key, json.dumps(value, ensure_ascii=False))
+        return ps, tokens
+
     def load_single_voice(self, voice: str):
-        if voice in self.voices:
-            return self.voices[voice]
+        key = (voice, 'cpu')
+        pack = self.voices.get(key)
+        if pack is not None:
+            return pack
+        if self.voice_bank is not None and voice in self.voice_bank:
+            # Lazy view: rows are read from the memory map on demand
+            pack = self.voice_bank[voice]
+            self.voices.put(key, pack)
+            return pack
         if voice.endswith('.pt'):
             f = voice
         else:
+            from huggingface_hub import hf_hub_download
             f = hf_hub_download(repo_id=self.repo_id, filename=f'voices/{voice}.pt')
             if not voice.startswith(self.lang_code):
                 v = LANG_CODES.get(voice, voice)
                 p = LANG_CODES.get(self.lang_code, self.lang_code)
                 logger.warning(f'Language mismatch, loading {v} voice into {p} pipeline.')
         pack = torch.load(f, weights_only=True)
-        self.voices[voice] = pack
+        self.voices.put(key, pack)
         return pack
 
+    @staticmethod
+    def parse_voice(voice: str, delimiter: str = ",") -> List[Tuple[str, float]]:
+        """Split a voice spec into (name, weight) pairs whose weights sum to 1.
+
+        'af_bella,af_sky' weighs voices equally; 'af_bella:0.7,af_sky:0.3'
+        (or any positive weights, which are normalized) weighs them explicitly.
+        """
+        parts = []
+        for part in voice.split(delimiter):
+            part = part.strip()
+            name, sep, weight = part.rpartition(':')
+            try:
+                parts.append((name, float(weight)) if sep else (part, 1.0))
+            except ValueError:
+                # Not a weight, e.g. the drive in C:\voices\af_bella.pt
+                parts.append((part, 1.0))
+        total = sum(w for _, w in parts)
+        if total <= 0 or any(w < 0 for _, w in parts):
+            raise ValueError(f'Voice weights must be non-negative with a positive sum: {voice!r}')
+        return [(name, w / total) for name, w in parts]
+
     """
     load_voice is a helper function that lazily downloads and loads a voice:
     Single voice can be requested (e.g. 'af_bella') or multiple voices (e.g. 'af_bella,af_jessica').
-    If multiple voices are requested, they are averaged.
+    If multiple voices are requested, they are averaged, or weighted as in 'af_bella:0.7,af_jessica:0.3'.
     Delimiter is optional and defaults to ','.
+    Packs are kept in self.voices, a bounded VoiceCache, already on device.
     """
-    def load_voice(self, voice: Union[str, torch.FloatTensor], delimiter: str = ",") -> torch.FloatTensor:
-        if isinstance(voice, torch.FloatTensor):
-            return voice
-        if voice in self.voices:
-            return self.voices[voice]
-        logger.debug(f"Loading voice: {voice}")
-        packs = [self.load_single_voice(v) for v in voice.split(delimiter)]
-        if len(packs) == 1:
-            return packs[0]
-        self.voices[voice] = torch.mean(torch.stack(packs), dim=0)
-        return self.voices[voice]
+    def load_voice(
+        self,
+        voice: Union[str, torch.FloatTensor, BankVoice],
+        delimiter: str = ",",
+        device: Union[str, torch.device, None] = None
+    ) -> Union[torch.FloatTensor, BankVoice]:
+        if isinstance(voice, (torch.Tensor, BankVoice)):
+            return voice if device is None else voice.to(device)
+        device = str(torch.device('cpu' if device is None else device))
+        if device == 'cpu' and delimiter not in voice and ':' not in voice:
+            return self.load_single_voice(voice)
+        key = (voice, device)
+        pack = self.voices.get(key)
+        if pack is not None:
+            return pack
+        logger.debug(f"Loading voice: {voice} on {device}")
+        parts = KPipeline.parse_voice(voice, delimiter)
+        if len(parts) == 1:
+            pack = self.load_single_voice(parts[0][0])
+        else:
+            packs = [self.load_single_voice(name) for name, _ in parts]
+            packs = [p.load() if isinstance(p, BankVoice) else p for p in packs]
+            pack = sum(w * p for p, (_, w) in zip(packs, parts))
+        pack = pack.to(device)
+        self.voices.put(key, pack)
+        return pack
 
     @staticmethod
     def tokens_to_ps(tokens: List[en.MToken]) -> str:
@@ -232,14 +487,42 @@ class KPipeline:
 
     @staticmethod
     def infer(
+        model: KModel,
+        ps: str,
+        pack: torch.FloatTensor,
+        speed: Union[float, Callable[[int], float]] = 1,
+        seed: Optional[int] = None
+    ) -> KModel.Output:
+        if callable(speed):
+            speed = speed(len(ps))
+        if seed is None:
+            return model(ps, pack[len(ps)-1], speed, return_output=True)
+        from .batcher import KBatcher
+        if isinstance(model, KBatcher):
+            raise ValueError('seed is not supported with KBatcher, which renders on its own thread')
+        # Deterministic synthesis: fixed SineGen phase and noise, global RNG left untouched
+        with _SEED_LOCK, torch.random.fork_rng():
+            torch.manual_seed(seed)
+            return model(ps, pack[len(ps)-1], speed, return_output=True)
+
+    def cached_infer(
+        self,
         model: KModel,
         ps: str,
         pack: torch.FloatTensor,
         speed: Union[float, Callable[[int], float]] = 1
     ) -> KModel.Output:
+        """Run KPipeline.infer through self.audio_cache, if any."""
+        if self.audio_cache is None:
+            return KPipeline.infer(model, ps, pack, speed, seed=self.seed)
         if callable(speed):
             speed = speed(len(ps))
-        return model(ps, pack[len(ps)-1], speed, return_output=True)
+        key = self.audio_cache.key(ps, pack[len(ps)-1], speed, model_id(model), self.seed)
+        output = self.audio_cache.get(key)
+        if output is None:
+            output = KPipeline.infer(model, ps, pack, speed, seed=self.seed)
+            self.audio_cache.put(key, output)
+        return output
 
     def generate_from_tokens(
         self,
@@ -266,14 +549,14 @@ class KPipeline:
         if model and voice is None:
             raise ValueError('Specify a voice: pipeline.generate_from_tokens(..., voice="af_heart")')
         
-        pack = self.load_voice(voice).to(model.device) if model else None
+        pack = self.load_voice(voice, device=model.device) if model else None
 
         # Handle raw phoneme string
         if isinstance(tokens, str):
             logger.debug("Processing phonemes from raw string")
             if len(tokens) > 510:
                 raise ValueError(f'Phoneme string too long: {len(tokens)} > 510')
-            output = KPipeline.infer(model, tokens, pack, speed) if model else None
+            output = self.cached_infer(model, tokens, pack, speed) if model else None
             yield self.Result(graphemes='', phonemes=tokens, output=output)
             return
         
@@ -286,7 +569,7 @@ class KPipeline:
                 logger.warning(f"Unexpected len(ps) == {len(ps)} > 510 and ps == '{ps}'")
                 logger.warning("Truncating to 510 characters")
                 ps = ps[:510]
-            output = KPipeline.infer(model, ps, pack, speed) if model else None
+            output = self.cached_infer(model, ps, pack, speed) if model else None
             if output is not None and output.pred_dur is not None:
                 KPipeline.join_timestamps(tks, output.pred_dur)
             yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output)
@@ -303,31 +586,45 @@ class KPipeline:
         # We track 2 counts, measured in half-frames: (left, right)
         # This way we can cut space characters in half
         # TODO: Is -3 an appropriate offset?
-        left = right = 2 * max(0, pred_dur[0].item() - 3)
+        pred_dur = pred_dur.cpu().numpy() if isinstance(pred_dur, torch.Tensor) else np.asarray(pred_dur)
+        start = 2 * max(0, int(pred_dur[0]) - 3)
         # Updates:
         # left = right + (2 * token_dur) + space_dur
         # right = left + space_dur
+        # So right grows by 2 * (token_dur + space_dur) per token, and left
+        # trails right by the previous space_dur. Walk the tokens once for
+        # indices only, then get every duration from one prefix sum.
+        timed, I, J, S = [], [], [], []
         i = 1
         for t in tokens:
             if i >= len(pred_dur)-1:
                 break
             if not t.phonemes:
                 if t.whitespace:
-                    i += 1
-                    left = right + pred_dur[i].item()
-                    right = left + pred_dur[i].item()
-                    i += 1
+                    # A bare space: no timestamps, counts as a space of pred_dur[i+1]
+                    timed.append(None)
+                    I.append(i+1); J.append(i+1); S.append(True)
+                    i += 2
                 continue
             j = i + len(t.phonemes)
             if j >= len(pred_dur):
                 break
-            t.start_ts = left / MAGIC_DIVISOR
-            token_dur = pred_dur[i: j].sum().item()
-            space_dur = pred_dur[j].item() if t.whitespace else 0
-            left = right + (2 * token_dur) + space_dur
-            t.end_ts = left / MAGIC_DIVISOR
-            right = left + space_dur
+            timed.append(t)
+            I.append(i); J.append(j); S.append(bool(t.whitespace))
             i = j + (1 if t.whitespace else 0)
+        if not timed:
+            return
+        I, J = np.array(I), np.array(J)
+        cumsum = np.concatenate([[0], np.cumsum(pred_dur)])
+        token_dur = cumsum[J] - cumsum[I]
+        space_dur = np.where(S, pred_dur[J], 0)
+        right = start + np.cumsum(2 * (token_dur + space_dur))
+        left = right - 2 * (token_dur + space_dur) - np.concatenate([[0], space_dur[:-1]])
+        end = right - space_dur
+        for t, l, e in zip(timed, left.tolist(), end.tolist()):
+            if t is not None:
+                t.start_ts = l / MAGIC_DIVISOR
+                t.end_ts = e / MAGIC_DIVISOR
 
     @dataclass
     class Result:
@@ -358,19 +655,12 @@ class KPipeline:
             return 3
         #### MARK: END BACKWARD COMPAT ####
 
-    def __call__(
+    def chunk(
         self,
         text: Union[str, List[str]],
-        voice: Optional[str] = None,
-        speed: Union[float, Callable[[int], float]] = 1,
-        split_pattern: Optional[str] = r'\n+',
-        model: Optional[KModel] = None
-    ) -> Generator['KPipeline.Result', None, None]:
-        model = model or self.model
-        if model and voice is None:
-            raise ValueError('Specify a voice: en_us_pipeline(text="Hello world!", voice="af_heart")')
-        pack = self.load_voice(voice).to(model.device) if model else None
-        
+        split_pattern: Optional[str] = r'\n+'
+    ) -> Generator[Tuple[int, str, str, Optional[List[en.MToken]]], None, None]:
+        """Run G2P and chunking only, yielding (text_index, graphemes, phonemes, tokens)."""
         # Convert input to list of segments
         if isinstance(text, str):
             text = re.split(split_pattern, text.strip()) if split_pattern else [text]
@@ -383,17 +673,14 @@ class KPipeline:
             # English processing (unchanged)
             if self.lang_code in 'ab':
                 logger.debug(f"Processing English text: {graphemes[:50]}{'...' if len(graphemes) > 50 else ''}")
-                _, tokens = self.g2p(graphemes)
+                _, tokens = self.cached_g2p(graphemes)
                 for gs, ps, tks in self.en_tokenize(tokens):
                     if not ps:
                         continue
                     elif len(ps) > 510:
                         logger.warning(f"Unexpected len(ps) == {len(ps)} > 510 and ps == '{ps}'")
                         ps = ps[:510]
-                    output = KPipeline.infer(model, ps, pack, speed) if model else None
-                    if output is not None and output.pred_dur is not None:
-                        KPipeline.join_timestamps(tks, output.pred_dur)
-                    yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, text_index=graphemes_index)
+                    yield graphemes_index, gs, ps, tks
             
             # Non-English processing with chunking
             else:
@@ -431,12 +718,137 @@ class KPipeline:
                     if not chunk.strip():
                         continue
                         
-                    ps, _ = self.g2p(chunk)
+                    ps, _ = self.cached_g2p(chunk)
                     if not ps:
                         continue
                     elif len(ps) > 510:
                         logger.warning(f'Truncating len(ps) == {len(ps)} > 510')
                         ps = ps[:510]
                         
-                    output = KPipeline.infer(model, ps, pack, speed) if model else None
-                    yield self.Result(graphemes=chunk, phonemes=ps, output=output, text_index=graphemes_index)
+                    yield graphemes_index, chunk, ps, None
+
+    def __call__(
+        self,
+        text: Union[str, List[str]],
+        voice: Optional[str] = None,
+        speed: Union[float, Callable[[int], float]] = 1,
+        split_pattern: Optional[str] = r'\n+',
+        model: Optional[KModel] = None,
+        prefetch: int = 0
+    ) -> Generator['KPipeline.Result', None, None]:
+        """Generate audio for text, one Result per chunk.
+
+        With prefetch > 0, G2P and chunking run on a background thread up to
+        that many chunks ahead, overlapping with model inference. Results are
+        yielded in the same order either way.
+        """
+        model = model or self.model
+        if model and voice is None:
+            raise ValueError('Specify a voice: en_us_pipeline(text="Hello world!", voice="af_heart")')
+        pack = self.load_voice(voice, device=model.device) if model else None
+        chunks = self.chunk(text, split_pattern)
+        if prefetch > 0:
+            chunks = prefetched(chunks, prefetch)
+        for graphemes_index, gs, ps, tks in chunks:
+            output = self.cached_infer(model, ps, pack, speed) if model else None
+            if tks is not None and output is not None and output.pred_dur is not None:
+                KPipeline.join_timestamps(tks, output.pred_dur)
+            yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, text_index=graphemes_index)
+
+    async def agenerate(
+        self,
+        text: Union[str, List[str]],
+        voice: Optional[str] = None,
+        speed: Union[float, Callable[[int], float]] = 1,
+        split_pattern: Optional[str] = r'\n+',
+        model: Optional[KModel] = None,
+        prefetch: int = 0,
+        executor: Optional[Executor] = None
+    ) -> AsyncGenerator['KPipeline.Result', None]:
+        """Async version of __call__, for use from an event loop.
+
+        G2P and inference for each chunk run on executor (a private thread if
+        None), so the loop is never blocked; Results are yielded in order as
+        they complete. Breaking out of the loop or cancelling the task stops
+        work once the chunk in flight finishes.
+
+            async for result in pipeline.agenerate(text, voice='af_heart'):
+                await websocket.send(result.audio.numpy().tobytes())
+        """
+        results = iterate_in_executor(lambda: self(text, voice, speed, split_pattern, model, prefetch), executor)
+        try:
+            async for result in results:
+                yield result
+        finally:
+            await results.aclose()
+
+    def staged(
+        self,
+        text: Union[str, List[str]],
+        voice: Optional[str] = None,
+        speed: Union[float, Callable[[int], float]] = 1,
+        split_pattern: Optional[str] = r'\n+',
+        model: Optional[KModel] = None,
+        encoder: Optional[Executor] = None,
+        decoder: Optional[Executor] = None,
+        lookahead: int = 2
+    ) -> Generator['KPipeline.Result', None, None]:
+        """Like __call__, but with the two model stages on separate executors.
+
+        model.encode (token cost) runs on encoder and model.decode (frame cost)
+        on decoder, each a private thread if None, so the next chunk is encoded
+        while the current one is vocoded. model is a KModel or a split
+        KOnnxModel. Results, audio_cache and seed behave as in __call__; seeded
+        decodes hold the process-wide seed lock, so they run one at a time.
+
+            with ThreadPoolExecutor(4) as decoders:
+                for result in pipeline.staged(text, voice='af_heart', decoder=decoders):
+                    ...
+        """
+        model = model or self.model
+        if not model or voice is None:
+            raise ValueError('Specify a model and a voice: pipeline.staged(text="Hello world!", voice="af_heart")')
+        pack = self.load_voice(voice, device=model.device)
+        fingerprint = model_id(model)
+
+        def encode(chunk):
+            _, _, ps, _ = chunk
+            ref_s = pack[len(ps)-1]
+            s = speed(len(ps)) if callable(speed) else speed
+            key = None if self.audio_cache is None else self.audio_cache.key(ps, ref_s, s, fingerprint, self.seed)
+            output = None if key is None else self.audio_cache.get(key)
+            return key, output, None if output is not None else model.encode(ps, ref_s, s)
+
+        def decode(encoded):
+            key, output, features = encoded
+            if output is not None:
+                return output
+            if self.seed is None:
+                audio = model.decode(features)
+            else:
+                # The encoder draws no random numbers, so seeding the decoder matches infer
+                with _SEED_LOCK, torch.random.fork_rng():
+                    torch.manual_seed(self.seed)
+                    audio = model.decode(features)
+            output = model.Output(audio=audio, pred_dur=features.pred_dur)
+            if key is not None:
+                self.audio_cache.put(key, output)
+            return output
+
+        owned = []
+        if encoder is None:
+            encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kokoro-encode')
+            owned.append(encoder)
+        if decoder is None:
+            decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kokoro-decode')
+            owned.append(decoder)
+        try:
+            chunks = self.chunk(text, split_pattern)
+            for (graphemes_index, gs, ps, tks), output in pipelined(chunks, encode, decode, encoder, decoder, lookahead):
+                if tks is not None and output.pred_dur is not None:
+                    KPipeline.join_timestamps(tks, output.pred_dur)
+                yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, text_index=graphemes_index)
+        finally:
+            # encoder first: its callbacks may still submit to decoder
+            for executor in owned:
+                executor.shutdown(wait=True)
@@ -0,0 +1,273 @@
+from .pipeline import KPipeline
+from collections import defaultdict
+from loguru import logger
+from multiprocessing import shared_memory
+from typing import Dict, Generator, List, Optional, Tuple, Union
+import itertools
+import multiprocessing as mp
+import numpy as np
+import os
+import queue
+import re
+import threading
+import torch
+
+def _share(audio: torch.FloatTensor) -> Tuple[str, int]:
+    '''Copy audio into a new shared memory block owned by the receiver.'''
+    audio = audio.detach().float().cpu().numpy()
+    shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+    np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+    try:
+        # The receiver unlinks the block, so this process must not at exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    shm.close()
+    return shm.name, audio.shape[0]
+
+def _take(name: str, samples: int) -> torch.FloatTensor:
+    '''Copy audio out of a block made by _share and free the block.'''
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return torch.from_numpy(np.frombuffer(shm.buf, dtype=np.float32, count=samples).copy())
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _worker(config: dict, tasks: mp.Queue, results: mp.Queue):
+    torch.set_num_threads(config['threads'])
+    from .model import KModel
+    try:
+        model = KModel(repo_id=config['repo_id'], model=config['model']).to(config['device']).prepare_for_inference()
+        pipeline = KPipeline(lang_code=config['lang_code'], repo_id=config['repo_id'], model=model,
+                             voice_bank=config['voice_bank'])
+    except Exception as e:
+        results.put(('error', None, None, None, RuntimeError(repr(e))))
+        return
+    results.put(('ready', None, None, None, os.getpid()))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job, index, text, voice, speed = task
+        n = 0
+        try:
+            for result in pipeline([text], voice=voice, speed=speed):
+                audio = None if result.audio is None else _share(result.audio)
+                pred_dur = None if result.pred_dur is None else result.pred_dur.tolist()
+                results.put(('result', job, index, n, (result.graphemes, result.phonemes, result.tokens, audio, pred_dur)))
+                n += 1
+        except Exception as e:
+            results.put(('error', job, index, n, RuntimeError(f"{type(e).__name__}: {e}")))
+            continue
+        results.put(('done', job, index, n, None))
+
+class KPool:
+    '''
+    KPool renders one long text on N worker processes, each with its own
+    KModel and KPipeline, for CPU throughput beyond what one GIL-bound
+    pipeline and torch intra-op threading can reach.
+
+    The text is split into segments by split_pattern (as in KPipeline), and
+    segments are sharded across workers. Results come back in the original
+    text_index order, as a generator, with audio passed through shared
+    memory rather than pickled. Give long texts many segments (paragraphs or
+    lines), since one segment never spans workers.
+
+    Workers are spawned, so to share one physical copy of the weights and
+    voices across them, pass a .safetensors model (see kokoro convert) and a
+    voice bank (see kokoro pack-voices); both are memory-mapped.
+
+        with KPool('a', repo_id='hexgrad/Kokoro-82M', processes=8, model='kokoro-v1_0.safetensors') as pool:
+            for result in pool(book, voice='af_heart'):
+                ...
+
+    Calls may overlap, from one thread or several: their segments share the
+    workers, and a router thread hands each call its own results.
+    '''
+    def __init__(
+        self,
+        lang_code: str,
+        repo_id: str = 'hexgrad/Kokoro-82M',
+        processes: Optional[int] = None,
+        threads: int = 1,
+        model: Optional[str] = None,
+        voice_bank: Optional[str] = None,
+        device: str = 'cpu',
+        start_method: str = 'spawn',
+        prefetch: Optional[int] = None
+    ):
+        self.processes = processes or max(1, (os.cpu_count() or 1) // threads)
+        # Segments in flight ahead of the consumer, which bounds shared memory use
+        self.prefetch = prefetch or 2 * self.processes
+        ctx = mp.get_context(start_method)
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        config = dict(lang_code=lang_code, repo_id=repo_id, threads=threads, model=model,
+                      voice_bank=voice_bank, device=device)
+        self._workers = [
+            ctx.Process(target=_worker, args=(config, self._tasks, self._results), daemon=True, name=f'KPool-{i}')
+            for i in range(self.processes)
+        ]
+        for p in self._workers:
+            p.start()
+        self._jobs = itertools.count()
+        # Guards _queues, _closed and _error; never held while waiting on results
+        self._lock = threading.Lock()
+        # job -> queue of that job's results; None collects worker start-up messages
+        self._queues: Dict[Optional[int], queue.Queue] = {None: queue.Queue()}
+        self._closed = False
+        self._error: Optional[RuntimeError] = None
+        self._router = threading.Thread(target=self._route, daemon=True, name='KPool-router')
+        self._router.start()
+        try:
+            for _ in self._workers:
+                kind, _, _, _, value = self._queues[None].get()
+                if kind == 'error':
+                    raise value
+        except BaseException:
+            self.close()
+            raise
+        with self._lock:
+            del self._queues[None]
+        logger.debug(f"KPool ready with {self.processes} workers")
+
+    def _route(self):
+        '''Move worker messages to their job's queue, freeing those of finished jobs.'''
+        while True:
+            try:
+                item = self._results.get(timeout=1)
+            except queue.Empty:
+                dead = [p.name for p in self._workers if p.exitcode is not None]
+                with self._lock:
+                    if dead and not self._closed and self._error is None:
+                        self._error = RuntimeError(f"KPool workers exited: {dead}")
+                        for results in self._queues.values():
+                            results.put(('error', None, None, None, self._error))
+                continue
+            if item is None:
+                return
+            kind, job, _, _, value = item
+            with self._lock:
+                results = self._queues.get(job)
+                if results is not None:
+                    results.put(item)
+            if results is None:
+                self._discard(kind, value)
+
+    def __call__(
+        self,
+        text: Union[str, List[str]],
+        voice: str,
+        speed: float = 1,
+        split_pattern: Optional[str] = r'\n+'
+    ) -> Generator[KPipeline.Result, None, None]:
+        if isinstance(text, str):
+            text = re.split(split_pattern, text.strip()) if split_pattern else [text]
+        todo = [i for i, segment in enumerate(text) if segment.strip()]
+        results = queue.Queue()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('KPool is closed')
+            if self._error is not None:
+                raise self._error
+            job = next(self._jobs)
+            self._queues[job] = results
+        submitted = 0
+        buffered: Dict[int, Dict[int, tuple]] = defaultdict(dict)
+        counts: Dict[int, int] = {}
+        error = None
+        try:
+            for k, index in enumerate(todo):
+                n = 0
+                while counts.get(index) is None or n < counts[index]:
+                    while submitted < len(todo) and submitted < k + self.prefetch:
+                        i = todo[submitted]
+                        self._tasks.put((job, i, text[i], voice, speed))
+                        submitted += 1
+                    if n in buffered[index]:
+                        yield self._result(index, buffered[index].pop(n))
+                        n += 1
+                        continue
+                    kind, _, i, m, value = results.get()
+                    if kind == 'result':
+                        buffered[i][m] = value
+                    elif kind == 'done':
+                        counts[i] = m
+                    else:
+                        error = value
+                        raise value
+        finally:
+            if error is None:
+                # Stopped early: wait out segments already submitted so that
+                # their shared memory is freed before this call returns
+                pending = set(todo[:submitted]) - set(counts)
+                while pending:
+                    kind, j, i, m, value = results.get()
+                    if kind == 'result':
+                        self._discard(kind, value)
+                    elif j is None:
+                        break  # the pool failed or closed
+                    else:
+                        pending.discard(i)
+            with self._lock:
+                del self._queues[job]
+            # Anything routed before unregistering; later messages the router frees
+            self._drain(results)
+            for segment in buffered.values():
+                for value in segment.values():
+                    self._discard('result', value)
+
+    @staticmethod
+    def _result(index: int, value: tuple) -> KPipeline.Result:
+        from .model import KModel
+        graphemes, phonemes, tokens, audio, pred_dur = value
+        output = None
+        if audio is not None:
+            output = KModel.Output(
+                audio=_take(*audio),
+                pred_dur=None if pred_dur is None else torch.LongTensor(pred_dur)
+            )
+        return KPipeline.Result(graphemes=graphemes, phonemes=phonemes, tokens=tokens, output=output, text_index=index)
+
+    @staticmethod
+    def _discard(kind: str, value):
+        if kind == 'result' and value[3] is not None:
+            _take(*value[3])
+
+    @classmethod
+    def _drain(cls, results: queue.Queue):
+        while True:
+            try:
+                kind, _, _, _, value = results.get_nowait()
+            except queue.Empty:
+                return
+            cls._discard(kind, value)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for results in self._queues.values():
+                results.put(('error', None, None, None, RuntimeError('KPool is closed')))
+        for _ in self._workers:
+            self._tasks.put(None)
+        # The router keeps reading while workers finish, so results they flush
+        # on exit are freed rather than left in shared memory
+        for p in self._workers:
+            p.join(timeout=10)
+            if p.exitcode is None:
+                p.terminate()
+        self._results.put(None)
+        self._router.join()
+        with self._lock:
+            for results in self._queues.values():
+                self._drain(results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,75 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+import json
+import os
+import threading
+import time
+import torch
+
+@dataclass
+class StageEvent:
+    '''
+    One timed sub-stage of KModel.forward_with_tokens. start is
+    time.perf_counter() seconds, duration is seconds, and inputs/outputs are
+    the shapes of the tensor arguments and results, in order.
+    '''
+    name: str
+    start: float
+    duration: float
+    inputs: List[tuple] = field(default_factory=list)
+    outputs: List[tuple] = field(default_factory=list)
+
+def shapes(value) -> List[tuple]:
+    if isinstance(value, torch.Tensor):
+        return [tuple(value.shape)]
+    if isinstance(value, (tuple, list)):
+        return [s for v in value for s in shapes(v)]
+    return []
+
+def run_stage(profilers: List[Callable[[StageEvent], None]], name: str, fn: Callable, *args, **kwargs):
+    '''Call fn, timing it and passing a StageEvent to every profiler.'''
+    sync = any(isinstance(a, torch.Tensor) and a.is_cuda for a in args)
+    if sync:
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    if sync:
+        torch.cuda.synchronize()
+    event = StageEvent(
+        name=name, start=start, duration=time.perf_counter() - start,
+        inputs=shapes(list(args) + list(kwargs.values())), outputs=shapes(out)
+    )
+    for profiler in profilers:
+        profiler(event)
+    return out
+
+class ChromeTrace:
+    '''
+    Profiler callback that collects StageEvents as Chrome trace events, for
+    chrome://tracing or https://ui.perfetto.dev. Safe to share across threads;
+    each thread gets its own track.
+
+        trace = ChromeTrace()
+        with model.profile(trace):
+            model(phonemes, ref_s)
+        trace.save('kokoro.trace.json')
+    '''
+    def __init__(self):
+        self.events: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: StageEvent):
+        record = dict(
+            name=event.name, cat='kokoro', ph='X',
+            ts=event.start * 1e6, dur=event.duration * 1e6,
+            pid=os.getpid(), tid=threading.get_ident(),
+            args=dict(inputs=event.inputs, outputs=event.outputs)
+        )
+        with self._lock:
+            self.events.append(record)
+
+    def save(self, path: str):
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit='ms'), f)
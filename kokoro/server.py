@@ -0,0 +1,284 @@
+"""Kokoro HTTP server
+A small asyncio HTTP/1.1 server around KPipeline, with no dependencies beyond
+kokoro itself. One KModel is shared by one KPipeline per language, and every
+Result is streamed to the client as soon as it is produced.
+
+python3 -m kokoro serve -l a b --port 8880
+curl -N localhost:8880/tts -d '{"text": "Hello world!", "voice": "af_heart"}' > hello.wav
+curl -N localhost:8880/tts -d '{"text": "Hello world!", "voice": "af_heart", "format": "sse"}'
+
+Endpoints:
+GET  /health  200 while the process is serving
+GET  /ready   200 once the model and pipelines are loaded, else 503
+POST /tts     JSON {text, voice, lang?, speed?, format?} where format is
+              'wav' (default, chunked WAV of unknown length), 'pcm' (raw
+              s16le mono at 24 kHz) or 'sse' (server-sent events, one per
+              Result, with base64 PCM and token timestamps)
+
+At most max_concurrency requests synthesize at once and at most max_queue
+more wait for a slot; anything beyond that gets 429 with Retry-After.
+"""
+
+from .audio import SAMPLE_RATE, pcm16, wav_header
+from .pipeline import iterate_in_executor
+from concurrent.futures import Executor, ThreadPoolExecutor
+from loguru import logger
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import base64
+import json
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 429: 'Too Many Requests', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+class KServer:
+    '''
+    KServer serves pipelines, a dict of lang_code -> KPipeline (or anything
+    with the same __call__), over HTTP. It can start listening before the
+    pipelines exist: /ready answers 503 until ready is set, e.g. by load().
+
+        server = KServer(max_concurrency=2)
+        await server.start('0.0.0.0', 8880)
+        await server.load(lambda: {'a': KPipeline(lang_code='a', repo_id=..., model=model)})
+        await server.serve_forever()
+    '''
+    def __init__(
+        self,
+        pipelines: Optional[Dict[str, object]] = None,
+        max_concurrency: int = 1,
+        max_queue: int = 16,
+        executor: Optional[Executor] = None,
+        max_body: int = 1 << 20
+    ):
+        self.pipelines = dict(pipelines or {})
+        self.ready = bool(self.pipelines)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='KServer')
+        self.max_body = max_body
+        self.pending = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._server = None
+
+    async def load(self, make: Callable[[], Dict[str, object]]):
+        loop = asyncio.get_running_loop()
+        self.pipelines.update(await loop.run_in_executor(self.executor, make))
+        self.ready = True
+        logger.info(f"Ready: {sorted(self.pipelines)}")
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8880) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self.handle, host, port)
+        address = self._server.sockets[0].getsockname()[:2]
+        logger.info(f"Listening on http://{address[0]}:{address[1]}")
+        return address
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        n = int(headers.get('content-length', 0))
+        if n > self.max_body:
+            raise HTTPError(413, f'Body over {self.max_body} bytes')
+        body = await reader.readexactly(n) if n else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode('utf-8')
+        head = dict({'Content-Type': 'application/json', 'Content-Length': str(len(data))}, **(headers or {}))
+        writer.write(self._head(status, head) + data)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f'HTTP/1.1 {status} {REASONS[status]}', 'Connection: close']
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, headers, body = await self._read_request(reader)
+                if path == '/health':
+                    await self._send(writer, 200, dict(status='ok', pending=self.pending))
+                elif path == '/ready':
+                    await self._send(writer, 200 if self.ready else 503, dict(ready=self.ready, languages=sorted(self.pipelines)))
+                elif path == '/tts':
+                    if method != 'POST':
+                        raise HTTPError(405, 'Use POST')
+                    await self._tts(writer, body)
+                else:
+                    raise HTTPError(404, f'No route {path}')
+            except HTTPError as e:
+                await self._send(writer, e.status, dict(error=e.message), e.headers)
+            except (ValueError, KeyError) as e:
+                await self._send(writer, 400, dict(error=repr(e)))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            writer.close()
+
+    def _parse(self, body: bytes) -> dict:
+        request = json.loads(body or b'{}')
+        if not isinstance(request, dict) or not isinstance(request.get('text'), str) or not request['text'].strip():
+            raise HTTPError(400, "Expected JSON with a non-empty 'text'")
+        voice = request.get('voice', 'af_heart')
+        if not isinstance(voice, str) or not voice:
+            raise ValueError(f"'voice' must be a non-empty string, got {voice!r}")
+        lang = request.get('lang', voice[0])
+        if not isinstance(lang, str):
+            raise ValueError(f"'lang' must be a string, got {lang!r}")
+        if lang not in self.pipelines:
+            raise HTTPError(400, f'Language {lang!r} is not served, try one of {sorted(self.pipelines)}')
+        fmt = request.get('format', 'wav')
+        if fmt not in ('wav', 'pcm', 'sse'):
+            raise HTTPError(400, f'Unknown format {fmt!r}')
+        try:
+            speed = float(request.get('speed', 1))
+        except TypeError:
+            raise ValueError(f"'speed' must be a number, got {request['speed']!r}")
+        return dict(text=request['text'], voice=voice, lang=lang, speed=speed, format=fmt)
+
+    async def _tts(self, writer: asyncio.StreamWriter, body: bytes):
+        if not self.ready:
+            raise HTTPError(503, 'Not ready', {'Retry-After': '1'})
+        request = self._parse(body)
+        if self.pending >= self.max_concurrency + self.max_queue:
+            raise HTTPError(429, 'Too many requests', {'Retry-After': '1'})
+        self.pending += 1
+        try:
+            async with self._slots:
+                await self._stream(writer, request)
+        finally:
+            self.pending -= 1
+
+    async def _stream(self, writer: asyncio.StreamWriter, request: dict):
+        pipeline = self.pipelines[request['lang']]
+        fmt = request['format']
+        agenerate = getattr(pipeline, 'agenerate', None)
+        if agenerate is not None:
+            results = agenerate(request['text'], voice=request['voice'], speed=request['speed'], executor=self.executor)
+        else:
+            results = iterate_in_executor(
+                lambda: pipeline(request['text'], voice=request['voice'], speed=request['speed']), self.executor
+            )
+        content_type = {'wav': 'audio/wav', 'pcm': f'audio/L16; rate={SAMPLE_RATE}; channels=1', 'sse': 'text/event-stream'}[fmt]
+        started = False
+        offset = 0.0
+        try:
+            async for result in results:
+                if not started:
+                    # Headers wait for the first Result so that errors before it are proper 4xx/5xx
+                    writer.write(self._head(200, {'Content-Type': content_type, 'Transfer-Encoding': 'chunked', 'Cache-Control': 'no-cache'}))
+                    if fmt == 'wav':
+                        self._chunk(writer, wav_header())
+                    started = True
+                if result.audio is None:
+                    continue
+                pcm = pcm16(result.audio)
+                if fmt == 'sse':
+                    event = dict(
+                        text_index=result.text_index, graphemes=result.graphemes, phonemes=result.phonemes,
+                        offset=offset, duration=len(result.audio) / SAMPLE_RATE,
+                        tokens=[dict(text=t.text, start_ts=t.start_ts, end_ts=t.end_ts) for t in result.tokens or []],
+                        audio=base64.b64encode(pcm).decode('ascii')
+                    )
+                    self._chunk(writer, f"event: result\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                else:
+                    self._chunk(writer, pcm)
+                offset += len(result.audio) / SAMPLE_RATE
+                # Backpressure: a slow client holds up its own generator, not the loop
+                await writer.drain()
+        except ConnectionError as e:
+            # The client went away mid-stream; nothing to answer
+            logger.debug(f"Client disconnected: {e!r}")
+            return
+        except Exception as e:
+            if not started:
+                logger.exception(e)
+                raise HTTPError(500, repr(e))
+            logger.exception(e)
+            return
+        finally:
+            await results.aclose()
+        if not started:
+            writer.write(self._head(200, {'Content-Type': content_type, 'Transfer-Encoding': 'chunked'}))
+            if fmt == 'wav':
+                self._chunk(writer, wav_header())
+        if fmt == 'sse':
+            self._chunk(writer, b'event: done\ndata: {}\n\n')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    def _chunk(writer: asyncio.StreamWriter, data: bytes):
+        if data:
+            writer.write(f'{len(data):X}\r\n'.encode('latin-1') + data + b'\r\n')
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='kokoro serve', description='Serve KPipeline over HTTP')
+    parser.add_argument('-l', '--language', nargs='+', default=['a'], help='Languages to serve, sharing one KModel')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8880)
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--model', help='Path to a .pth, .safetensors or .onnx model (default: download from --repo-id); '
+                        '.onnx runs on onnxruntime, see kokoro export-onnx')
+    parser.add_argument('--voice-bank', '--voice_bank', help='Serve voices from this voice bank (see kokoro pack-voices)')
+    parser.add_argument('--device', help="'cpu', 'cuda' or 'mps' (default: auto)")
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests synthesized at once')
+    parser.add_argument('--max-queue', '--max_queue', type=int, default=16, help='Requests waiting for a slot before 429s')
+    args = parser.parse_args(argv)
+
+    def make():
+        import torch
+        from .model import KModel
+        from .pipeline import KPipeline
+        if args.model and args.model.endswith('.onnx'):
+            from .onnx import KOnnxModel
+            model = KOnnxModel(args.model)
+        else:
+            device = args.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+            model = KModel(repo_id=args.repo_id, model=args.model).to(device).prepare_for_inference()
+        return {
+            lang: KPipeline(lang_code=lang, repo_id=args.repo_id, model=model, voice_bank=args.voice_bank)
+            for lang in args.language
+        }
+
+    async def run():
+        server = KServer(max_concurrency=args.concurrency, max_queue=args.max_queue)
+        await server.start(args.host, args.port)
+        await server.load(make)
+        await server.serve_forever()
+
+    logger.enable('kokoro')
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
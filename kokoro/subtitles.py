@@ -0,0 +1,68 @@
+from .pipeline import KPipeline
+from typing import Iterable, List, TextIO, Tuple
+
+SAMPLE_RATE = 24000
+
+def format_timestamp(seconds: float, fmt: str = 'srt') -> str:
+    ms = max(0, round(seconds * 1000))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{',' if fmt == 'srt' else '.'}{ms:03d}"
+
+class SubtitleWriter:
+    '''
+    SubtitleWriter streams SRT or WebVTT cues from KPipeline.Results, one
+    Result at a time, keeping a running offset so that cue times are global
+    across chunks rather than relative to each chunk.
+
+    By default there is one cue per chunk. With words=True there is one cue
+    per timed token, which requires English pipelines (tokens with start_ts).
+
+        with open('out.srt', 'w') as f:
+            writer = SubtitleWriter(f, fmt='srt')
+            for result in pipeline(text, voice='af_heart'):
+                writer.write(result)
+    '''
+    def __init__(self, file: TextIO, fmt: str = 'srt', words: bool = False):
+        assert fmt in ('srt', 'vtt'), fmt
+        self.file = file
+        self.fmt = fmt
+        self.words = words
+        self.offset = 0.0
+        self.count = 0
+        if fmt == 'vtt':
+            self.file.write('WEBVTT\n\n')
+
+    def cues(self, result: KPipeline.Result) -> List[Tuple[float, float, str]]:
+        '''Cues of one Result as (start, end, text), relative to that Result.'''
+        duration = 0.0 if result.audio is None else len(result.audio) / SAMPLE_RATE
+        timed = [t for t in result.tokens or [] if t.start_ts is not None and t.end_ts is not None]
+        if self.words:
+            return [(t.start_ts, t.end_ts, t.text) for t in timed if t.text.strip()]
+        if timed:
+            return [(timed[0].start_ts, timed[-1].end_ts, result.graphemes)]
+        return [(0.0, duration, result.graphemes)] if duration else []
+
+    def write(self, result: KPipeline.Result):
+        for start, end, text in self.cues(result):
+            self.count += 1
+            start = format_timestamp(self.offset + start, self.fmt)
+            end = format_timestamp(self.offset + end, self.fmt)
+            if self.fmt == 'srt':
+                self.file.write(f"{self.count}\n")
+            self.file.write(f"{start} --> {end}\n{text.strip()}\n\n")
+        if result.audio is not None:
+            self.offset += len(result.audio) / SAMPLE_RATE
+
+def write_subtitles(
+    results: Iterable[KPipeline.Result],
+    file: TextIO,
+    fmt: str = 'srt',
+    words: bool = False
+) -> int:
+    '''Write a whole Result stream as subtitles and return the number of cues.'''
+    writer = SubtitleWriter(file, fmt=fmt, words=words)
+    for result in results:
+        writer.write(result)
+    return writer.count
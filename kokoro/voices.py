@@ -0,0 +1,131 @@
+"""Packed, memory-mapped voice bank
+A voice bank is a single file holding many voice packs (510, 1, 256) behind a
+name index. KPipeline(voice_bank=...) maps it read-only and reads only the
+row it needs, pack[len(ps)-1], per chunk, so every worker process can serve
+every voice for a few KB of resident memory and no load time.
+
+python3 -m kokoro pack-voices -o voices.kvb
+python3 -m kokoro pack-voices -o voices.kvb --dtype float32 af_heart af_bella
+"""
+
+from typing import Dict, List, Optional, Union
+import argparse
+import json
+import numpy as np
+import struct
+import torch
+
+class VoiceBank:
+    '''
+    Layout: MAGIC, a little-endian uint64 header length, a JSON header
+    (dtype, per-voice shape, voice names in order), zero padding up to
+    ALIGN, then one C-ordered [n_voices, *shape] array.
+    '''
+    MAGIC = b'KOKOROVB'
+    ALIGN = 64
+    DTYPES = dict(float32=np.float32, float16=np.float16)
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            assert f.read(len(VoiceBank.MAGIC)) == VoiceBank.MAGIC, f"{path} is not a voice bank"
+            n, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(n))
+        self.dtype = header['dtype']
+        self.shape = tuple(header['shape'])
+        self.names: List[str] = header['voices']
+        self.index = {name: i for i, name in enumerate(self.names)}
+        offset = VoiceBank._data_offset(n)
+        self.data = np.memmap(path, dtype=VoiceBank.DTYPES[self.dtype], mode='r',
+                              offset=offset, shape=(len(self.names), *self.shape))
+
+    @staticmethod
+    def _data_offset(header_bytes: int) -> int:
+        n = len(VoiceBank.MAGIC) + 8 + header_bytes
+        return -(-n // VoiceBank.ALIGN) * VoiceBank.ALIGN
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> 'BankVoice':
+        return BankVoice(self, self.index[name])
+
+    @staticmethod
+    def build(path: str, voices: Dict[str, torch.FloatTensor], dtype: str = 'float16') -> 'VoiceBank':
+        names = list(voices)
+        packs = [voices[name].detach().float().cpu().numpy() for name in names]
+        shape = packs[0].shape
+        assert all(p.shape == shape for p in packs), [p.shape for p in packs]
+        header = json.dumps(dict(dtype=dtype, shape=list(shape), voices=names)).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(VoiceBank.MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(b'\0' * (VoiceBank._data_offset(len(header)) - f.tell()))
+            for p in packs:
+                f.write(p.astype(VoiceBank.DTYPES[dtype]).tobytes())
+        return VoiceBank(path)
+
+class BankVoice:
+    '''
+    A voice pack that lives in a VoiceBank. It indexes like the (510, 1, 256)
+    tensor from torch.load, but pack[i] copies just that one row out of the
+    map (as float32, on self.device). load() materializes the whole pack.
+    '''
+    def __init__(self, bank: VoiceBank, index: int, device: Union[str, torch.device] = 'cpu'):
+        self.bank = bank
+        self.index = index
+        self.device = torch.device(device)
+
+    @property
+    def name(self) -> str:
+        return self.bank.names[self.index]
+
+    @property
+    def shape(self) -> torch.Size:
+        return torch.Size(self.bank.shape)
+
+    def __len__(self) -> int:
+        return self.bank.shape[0]
+
+    def __getitem__(self, i) -> torch.FloatTensor:
+        row = np.array(self.bank.data[self.index][i], dtype=np.float32)
+        return torch.from_numpy(row).to(self.device)
+
+    def to(self, device: Union[str, torch.device]) -> 'BankVoice':
+        return BankVoice(self.bank, self.index, device)
+
+    def load(self) -> torch.FloatTensor:
+        return self[:]
+
+    def __repr__(self) -> str:
+        return f"BankVoice({self.name!r}, bank={self.bank.path!r}, dtype={self.bank.dtype})"
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='kokoro pack-voices', description='Pack voices into one memory-mapped voice bank')
+    parser.add_argument('voices', nargs='*', help='Voice names, or paths to .pt files (default: every voice in --repo-id)')
+    parser.add_argument('-o', '--output-file', '--output_file', required=True)
+    parser.add_argument('--repo-id', '--repo_id', default='hexgrad/Kokoro-82M')
+    parser.add_argument('--dtype', default='float16', choices=list(VoiceBank.DTYPES))
+    args = parser.parse_args(argv)
+
+    from huggingface_hub import hf_hub_download, list_repo_files
+    names = args.voices or sorted(
+        f[len('voices/'):-len('.pt')] for f in list_repo_files(args.repo_id)
+        if f.startswith('voices/') and f.endswith('.pt')
+    )
+    voices = {}
+    for name in names:
+        if name.endswith('.pt'):
+            f, name = name, name.rsplit('/', 1)[-1][:-len('.pt')]
+        else:
+            f = hf_hub_download(repo_id=args.repo_id, filename=f'voices/{name}.pt')
+        voices[name] = torch.load(f, weights_only=True)
+    bank = VoiceBank.build(args.output_file, voices, dtype=args.dtype)
+    print(f"{args.output_file}: {len(bank)} voices, {bank.dtype}")
+
+if __name__ == '__main__':
+    main()
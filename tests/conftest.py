@@ -0,0 +1,46 @@
+import pytest
+
+# The Decoder hardcodes 512/1024 channels, so only ALBERT and depth shrink
+TINY_CONFIG = dict(
+    vocab={c: i + 1 for i, c in enumerate("abcdefghijklmnopqrstuvwxyz .,")},
+    n_token=32,
+    hidden_dim=512,
+    style_dim=128,
+    n_layer=1,
+    max_dur=50,
+    dropout=0.2,
+    n_mels=80,
+    text_encoder_kernel_size=5,
+    plbert=dict(
+        hidden_size=32, num_attention_heads=2, intermediate_size=64,
+        max_position_embeddings=64, num_hidden_layers=1, dropout=0.1
+    ),
+    istftnet=dict(
+        upsample_kernel_sizes=[20, 12], upsample_rates=[10, 6], gen_istft_hop_size=5,
+        gen_istft_n_fft=20, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+        resblock_kernel_sizes=[3, 7, 11], upsample_initial_channel=512
+    ),
+)
+
+
+@pytest.fixture
+def tiny_model(tmp_path):
+    '''Factory for randomly initialised KModels (an empty checkpoint loads nothing).'''
+    torch = pytest.importorskip("torch")
+    from kokoro.model import KModel
+    checkpoint = tmp_path / "empty.pth"
+    torch.save({}, checkpoint)
+
+    def make(seed=0, **kwargs):
+        torch.manual_seed(seed)
+        return KModel(repo_id="tiny", config=TINY_CONFIG, model=str(checkpoint), **kwargs).prepare_for_inference()
+    return make
+
+
+@pytest.fixture
+def no_noise(monkeypatch):
+    '''Zero SineGen's random phases and noise, so that renders are deterministic.'''
+    torch = pytest.importorskip("torch")
+    monkeypatch.setattr(torch, "rand", lambda *size, **kwargs: torch.zeros(*size, **kwargs))
+    monkeypatch.setattr(torch, "randn_like", torch.zeros_like)
+
@@ -0,0 +1,81 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from kokoro.batcher import KBatcher, _Request
+from kokoro.model import KModel
+import torch
+
+
+class EchoModel:
+    '''Stands in for KModel: audio is the phoneme length, filled with ref_s[0].'''
+    device = torch.device('cpu')
+
+    def __init__(self):
+        self.batches = []
+
+    def forward_batch(self, phonemes, ref_s, speed, return_output=False):
+        self.batches.append(list(phonemes))
+        return [
+            KModel.Output(audio=torch.full((len(ps),), ref_s[i, 0].item() * speed[i]))
+            for i, ps in enumerate(phonemes)
+        ]
+
+
+def test_results_route_back_to_callers():
+    model = EchoModel()
+    with KBatcher(model, max_batch_size=4, max_wait=0.05, bucket_size=8) as batcher:
+        def call(i):
+            ps = 'a' * (1 + i % 20)
+            return ps, i, batcher(ps, torch.full((1, 256), float(i)), speed=2)
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(call, range(32)))
+    for ps, i, audio in results:
+        assert audio.shape == (len(ps),)
+        assert torch.all(audio == 2 * i)
+    assert sum(map(len, model.batches)) == 32
+    assert all(len(b) <= 4 for b in model.batches)
+    assert all(len({len(ps) // 8 for ps in b}) == 1 for b in model.batches)
+    assert any(len(b) > 1 for b in model.batches)
+
+
+def test_errors_propagate():
+    class BrokenModel(EchoModel):
+        def forward_batch(self, *args, **kwargs):
+            raise ValueError('boom')
+
+    with KBatcher(BrokenModel()) as batcher:
+        future = batcher.submit('abc', torch.zeros(1, 256))
+        assert isinstance(future.exception(timeout=5), ValueError)
+
+
+def test_submit_racing_close_never_hangs():
+    for _ in range(20):
+        batcher = KBatcher(EchoModel(), max_wait=0.001)
+        futures, refused = [], []
+
+        def submit():
+            for _ in range(50):
+                try:
+                    futures.append(batcher.submit('ab', torch.zeros(1, 256)))
+                except RuntimeError:
+                    refused.append(1)
+        with ThreadPoolExecutor(4) as pool:
+            for _ in range(4):
+                pool.submit(submit)
+            batcher.close()
+        # Every accepted request resolves, with audio or with the closed error
+        for future in futures:
+            assert future.exception(timeout=5) is None or 'closed' in str(future.exception())
+
+
+def test_leftover_requests_fail_when_worker_stops():
+    batcher = KBatcher(EchoModel())
+    batcher.close()
+    request = _Request(phonemes='ab', ref_s=torch.zeros(1, 256), speed=1)
+    # As if it had been queued behind the sentinel
+    batcher._queue.put(None)
+    batcher._queue.put(request)
+    batcher._run()
+    with pytest.raises(RuntimeError, match='closed'):
+        request.future.result(timeout=1)
+    with pytest.raises(RuntimeError, match='closed'):
+        batcher.submit('ab', torch.zeros(1, 256))
@@ -0,0 +1,83 @@
+import torch
+import pytest
+from kokoro.istftnet import AdainResBlk1d, length_to_mask
+from kokoro.modules import ProsodyPredictor
+
+
+@pytest.fixture
+def lengths():
+    return torch.LongTensor([13, 7, 10])
+
+
+def pad_batch(rows):
+    x = torch.zeros(len(rows), rows[0].shape[0], max(r.shape[-1] for r in rows))
+    for i, r in enumerate(rows):
+        x[i, :, :r.shape[-1]] = r
+    return x
+
+
+@pytest.mark.parametrize("upsample", ['none', True])
+def test_adain_resblk_masked_matches_single(lengths, upsample):
+    torch.manual_seed(0)
+    block = AdainResBlk1d(16, 8, style_dim=4, upsample=upsample).eval()
+    rows = [torch.randn(16, n) for n in lengths.tolist()]
+    s = torch.randn(len(rows), 4)
+    m = length_to_mask(lengths, int(lengths.max())).unsqueeze(1)
+    with torch.no_grad():
+        batched = block(pad_batch(rows), s, m)
+        scale = 1 if upsample == 'none' else 2
+        for i, r in enumerate(rows):
+            single = block(r.unsqueeze(0), s[i:i+1])
+            n = r.shape[-1] * scale
+            assert torch.allclose(batched[i, :, :n], single[0], atol=1e-5)
+            assert not batched[i, :, n:].any()
+
+
+def test_f0ntrain_masked_matches_single(lengths):
+    torch.manual_seed(0)
+    predictor = ProsodyPredictor(style_dim=4, d_hid=16, nlayers=1).eval()
+    rows = [torch.randn(20, n) for n in lengths.tolist()]
+    s = torch.randn(len(rows), 4)
+    m = length_to_mask(lengths, int(lengths.max())).unsqueeze(1)
+    with torch.no_grad():
+        F0, N = predictor.F0Ntrain(pad_batch(rows), s, m)
+        for i, r in enumerate(rows):
+            F0_i, N_i = predictor.F0Ntrain(r.unsqueeze(0), s[i:i+1])
+            n = 2 * r.shape[-1]
+            assert torch.allclose(F0[i, :n], F0_i[0], atol=1e-5)
+            assert torch.allclose(N[i, :n], N_i[0], atol=1e-5)
+
+
+def test_generator_source_per_row(lengths):
+    from kokoro.istftnet import Generator
+    torch.manual_seed(0)
+    generator = Generator(
+        style_dim=8, resblock_kernel_sizes=[3, 7, 11], upsample_rates=[10, 6],
+        upsample_initial_channel=32, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+        upsample_kernel_sizes=[20, 12], gen_istft_n_fft=20, gen_istft_hop_size=5
+    ).eval()
+    rows = [100 + 20 * torch.rand(1, n) for n in lengths.tolist()]
+    f0 = pad_batch(rows).squeeze(1)
+    m = length_to_mask(lengths, int(lengths.max())).unsqueeze(1)
+    torch.manual_seed(1)
+    har = generator.source(f0, m)
+    torch.manual_seed(1)
+    for i, r in enumerate(rows):
+        single = generator.source(r)
+        n = single.shape[-1]
+        assert torch.allclose(har[i, :, :n], single[0], atol=1e-6)
+        assert not har[i, :, n:].any()
+
+
+def test_forward_batch_matches_forward(tiny_model, no_noise):
+    model = tiny_model()
+    phonemes = ['hello world', 'abc', 'the quick brown fox']
+    ref_s = torch.randn(len(phonemes), 256)
+    batched = model.forward_batch(phonemes, ref_s, speed=4, return_output=True)
+    for ps, r, out in zip(phonemes, ref_s, batched):
+        single = model(ps, r.view(1, -1), 4, return_output=True)
+        assert torch.equal(out.pred_dur, single.pred_dur)
+        assert out.audio.shape == single.audio.shape
+        # Random weights put the waveform near 1e8, which turns float rounding in
+        # the masked statistics into ~0.3%; a leaking pad was 50-100%
+        assert (out.audio - single.audio).norm() <= 1e-2 * single.audio.norm()
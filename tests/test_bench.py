@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+from kokoro.bench import StageTimer
+
+
+def test_stage_timer_wraps_and_restores():
+    def g2p(text):
+        return text.upper()
+
+    def tokenize(items):
+        yield from items
+
+    obj = SimpleNamespace(g2p=g2p, tokenize=tokenize)
+    timer = StageTimer()
+    timer.wrap(obj, 'g2p', 'g2p')
+    timer.wrap(obj, 'tokenize', 'en_tokenize')
+    assert obj.g2p('hi') == 'HI'
+    assert obj.g2p('there') == 'THERE'
+    assert list(obj.tokenize([1, 2, 3])) == [1, 2, 3]
+    assert dict(timer.calls) == dict(g2p=2, en_tokenize=1)
+    assert set(timer.totals) == {'g2p', 'en_tokenize'}
+    timer.reset()
+    assert not timer.totals
+    timer.restore()
+    assert obj.g2p is g2p and obj.tokenize is tokenize
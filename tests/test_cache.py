@@ -0,0 +1,152 @@
+from kokoro.cache import G2PCache
+
+
+def test_lru_evicts_oldest():
+    cache = G2PCache(maxsize=2)
+    cache.put(('a',), '1')
+    cache.put(('b',), '2')
+    assert cache.get(('a',)) == '1'
+    cache.put(('c',), '3')
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) == '1'
+    assert cache.get(('c',)) == '3'
+    assert cache.stats == dict(hits=3, disk_hits=0, misses=1, size=2)
+
+
+def test_disk_tier_is_shared(tmp_path):
+    path = str(tmp_path / 'g2p.sqlite')
+    key = ('a', 'hexgrad/Kokoro-82M', 'Hello world!', 'misaki-0.9.4')
+    G2PCache(path=path).put(key, '["həlˈO wˈɜɹld!", null]')
+    other = G2PCache(maxsize=1, path=path)
+    assert other.get(key) == '["həlˈO wˈɜɹld!", null]'
+    assert other.get(key) == '["həlˈO wˈɜɹld!", null]'
+    assert other.get(('missing',)) is None
+    assert (other.hits, other.disk_hits, other.misses) == (1, 1, 1)
+    other.clear()
+    assert G2PCache(path=path).get(key) is None
+
+
+def test_audio_cache_roundtrip_and_eviction(tmp_path):
+    import torch
+    from kokoro.cache import AudioCache
+    from kokoro.model import KModel
+
+    output = KModel.Output(audio=torch.rand(2400) * 2 - 1, pred_dur=torch.LongTensor([3, 5, 2]))
+    key = AudioCache.key('həlˈO', torch.randn(1, 256), 1.0, 'hexgrad/Kokoro-82M')
+    for dtype, atol in [('float32', 0), ('float16', 1e-3), ('int16', 1 / 32767)]:
+        cache = AudioCache(path=str(tmp_path / f'{dtype}.sqlite'), dtype=dtype)
+        cache.put(key, output)
+        hit = AudioCache(path=cache.path).get(key)
+        assert torch.allclose(hit.audio, output.audio, atol=atol)
+        assert torch.equal(hit.pred_dur, output.pred_dur)
+    # The default storage is lossy; only float32 hits are the rendered audio
+    default = AudioCache()
+    default.put(key, output)
+    assert default.dtype == 'float16' and not torch.equal(default.get(key).audio, output.audio)
+    exact = AudioCache(dtype='float32')
+    exact.put(key, output)
+    assert torch.equal(exact.get(key).audio, output.audio)
+
+    cache = AudioCache(max_bytes=2 * (4800 + 12), dtype='float16')
+    for i in range(3):
+        cache.put(str(i), output)
+    assert cache.get('0') is None
+    assert cache.get('1') is not None and cache.get('2') is not None
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_voice_cache_bounds_and_stats():
+    import torch
+    from kokoro.cache import VoiceCache
+
+    pack = torch.zeros(510, 1, 256)
+    cache = VoiceCache(maxsize=3, max_bytes=2 * pack.nbytes)
+    cache.put(('af_heart', 'cpu'), pack)
+    cache.put(('af_bella', 'cpu'), pack.clone())
+    assert cache.get(('af_heart', 'cpu')) is pack
+    cache.put(('af_bella:0.7,af_sky:0.3', 'cpu'), pack.clone())
+    assert ('af_bella', 'cpu') not in cache
+    assert cache.get(('af_heart', 'cpu')) is pack
+    assert cache.get(('af_bella', 'cpu')) is None
+    assert cache.stats == dict(hits=2, misses=1, evictions=1, size=2, nbytes=2 * pack.nbytes)
+
+
+def test_cached_g2p_sees_same_text_with_and_without_cache():
+    from kokoro.pipeline import KPipeline
+
+    seen = []
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.lang_code, pipeline.repo_id, pipeline.g2p_version = 'e', 'hexgrad/Kokoro-82M', 'test'
+    pipeline.g2p = lambda text: seen.append(text) or (text.upper(), None)
+    text = ' Cafe\u0301 \n'  # decomposed
+    pipeline.g2p_cache = None
+    uncached = pipeline.cached_g2p(text)
+    pipeline.g2p_cache = G2PCache()
+    assert pipeline.cached_g2p(text) == uncached
+    assert pipeline.cached_g2p(text) == uncached
+    assert seen == ['Café', 'Café']
+
+
+
+def test_g2p_version_is_looked_up_only_for_the_cache(monkeypatch):
+    import importlib.metadata
+    from kokoro.pipeline import KPipeline
+
+    looked_up = []
+    monkeypatch.setattr(importlib.metadata, 'version', lambda name: looked_up.append(name) or '1.2.3')
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.lang_code, pipeline.repo_id, pipeline.trf = 'e', 'hexgrad/Kokoro-82M', True
+    pipeline.g2p = lambda text: (text.upper(), None)
+    pipeline.g2p_cache = None
+    assert pipeline.cached_g2p('hola') == ('HOLA', None)
+    assert looked_up == []
+    pipeline.g2p_cache = G2PCache()
+    pipeline.cached_g2p('hola')
+    pipeline.cached_g2p('adios')
+    assert pipeline.g2p_version == 'misaki-1.2.3-trf' and looked_up == ['misaki']
+
+def test_cached_infer_with_seed_matches_fresh_render(tiny_model):
+    import torch
+    from kokoro.cache import AudioCache
+    from kokoro.pipeline import KPipeline
+
+    model = tiny_model()
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.seed, pipeline.audio_cache = 3, AudioCache(dtype='float32')
+    pack = torch.randn(510, 1, 256)
+    with torch.no_grad():
+        fresh = KPipeline.infer(model, 'hello', pack, 2, seed=3)
+        miss = pipeline.cached_infer(model, 'hello', pack, 2)
+        hit = pipeline.cached_infer(model, 'hello', pack, 2)
+        assert (pipeline.audio_cache.hits, pipeline.audio_cache.misses) == (1, 1)
+        for output in (miss, hit):
+            assert torch.equal(output.audio, fresh.audio)
+            assert torch.equal(output.pred_dur, fresh.pred_dur)
+        # Unseeded renders are keyed apart from seeded ones
+        pipeline.seed = None
+        pipeline.cached_infer(model, 'hello', pack, 2)
+        assert pipeline.audio_cache.misses == 2
+
+
+def test_seed_refuses_kbatcher(tiny_model):
+    import pytest
+    import torch
+    from kokoro.batcher import KBatcher
+    from kokoro.pipeline import KPipeline
+
+    with KBatcher(tiny_model()) as batcher, pytest.raises(ValueError):
+        KPipeline.infer(batcher, 'hello', torch.randn(510, 1, 256), 2, seed=3)
+
+
+def test_audio_cache_key_covers_model_config(tiny_model):
+    import torch
+    from kokoro.cache import AudioCache
+
+    model = tiny_model()
+    ref_s = torch.randn(1, 256)
+    key = AudioCache.key('abc', ref_s, 1, model.fingerprint)
+    assert key == AudioCache.key('abc', ref_s, 1, tiny_model().fingerprint)
+    assert key != AudioCache.key('abc', ref_s, 1, model.fingerprint, seed=0)
+    assert key != AudioCache.key('abc', ref_s, 1, model.repo_id)
+    model.set_dtype('bfloat16')
+    assert key != AudioCache.key('abc', ref_s, 1, model.fingerprint)
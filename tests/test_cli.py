@@ -0,0 +1,108 @@
+import json
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+import kokoro.__main__
+from kokoro.__main__ import read_batch, run_batch
+
+
+def test_read_batch_directory_and_manifest(tmp_path):
+    texts = tmp_path / 'texts'
+    texts.mkdir()
+    (texts / 'b.txt').write_text('Second.')
+    (texts / 'a.txt').write_text('First.')
+    (texts / 'notes.md').write_text('ignored')
+    jobs = list(read_batch(texts, tmp_path / 'wavs'))
+    assert [j['text'] for j in jobs] == ['First.', 'Second.']
+    assert [j['output'] for j in jobs] == [tmp_path / 'wavs' / 'a.wav', tmp_path / 'wavs' / 'b.wav']
+
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('\n'.join([
+        json.dumps(dict(text='Hello.', output='hello.wav', voice='bf_emma')),
+        '',
+        json.dumps(dict(input=str(texts / 'a.txt'), output=str(tmp_path / 'abs.wav'), speed=1.2)),
+    ]))
+    jobs = list(read_batch(manifest, tmp_path / 'out'))
+    assert jobs[0]['text'] == 'Hello.' and jobs[0]['voice'] == 'bf_emma'
+    assert jobs[0]['output'] == tmp_path / 'out' / 'hello.wav'
+    assert jobs[1]['text'] == 'First.' and jobs[1]['output'] == Path(tmp_path / 'abs.wav')
+
+
+def test_run_batch_reports_errors_per_file(tmp_path, monkeypatch, capsys):
+    torch = pytest.importorskip('torch')
+
+    def pipeline(text, voice, speed, split_pattern, prefetch):
+        if text == 'explode':
+            raise ValueError('no phonemes')
+        yield SimpleNamespace(phonemes=text, audio=torch.zeros(2400))
+    monkeypatch.setattr(kokoro.__main__, 'load_pipeline', lambda lang, pipelines: pipeline)
+
+    (tmp_path / 'taken').write_text('a file, not a directory')
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('\n'.join(json.dumps(job) for job in [
+        dict(text='One.', output='one.wav'),
+        dict(input=str(tmp_path / 'missing.txt'), output='missing.wav'),
+        dict(text='explode', output='explode.wav'),
+        dict(text='Unwritable.', output=str(tmp_path / 'taken' / 'x.wav')),
+        dict(text='Two.', output='two.wav'),
+    ]))
+    reports = run_batch(manifest, tmp_path / 'out', 'a', 'af_heart')
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines == reports
+    assert [Path(r['output']).name for r in reports] == ['one.wav', 'missing.wav', 'explode.wav', 'x.wav', 'two.wav']
+    assert [r.get('error', '').split(':')[0] for r in reports[:3]] == ['', 'FileNotFoundError', 'ValueError']
+    assert 'error' in reports[3] and 'error' not in reports[4]
+    assert reports[0]['audio_s'] == reports[4]['audio_s'] == 0.1
+    assert sorted(p.name for p in (tmp_path / 'out').iterdir()) == ['one.wav', 'two.wav']
+
+
+def test_malformed_manifest_lines_are_reported_not_fatal(tmp_path, monkeypatch, capsys):
+    torch = pytest.importorskip('torch')
+    monkeypatch.setattr(kokoro.__main__, 'load_pipeline', lambda lang, pipelines: (
+        lambda text, **kwargs: iter([SimpleNamespace(audio=torch.zeros(2400))])
+    ))
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('\n'.join([
+        'not json',
+        json.dumps(dict(text='No output.')),
+        json.dumps(dict(output='nothing.wav')),
+        json.dumps(['a', 'list']),
+        json.dumps(dict(text='Fine.', output='fine.wav')),
+    ]))
+    reports = run_batch(manifest, tmp_path / 'out', 'a', 'af_heart')
+    assert [r['input'] for r in reports[:4]] == [f'{manifest}:{n}' for n in range(1, 5)]
+    assert all(r['output'] is None and r['error'] for r in reports[:4])
+    assert reports[4]['output'] == str(tmp_path / 'out' / 'fine.wav') and 'error' not in reports[4]
+    assert len(capsys.readouterr().out.splitlines()) == 5
+
+
+def test_stream_audio_matches_saved_render(tmp_path, monkeypatch, tiny_model):
+    import io
+    import struct
+    import wave
+    from kokoro.audio import wav_header
+    from kokoro.pipeline import KPipeline
+
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.model, pipeline.seed, pipeline.audio_cache = tiny_model(), 3, None
+    pack = pytest.importorskip('torch').randn(510, 1, 256)
+    pipeline.load_voice = lambda voice, device=None: pack
+    # No G2P: each line's letters are its phonemes
+    pipeline.chunk = lambda text, split_pattern: ((i, ps, ps, None) for i, ps in enumerate(text.split('\n')))
+    monkeypatch.setattr(kokoro.__main__, 'load_pipeline', lambda lang, pipelines: pipeline)
+    text = 'hi.\nab c'
+
+    out = io.BytesIO()
+    kokoro.__main__.stream_audio(text, 'a', 'af_heart', speed=3, out=out)
+    streamed = out.getvalue()
+    assert streamed[:44] == wav_header()
+    assert streamed[:4] == b'RIFF' and streamed[8:16] == b'WAVEfmt '
+    assert struct.unpack('<HHIIHH', streamed[20:36]) == (1, 1, 24000, 48000, 2, 16)
+    assert streamed[36:40] == b'data' and (len(streamed) - 44) % 2 == 0
+
+    saved = tmp_path / 'saved.wav'
+    kokoro.__main__.generate_and_save_audio(saved, text, 'a', 'af_heart', speed=3, pipeline=pipeline)
+    with wave.open(str(saved)) as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, 24000)
+        frames = wav.readframes(wav.getnframes())
+    assert len(frames) > 0 and streamed[44:] == frames
@@ -0,0 +1,33 @@
+import pytest
+import torch
+from kokoro.model import KModel, bucket
+
+
+def test_bucket():
+    buckets = [32, 48, 64]
+    assert bucket(1, buckets) == 32
+    assert bucket(32, buckets) == 32
+    assert bucket(33, buckets) == 48
+    assert bucket(64, buckets) == 64
+    assert bucket(65, buckets) == 80
+    assert bucket(100, buckets) == 112
+    assert all(b == bucket(b, KModel.FRAME_BUCKETS) for b in KModel.FRAME_BUCKETS)
+
+
+def test_compiled_forward_matches_forward(tiny_model):
+    # backend='eager' runs the dynamo-captured graphs without codegen, which is
+    # enough to check that bucket padding does not leak into the audio. Source
+    # noise is drawn eagerly per row, so the same seed gives both the same noise
+    pytest.importorskip('torch._dynamo')
+    eager = tiny_model()
+    compiled = tiny_model().compile(token_buckets=[16], frame_buckets=[256], backend='eager')
+    for phonemes in ['hi.', 'abc de']:
+        ref_s = torch.randn(1, 256)
+        torch.manual_seed(1)
+        reference = eager(phonemes, ref_s, 4, return_output=True)
+        torch.manual_seed(1)
+        output = compiled(phonemes, ref_s, 4, return_output=True)
+        assert torch.equal(output.pred_dur, reference.pred_dur)
+        assert output.audio.shape == reference.audio.shape
+        # Seen 0.05-0.09%; a source built over the padded row was ~100%
+        assert (output.audio - reference.audio).norm() <= 1e-2 * reference.audio.norm()
@@ -0,0 +1,42 @@
+import copy
+import torch
+from kokoro.istftnet import Generator, SineGen
+from kokoro.modules import ProsodyPredictor
+
+
+def test_sinegen_runs_in_float32():
+    f0 = (100 + 20 * torch.rand(1, 300, 1)).bfloat16()
+    sines, uv, noise = SineGen(24000, 300, harmonic_num=8)(f0)
+    assert sines.dtype == uv.dtype == torch.float32
+    assert sines.shape == (1, 300, 9)
+
+
+def test_bfloat16_generator_follows_policy():
+    torch.manual_seed(0)
+    generator = Generator(
+        style_dim=8, resblock_kernel_sizes=[3, 7, 11], upsample_rates=[10, 6],
+        upsample_initial_channel=32, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+        upsample_kernel_sizes=[20, 12], gen_istft_n_fft=20, gen_istft_hop_size=5
+    ).eval()
+    reduced = copy.deepcopy(generator).bfloat16()
+    reduced.m_source.float()
+    x, s, f0 = torch.randn(1, 32, 20), torch.randn(1, 8), 100 + 20 * torch.rand(1, 20)
+    with torch.no_grad():
+        torch.manual_seed(1)
+        audio = generator(x, s, f0)
+        torch.manual_seed(1)
+        audio_bf16 = reduced(x.bfloat16(), s.bfloat16(), f0)
+    assert audio_bf16.dtype == torch.float32
+    assert audio_bf16.shape == audio.shape
+    assert torch.isfinite(audio_bf16).all()
+    assert torch.nn.functional.cosine_similarity(audio.flatten(), audio_bf16.flatten(), dim=0) > 0.8
+
+
+def test_bfloat16_duration_encoder_keeps_dtype():
+    torch.manual_seed(0)
+    predictor = ProsodyPredictor(style_dim=4, d_hid=16, nlayers=2).eval().bfloat16()
+    x = torch.randn(1, 16, 9, dtype=torch.bfloat16)
+    s = torch.randn(1, 4, dtype=torch.bfloat16)
+    with torch.no_grad():
+        d = predictor.text_encoder(x, s, torch.LongTensor([9]), torch.zeros(1, 9, dtype=torch.bool))
+    assert d.dtype == torch.bfloat16
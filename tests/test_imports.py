@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+
+HEAVY = ['huggingface_hub', 'misaki', 'numpy', 'spacy', 'torch', 'transformers']
+
+# Generous enough for a cold CI runner; a regression to eager torch or
+# transformers imports costs seconds, not milliseconds
+BUDGET = 1.0
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {heavy} if m in sys.modules)]))
+'''
+
+
+def import_in_subprocess(module):
+    out = subprocess.run(
+        [sys.executable, '-c', SCRIPT.format(module=module, heavy=HEAVY)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out)
+
+
+def test_import_kokoro_is_lazy():
+    elapsed, loaded = import_in_subprocess('kokoro')
+    assert loaded == []
+    assert elapsed < BUDGET, elapsed
+
+
+def test_cli_help_is_lazy():
+    elapsed, loaded = import_in_subprocess('kokoro.__main__')
+    assert loaded == []
+    assert elapsed < BUDGET, elapsed
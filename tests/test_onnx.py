@@ -0,0 +1,79 @@
+import json
+import pytest
+import torch
+
+onnx = pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+from onnx import TensorProto, helper
+from kokoro.onnx import KOnnxModel
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    # Stand-in with the exported signature: waveform = style * speed, duration = input_ids
+    graph = helper.make_graph(
+        [
+            helper.make_node('Reshape', ['style', 'flat'], ['flat_style']),
+            helper.make_node('Mul', ['flat_style', 'speed'], ['waveform']),
+            helper.make_node('Squeeze', ['input_ids', 'axes'], ['duration']),
+        ],
+        'stand_in',
+        [
+            helper.make_tensor_value_info('input_ids', TensorProto.INT64, [1, 'tokens']),
+            helper.make_tensor_value_info('style', TensorProto.FLOAT, [1, 256]),
+            helper.make_tensor_value_info('speed', TensorProto.FLOAT, [1]),
+        ],
+        [
+            helper.make_tensor_value_info('waveform', TensorProto.FLOAT, ['samples']),
+            helper.make_tensor_value_info('duration', TensorProto.INT64, ['tokens']),
+        ],
+        [helper.make_tensor('flat', TensorProto.INT64, [1], [-1]), helper.make_tensor('axes', TensorProto.INT64, [1], [0])],
+    )
+    # Pin the IR version, since newer onnx writes versions older onnxruntime rejects
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)], ir_version=8)
+    helper.set_model_props(model, dict(vocab=json.dumps({'a': 1, 'b': 2}), context_length='8', repo_id='test'))
+    path = tmp_path / 'stand_in.onnx'
+    onnx.save(model, str(path))
+    return str(path)
+
+
+def test_konnxmodel_call_contract(model_path):
+    model = KOnnxModel(model_path, intra_op_threads=1)
+    assert model.vocab == {'a': 1, 'b': 2} and model.context_length == 8
+    ref_s = torch.randn(1, 256)
+    output = model('ab?', ref_s, 2, return_output=True)
+    assert torch.allclose(output.audio, 2 * ref_s.squeeze())
+    assert output.pred_dur.tolist() == [0, 1, 2, 0]
+    # The duration buffer is reused, so returned durations must not alias it
+    model('b', ref_s)
+    assert output.pred_dur.tolist() == [0, 1, 2, 0]
+    with pytest.raises(AssertionError):
+        model('aaaaaaa', ref_s)
+
+
+def test_export_runs_in_konnxmodel(tiny_model, tmp_path):
+    # Exported graphs draw their own source noise, so only durations, lengths
+    # and the deterministic encoder features can match torch exactly
+    from kokoro.onnx import export
+    kmodel = tiny_model(disable_complex=True)
+    ref_s = torch.randn(1, 256)
+    with torch.no_grad():
+        reference = kmodel('hi.', ref_s, return_output=True)
+        features = kmodel.encode('hi.', ref_s)
+    samples = 600 * reference.pred_dur.sum().item()
+
+    path, = export(kmodel, str(tmp_path / 'tiny.onnx'))
+    output = KOnnxModel(path)('hi.', ref_s, return_output=True)
+    assert torch.equal(output.pred_dur, reference.pred_dur)
+    assert output.audio.shape == reference.audio.shape == (samples,)
+    assert torch.isfinite(output.audio).all()
+
+    encoder, decoder = export(kmodel, str(tmp_path / 'tiny.onnx'), split=True)
+    assert (encoder, decoder) == (str(tmp_path / 'tiny.encoder.onnx'), str(tmp_path / 'tiny.decoder.onnx'))
+    staged = KOnnxModel(encoder, decoder=decoder)
+    onnx_features = staged.encode('hi.', ref_s)
+    assert torch.equal(onnx_features.pred_dur, reference.pred_dur)
+    for name in ('asr', 'F0', 'N'):
+        assert torch.allclose(torch.from_numpy(getattr(onnx_features, name)), getattr(features, name), atol=1e-3), name
+    audio = staged.decode(onnx_features)
+    assert audio.shape == (samples,) and torch.isfinite(audio).all()
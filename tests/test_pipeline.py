@@ -0,0 +1,253 @@
+import threading
+import pytest
+from kokoro.pipeline import prefetched
+
+
+def test_prefetched_keeps_order():
+    assert list(prefetched(iter(range(100)), 4)) == list(range(100))
+
+
+def test_prefetched_reraises():
+    def items():
+        yield 1
+        raise ValueError('boom')
+
+    gen = prefetched(items(), 2)
+    assert next(gen) == 1
+    with pytest.raises(ValueError):
+        next(gen)
+
+
+def test_prefetched_bounded_and_stops_on_close():
+    produced = []
+    started = threading.Event()
+
+    def items():
+        for i in range(1000):
+            produced.append(i)
+            started.set()
+            yield i
+
+    gen = prefetched(items(), 3)
+    assert next(gen) == 0
+    started.wait()
+    gen.close()
+    # At most one item in hand, size queued and one blocked in put
+    assert len(produced) <= 5
+
+
+def reference_join_timestamps(tokens, pred_dur):
+    # Per-token loop that KPipeline.join_timestamps used to run
+    if not tokens or len(pred_dur) < 3:
+        return
+    left = right = 2 * max(0, pred_dur[0] - 3)
+    i = 1
+    for t in tokens:
+        if i >= len(pred_dur)-1:
+            break
+        if not t.phonemes:
+            if t.whitespace:
+                i += 1
+                left = right + pred_dur[i]
+                right = left + pred_dur[i]
+                i += 1
+            continue
+        j = i + len(t.phonemes)
+        if j >= len(pred_dur):
+            break
+        t.start_ts = left / 80
+        token_dur = sum(pred_dur[i:j])
+        space_dur = pred_dur[j] if t.whitespace else 0
+        left = right + (2 * token_dur) + space_dur
+        t.end_ts = left / 80
+        right = left + space_dur
+        i = j + (1 if t.whitespace else 0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_join_timestamps_matches_reference(seed):
+    import random
+    import torch
+    from types import SimpleNamespace
+    from kokoro.pipeline import KPipeline
+
+    rng = random.Random(seed)
+    def tokens():
+        rng.seed(seed)
+        return [
+            SimpleNamespace(phonemes=rng.choice(['', 'a', 'hə', 'lˈO', 'wˈɜɹld']), whitespace=rng.choice(['', ' ']),
+                            start_ts=None, end_ts=None)
+            for _ in range(rng.randint(1, 40))
+        ]
+    expected, actual = tokens(), tokens()
+    pred_dur = [rng.randint(1, 20) for _ in range(rng.randint(1, 120))]
+    reference_join_timestamps(expected, pred_dur)
+    KPipeline.join_timestamps(actual, torch.LongTensor(pred_dur))
+    assert [(t.start_ts, t.end_ts) for t in actual] == [(t.start_ts, t.end_ts) for t in expected]
+
+
+def test_subtitles_use_global_offsets():
+    import io
+    import torch
+    from types import SimpleNamespace
+    from kokoro.model import KModel
+    from kokoro.pipeline import KPipeline
+    from kokoro.subtitles import write_subtitles
+
+    def result(text, seconds, tokens=None):
+        output = KModel.Output(audio=torch.zeros(int(seconds * 24000)))
+        return KPipeline.Result(graphemes=text, phonemes='', tokens=tokens, output=output)
+
+    hello = SimpleNamespace(text='Hello', start_ts=0.25, end_ts=0.5)
+    world = SimpleNamespace(text='world', start_ts=0.5, end_ts=1.0)
+    results = [result('Hello world', 1.5, [hello, world]), result('Again.', 2)]
+
+    srt = io.StringIO()
+    assert write_subtitles(results, srt) == 2
+    assert srt.getvalue() == (
+        '1\n00:00:00,250 --> 00:00:01,000\nHello world\n\n'
+        '2\n00:00:01,500 --> 00:00:03,500\nAgain.\n\n'
+    )
+    vtt = io.StringIO()
+    assert write_subtitles(results, vtt, fmt='vtt', words=True) == 2
+    assert vtt.getvalue() == (
+        'WEBVTT\n\n'
+        '00:00:00.250 --> 00:00:00.500\nHello\n\n'
+        '00:00:00.500 --> 00:00:01.000\nworld\n\n'
+    )
+
+
+def test_parse_voice_weights():
+    from kokoro.pipeline import KPipeline
+
+    assert KPipeline.parse_voice('af_heart') == [('af_heart', 1.0)]
+    assert KPipeline.parse_voice('af_bella,af_sky') == [('af_bella', 0.5), ('af_sky', 0.5)]
+    assert KPipeline.parse_voice('af_bella:3, af_sky:1') == [('af_bella', 0.75), ('af_sky', 0.25)]
+    assert KPipeline.parse_voice('C:/voices/a.pt') == [('C:/voices/a.pt', 1.0)]
+    with pytest.raises(ValueError):
+        KPipeline.parse_voice('af_bella:0,af_sky:0')
+
+
+def test_iterate_in_executor_order_errors_and_cancel():
+    import asyncio
+    from kokoro.pipeline import iterate_in_executor
+
+    closed = threading.Event()
+    loop_threads = set()
+
+    def items(n, fail=False):
+        try:
+            for i in range(n):
+                loop_threads.add(threading.get_ident())
+                yield i
+            if fail:
+                raise ValueError('boom')
+        finally:
+            closed.set()
+
+    async def collect(gen):
+        return [i async for i in gen]
+
+    async def main():
+        assert await collect(iterate_in_executor(lambda: items(5))) == list(range(5))
+        assert threading.get_ident() not in loop_threads
+        with pytest.raises(ValueError):
+            await collect(iterate_in_executor(lambda: items(2, fail=True)))
+        closed.clear()
+        gen = iterate_in_executor(lambda: items(1000))
+        async for i in gen:
+            if i == 3:
+                break
+        await gen.aclose()
+
+    asyncio.run(main())
+    assert closed.wait(5)
+
+
+def test_pipelined_order_overlap_errors_and_cancel():
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from kokoro.pipeline import pipelined
+
+    first_threads, second_threads = set(), set()
+
+    def first(i):
+        first_threads.add(threading.get_ident())
+        time.sleep(0.001 * (i % 3))
+        if i == 7:
+            raise ValueError('boom')
+        return i * 10
+
+    def second(x):
+        second_threads.add(threading.get_ident())
+        time.sleep(0.001 * (x % 2))
+        return x + 1
+
+    with ThreadPoolExecutor(1) as a, ThreadPoolExecutor(2) as b:
+        assert list(pipelined(range(7), first, second, a, b)) == [(i, i * 10 + 1) for i in range(7)]
+        assert first_threads.isdisjoint(second_threads)
+        with pytest.raises(ValueError):
+            list(pipelined(range(10), first, second, a, b, lookahead=4))
+
+        started = []
+        gen = pipelined(iter(range(1000)), lambda i: started.append(i) or i, second, a, b, lookahead=3)
+        assert next(gen) == (0, 1)
+        gen.close()
+    assert len(started) <= 4
+
+
+def test_decode_of_encode_is_forward(tiny_model):
+    torch = pytest.importorskip('torch')
+    model = tiny_model()
+    ref_s = torch.randn(1, 256)
+    for phonemes in ['hi.', 'the lazy dog']:
+        torch.manual_seed(1)
+        reference = model(phonemes, ref_s, 2, return_output=True)
+        features = model.encode(phonemes, ref_s, 2)
+        torch.manual_seed(1)
+        audio = model.decode(features).cpu()
+        assert torch.equal(features.pred_dur.cpu(), reference.pred_dur)
+        assert torch.equal(audio, reference.audio)
+
+
+def staged_pipeline(model, chunks, seed=None, audio_cache=None):
+    '''A KPipeline without G2P: chunk yields (text_index, graphemes, phonemes, None).'''
+    from kokoro.pipeline import KPipeline
+    pipeline = KPipeline.__new__(KPipeline)
+    pipeline.model, pipeline.seed, pipeline.audio_cache = model, seed, audio_cache
+    pack = pytest.importorskip('torch').randn(510, 1, 256)
+    pipeline.load_voice = lambda voice, device=None: pack
+    pipeline.chunk = lambda text, split_pattern: iter(chunks)
+    return pipeline, pack
+
+
+def test_staged_order_seed_and_cache(tiny_model):
+    torch = pytest.importorskip('torch')
+    from concurrent.futures import ThreadPoolExecutor
+    from kokoro.cache import AudioCache
+    from kokoro.pipeline import KPipeline
+
+    model = tiny_model()
+    encodes = []
+    encode = model.encode
+    model.encode = lambda ps, ref_s, speed: encodes.append(ps) or encode(ps, ref_s, speed)
+    # Long chunks first, so that with three decoders later ones finish first
+    chunks = [(0, 'g0', 'the lazy dog', None), (0, 'g1', 'hi.', None), (2, 'g2', 'ab', None), (3, 'g3', 'a b c', None)]
+    pipeline, pack = staged_pipeline(model, chunks, seed=5, audio_cache=AudioCache(dtype='float32'))
+    expected = [KPipeline.infer(model, ps, pack, 3, seed=5) for _, _, ps, _ in chunks]
+    encodes.clear()
+
+    def render():
+        with ThreadPoolExecutor(3) as decoders:
+            return list(pipeline.staged('ignored', voice='v', speed=3, decoder=decoders))
+
+    for run in range(2):
+        results = render()
+        assert [(r.text_index, r.graphemes, r.phonemes) for r in results] == [c[:3] for c in chunks]
+        for result, reference in zip(results, expected):
+            # Seeded decodes on several threads still match a seeded infer
+            assert torch.equal(result.audio, reference.audio)
+            assert torch.equal(result.pred_dur, reference.pred_dur)
+    # The second run was served from the cache without encoding
+    assert encodes == [ps for _, _, ps, _ in chunks]
+    assert (pipeline.audio_cache.hits, pipeline.audio_cache.misses) == (4, 4)
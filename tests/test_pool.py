@@ -0,0 +1,138 @@
+import pytest
+import torch
+from multiprocessing import shared_memory
+from kokoro.model import KModel
+from kokoro.pipeline import KPipeline
+from kokoro.pool import _share, _take
+
+
+def test_shared_memory_roundtrip():
+    audio = torch.rand(24000) * 2 - 1
+    name, samples = _share(audio)
+    assert samples == 24000
+    assert torch.equal(_take(name, samples), audio)
+    # _take frees the block
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+class FakeModel:
+    Output = KModel.Output
+
+    def __init__(self, **kwargs):
+        pass
+
+    def to(self, device):
+        return self
+
+    def prepare_for_inference(self):
+        return self
+
+
+class FakePipeline:
+    '''Stands in for KPipeline in forked workers: "<index> <chunks>" renders
+    chunks of audio filled with index, and "boom" raises. Low indices are
+    slowest, so workers finish out of order.'''
+    Result = KPipeline.Result
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __call__(self, text, voice, speed):
+        import time
+        from types import SimpleNamespace
+        text, = text
+        if text == 'boom':
+            raise ValueError('boom')
+        index, chunks = map(int, text.split())
+        time.sleep(0.05 / (1 + index))
+        for n in range(chunks):
+            yield SimpleNamespace(
+                graphemes=text, phonemes=str(n), tokens=None,
+                audio=torch.full((100 + n,), float(index)), pred_dur=torch.LongTensor([n])
+            )
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    import multiprocessing as mp
+    import kokoro.model
+    import kokoro.pool
+    if 'fork' not in mp.get_all_start_methods():
+        pytest.skip('needs fork to inherit monkeypatched classes')
+    monkeypatch.setattr(kokoro.model, 'KModel', FakeModel)
+    monkeypatch.setattr(kokoro.pool, 'KPipeline', FakePipeline)
+    with kokoro.pool.KPool('a', repo_id='fake', processes=3, start_method='fork', prefetch=4) as pool:
+        yield pool
+
+
+def _blocks():
+    import os
+    return {f for f in os.listdir('/dev/shm') if f.startswith('psm_')} if os.path.isdir('/dev/shm') else set()
+
+
+def test_pool_reassembles_in_text_order(pool):
+    text = [f'{i} {1 + i % 3}' for i in range(10)]
+    text.insert(4, '  ')
+    results = list(pool(text, voice='fake'))
+    expected = [(i, n) for i, t in enumerate(text) if t.strip() for n in range(int(t.split()[1]))]
+    assert [(r.text_index, int(r.phonemes)) for r in results] == expected
+    for r in results:
+        assert r.graphemes == text[r.text_index]
+        assert torch.all(r.audio == int(r.graphemes.split()[0]))
+        assert r.audio.shape == (100 + int(r.phonemes),)
+        assert r.pred_dur.tolist() == [int(r.phonemes)]
+
+
+def test_pool_early_stop_frees_shared_memory(pool):
+    before = _blocks()
+    text = [f'{i} 3' for i in range(12)]
+    results = pool(text, voice='fake')
+    first = next(results)
+    assert (first.text_index, first.phonemes) == (0, '0')
+    results.close()
+    # Submitted segments were drained and their blocks unlinked
+    assert _blocks() == before
+    # and the next job sees none of the abandoned job's results
+    assert [r.text_index for r in pool(['7 1', '8 1'], voice='fake')] == [0, 1]
+
+
+def test_pool_propagates_errors(pool):
+    with pytest.raises(RuntimeError, match='ValueError: boom'):
+        list(pool(['0 1', 'boom', '2 1'], voice='fake'))
+    # Workers survive, and the failed job's late results are skipped
+    results = list(pool(['3 2', '4 1'], voice='fake'))
+    assert [(r.text_index, r.graphemes) for r in results] == [(0, '3 2'), (0, '3 2'), (1, '4 1')]
+
+
+def test_pool_calls_overlap(pool):
+    first = pool([f'{i} 2' for i in range(4)], voice='fake')
+    second = pool(['5 1', '6 1'], voice='fake')
+    # Interleaved on one thread: a held lock would deadlock here
+    assert next(first).text_index == 0
+    assert [r.graphemes for r in second] == ['5 1', '6 1']
+    assert [(r.text_index, r.phonemes) for r in first] == [(0, '1')] + [(i, n) for i in range(1, 4) for n in '01']
+    # An abandoned, uncollected generator does not block later calls
+    abandoned = pool(['7 3', '8 3'], voice='fake')
+    next(abandoned)
+    assert [r.graphemes for r in pool(['9 1'], voice='fake')] == ['9 1']
+    abandoned.close()
+
+
+def test_pool_close_frees_results_left_in_flight(monkeypatch):
+    import multiprocessing as mp
+    import kokoro.model
+    import kokoro.pool
+    if 'fork' not in mp.get_all_start_methods():
+        pytest.skip('needs fork to inherit monkeypatched classes')
+    monkeypatch.setattr(kokoro.model, 'KModel', FakeModel)
+    monkeypatch.setattr(kokoro.pool, 'KPipeline', FakePipeline)
+    before = _blocks()
+    pool = kokoro.pool.KPool('a', repo_id='fake', processes=3, start_method='fork', prefetch=6)
+    # boom fails at once, while the segments submitted after it are still rendering
+    with pytest.raises(RuntimeError, match='boom'):
+        list(pool(['boom'] + [f'{i} 3' for i in range(5)], voice='fake'))
+    pool.close()
+    assert _blocks() == before
+    with pytest.raises(RuntimeError, match='closed'):
+        next(pool(['1 1'], voice='fake'))
@@ -0,0 +1,21 @@
+import json
+import torch
+from kokoro.profiling import ChromeTrace, StageEvent, run_stage
+
+
+def test_run_stage_records_shapes(tmp_path):
+    events = []
+    trace = ChromeTrace()
+    linear = torch.nn.Linear(4, 3)
+    out = run_stage([events.append, trace], 'bert_encoder', linear, torch.randn(2, 5, 4))
+    assert out.shape == (2, 5, 3)
+    (event,) = events
+    assert isinstance(event, StageEvent) and event.name == 'bert_encoder'
+    assert event.inputs == [(2, 5, 4)] and event.outputs == [(2, 5, 3)]
+    assert event.duration >= 0
+
+    path = tmp_path / 'trace.json'
+    trace.save(str(path))
+    (record,) = json.loads(path.read_text())['traceEvents']
+    assert record['name'] == 'bert_encoder' and record['ph'] == 'X'
+    assert record['args']['outputs'] == [[2, 5, 3]]
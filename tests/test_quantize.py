@@ -0,0 +1,51 @@
+import torch
+from kokoro.fidelity import log_spectral_distance
+from kokoro.modules import ProsodyPredictor, prepare_style
+
+
+def test_quantized_predictor_with_prepared_style():
+    torch.manual_seed(0)
+    predictor = ProsodyPredictor(style_dim=4, d_hid=16, nlayers=2).eval()
+    s = torch.randn(1, 4)
+    x = torch.randn(1, 16, 9)
+    lengths = torch.LongTensor([9])
+    m = torch.zeros(1, 9, dtype=torch.bool)
+    with torch.no_grad():
+        d_fp32 = predictor.text_encoder(x, s, lengths, m)
+        torch.ao.quantization.quantize_dynamic(
+            predictor, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8, inplace=True
+        )
+        # Without folded LSTMs, a Style still concatenates its raw style channels
+        style = prepare_style(predictor, s)
+        d = predictor.text_encoder(x, s, lengths, m)
+        assert torch.allclose(d, predictor.text_encoder(x, style, lengths, m), atol=1e-6)
+        assert torch.allclose(d, d_fp32, atol=0.1)
+        F0, N = predictor.F0Ntrain(d.transpose(-1, -2), s)
+        F0_style, N_style = predictor.F0Ntrain(d.transpose(-1, -2), style)
+        assert torch.allclose(F0, F0_style, atol=1e-6)
+        assert torch.allclose(N, N_style, atol=1e-6)
+
+
+def test_log_spectral_distance():
+    torch.manual_seed(0)
+    a = torch.randn(24000)
+    assert log_spectral_distance(a, a) == 0
+    assert log_spectral_distance(a, a + 0.5 * torch.randn(24000)) > 0
+
+
+def test_compare_reports_fidelity(tiny_model):
+    from kokoro.fidelity import compare
+    torch.manual_seed(1)
+    pack = torch.randn(510, 1, 256)
+    corpus = ['hi.', 'a b']
+    reference = tiny_model()
+    same = compare(reference, tiny_model(), pack, corpus, repeat=1)
+    assert same['duration_match'] == 1 and same['lsd_db'] == 0 and same['lsd_lines'] == 2
+    assert [line['phonemes'] for line in same['lines']] == corpus
+    assert all(line['audio_s'] > 0 for line in same['lines'])
+
+    report = compare(reference, tiny_model().quantize('int8'), pack, corpus, repeat=1)
+    assert 0 <= report['duration_match'] <= 1
+    assert report['lsd_lines'] == sum(line['duration_match'] == 1 for line in report['lines'])
+    assert report['lsd_db'] is None or report['lsd_db'] > 0
+    assert report['speedup'] > 0 and report['candidate_s'] > 0
@@ -0,0 +1,28 @@
+import pytest
+import torch
+from kokoro.modules import TextEncoder, fold_weight_norm, load_safetensors, save_safetensors
+
+pytest.importorskip('safetensors')
+
+
+def build():
+    return TextEncoder(channels=16, kernel_size=5, depth=3, n_symbols=20).eval()
+
+
+@pytest.mark.parametrize("fold", [True, False])
+def test_roundtrip(tmp_path, fold):
+    torch.manual_seed(0)
+    source = build()
+    if fold:
+        fold_weight_norm(source)
+    path = str(tmp_path / 'model.safetensors')
+    save_safetensors(source, path, metadata=dict(repo_id='test'))
+
+    torch.manual_seed(1)
+    target = build()
+    metadata = load_safetensors(target, path)
+    assert metadata['repo_id'] == 'test'
+    assert metadata['weight_norm'] == ('folded' if fold else 'parametrized')
+    inputs = torch.randint(0, 20, (2, 9)), torch.LongTensor([9, 6]), torch.arange(9).unsqueeze(0) >= torch.LongTensor([[9], [6]])
+    with torch.no_grad():
+        assert torch.equal(source(*inputs), target(*inputs))
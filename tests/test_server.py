@@ -0,0 +1,153 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+import torch
+from kokoro.audio import wav_header
+from kokoro.server import KServer
+
+
+class FakePipeline:
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.closed = threading.Event()
+
+    def __call__(self, text, voice=None, speed=1):
+        try:
+            for i, line in enumerate(text.split('\n')):
+                if self.gate is not None:
+                    self.gate.wait()
+                token = SimpleNamespace(text=line, start_ts=0.0, end_ts=0.1)
+                yield SimpleNamespace(text_index=i, graphemes=line, phonemes=line, tokens=[token],
+                                      audio=torch.full((240 * (i + 1),), 0.5))
+        finally:
+            self.closed.set()
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = b'' if body is None else json.dumps(body).encode()
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := (await reader.readline()).strip()):
+        k, _, v = line.decode().partition(':')
+        headers[k.lower()] = v.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while (n := int((await reader.readline()).strip(), 16)):
+            body += await reader.readexactly(n)
+            await reader.readline()
+    else:
+        body = await reader.read()
+    writer.close()
+    return status, headers, body
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_health_ready_and_wav_stream():
+    async def main():
+        server = KServer()
+        _, port = await server.start('127.0.0.1', 0)
+        assert (await request(port, 'GET', '/health'))[0] == 200
+        assert (await request(port, 'GET', '/ready'))[0] == 503
+        await server.load(lambda: dict(a=FakePipeline()))
+        assert (await request(port, 'GET', '/ready'))[0] == 200
+
+        status, headers, body = await request(port, 'POST', '/tts', dict(text='one\ntwo', voice='af_heart'))
+        assert status == 200 and headers['content-type'] == 'audio/wav'
+        assert body[:44] == wav_header() and len(body) == 44 + 2 * (240 + 480)
+
+        status, _, body = await request(port, 'POST', '/tts', dict(text='one\ntwo', format='sse'))
+        events = [e for e in body.decode().split('\n\n') if e]
+        assert len(events) == 3 and events[-1].startswith('event: done')
+        first = json.loads(events[0].split('data: ', 1)[1])
+        assert first['graphemes'] == 'one' and first['tokens'][0]['end_ts'] == 0.1
+        second = json.loads(events[1].split('data: ', 1)[1])
+        assert second['offset'] == pytest.approx(0.01)
+
+        assert (await request(port, 'POST', '/tts', dict(text='hi', voice='zf_xiaobei')))[0] == 400
+        assert (await request(port, 'GET', '/tts'))[0] == 405
+        await server.close()
+    run(main())
+
+
+def test_queue_full_returns_429():
+    async def main():
+        gate = threading.Event()
+        pipeline = FakePipeline(gate)
+        server = KServer(dict(a=pipeline), max_concurrency=1, max_queue=0)
+        _, port = await server.start('127.0.0.1', 0)
+        first = asyncio.create_task(request(port, 'POST', '/tts', dict(text='one', voice='af_heart')))
+        while server.pending == 0:
+            await asyncio.sleep(0.01)
+        status, headers, _ = await request(port, 'POST', '/tts', dict(text='two', voice='af_heart'))
+        assert status == 429 and headers['retry-after'] == '1'
+        gate.set()
+        assert (await first)[0] == 200
+        assert pipeline.closed.wait(5)
+        await server.close()
+    run(main())
+
+
+def test_bad_fields_are_400_not_500():
+    from loguru import logger
+
+    async def main():
+        server = KServer(dict(a=FakePipeline()))
+        _, port = await server.start('127.0.0.1', 0)
+        for body in [dict(text='hi', voice=''), dict(text='hi', voice=7), dict(text='hi', voice=['af']),
+                     dict(text='hi', lang=['a']), dict(text='hi', speed=[1]), dict(text='hi', speed='fast')]:
+            assert (await request(port, 'POST', '/tts', body))[0] == 400, body
+        await server.close()
+
+    errors = []
+    handler = logger.add(lambda message: errors.append(message), level='ERROR')
+    logger.enable('kokoro')
+    try:
+        run(main())
+    finally:
+        logger.disable('kokoro')
+        logger.remove(handler)
+    assert errors == []
+
+
+def test_client_disconnect_mid_stream_is_not_an_error():
+    import time
+    from loguru import logger
+
+    class SlowPipeline(FakePipeline):
+        def __call__(self, text, voice=None, speed=1):
+            for result in super().__call__(text, voice, speed):
+                time.sleep(0.01)
+                yield result
+
+    async def main():
+        pipeline = SlowPipeline()
+        server = KServer(dict(a=pipeline))
+        _, port = await server.start('127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        data = json.dumps(dict(text='\n'.join(['x'] * 500))).encode()
+        writer.write(f'POST /tts HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data)
+        await writer.drain()
+        await reader.readline()
+        # Reset rather than a clean close, so the server's next drain fails
+        writer.transport.abort()
+        assert await asyncio.to_thread(pipeline.closed.wait, 10)
+        await server.close()
+
+    messages = []
+    handler = logger.add(lambda message: messages.append(message.record), level='DEBUG')
+    logger.enable('kokoro')
+    try:
+        run(main())
+    finally:
+        logger.disable('kokoro')
+        logger.remove(handler)
+    assert any(m['message'].startswith('Client disconnected') for m in messages)
+    assert not [m for m in messages if m['level'].no >= 40]
@@ -0,0 +1,78 @@
+import torch
+import pytest
+from kokoro.istftnet import Generator
+
+
+@pytest.fixture
+def generator():
+    torch.manual_seed(0)
+    return Generator(
+        style_dim=8, resblock_kernel_sizes=[3, 7, 11], upsample_rates=[10, 6],
+        upsample_initial_channel=32, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+        upsample_kernel_sizes=[20, 12], gen_istft_n_fft=20, gen_istft_hop_size=5
+    ).eval()
+
+
+@pytest.fixture
+def inputs():
+    torch.manual_seed(1)
+    T = 50
+    return torch.randn(1, 32, T), torch.randn(1, 8), 100 + 20 * torch.rand(1, T)
+
+
+def test_single_window_matches_forward(generator, inputs):
+    x, s, f0 = inputs
+    with torch.no_grad():
+        torch.manual_seed(2)
+        full = generator(x, s, f0)
+        torch.manual_seed(2)
+        pieces = list(generator.stream(x, s, f0, window=x.shape[-1], overlap=0))
+    assert len(pieces) == 1
+    assert torch.allclose(pieces[0], full, atol=1e-6)
+
+
+@pytest.mark.parametrize("window,overlap", [(8, 4), (16, 2), (12, 0), (10, 10), (80, 8)])
+def test_pieces_cover_forward(generator, window, overlap):
+    from kokoro.fidelity import log_spectral_distance
+    torch.manual_seed(1)
+    T = 200
+    # A drifting input, so per-window statistics differ from whole-chunk ones
+    x, s, f0 = torch.randn(1, 32, T) + torch.linspace(-1, 1, T), torch.randn(1, 8), 100 + 20 * torch.rand(1, T)
+    with torch.no_grad():
+        torch.manual_seed(2)
+        full = generator(x, s, f0).flatten()
+        torch.manual_seed(2)
+        pieces = [p.flatten() for p in generator.stream(x, s, f0, window=window, overlap=overlap)]
+    assert len(pieces) > 1
+    audio = torch.cat(pieces)
+    assert audio.shape == full.shape
+    if overlap:
+        assert (audio - full).norm() <= 0.1 * full.norm()
+        assert log_spectral_distance(audio, full) < 2.0
+    offset = 0
+    for piece in pieces:
+        target = full[offset:offset + len(piece)]
+        offset += len(piece)
+        assert torch.nn.functional.cosine_similarity(piece, target, dim=0) > (0.99 if overlap else 0.9)
+
+
+def test_forward_stream_within_tolerance(tiny_model):
+    from kokoro.fidelity import log_spectral_distance
+    model = tiny_model()
+    ref_s = torch.randn(1, 256)
+    with torch.no_grad():
+        torch.manual_seed(2)
+        full = model('hello world, how are you', ref_s, 2)
+        torch.manual_seed(2)
+        pieces = list(model.forward_stream('hello world, how are you', ref_s, 2))
+    assert len(pieces) > 2
+    audio = torch.cat(pieces)
+    assert audio.shape == full.shape
+    # Measured with the defaults: about 4% and 0.8 dB
+    assert (audio - full).norm() <= 0.1 * full.norm()
+    assert log_spectral_distance(audio, full) < 1.5
+    offset = 0
+    for piece in pieces:
+        target = full[offset:offset + len(piece)]
+        offset += len(piece)
+        assert torch.nn.functional.cosine_similarity(piece, target, dim=0) > 0.99
@@ -0,0 +1,67 @@
+import torch
+from kokoro.istftnet import AdainResBlk1d
+from kokoro.modules import ProsodyPredictor, prepare_style
+
+
+def test_prepared_style_matches_tensor():
+    torch.manual_seed(0)
+    predictor = ProsodyPredictor(style_dim=4, d_hid=16, nlayers=2).eval()
+    s = torch.randn(1, 4)
+    weights = {}
+    lstms = [m for m in predictor.text_encoder.lstms if isinstance(m, torch.nn.LSTM)]
+    style = prepare_style(predictor, s, lstms + [predictor.lstm, predictor.shared], weights)
+    x = torch.randn(1, 16, 9)
+    lengths = torch.LongTensor([9])
+    m = torch.zeros(1, 9, dtype=torch.bool)
+    with torch.no_grad():
+        d = predictor.text_encoder(x, s, lengths, m)
+        d_folded = predictor.text_encoder(x, style, lengths, m)
+        assert torch.allclose(d[..., :16], d_folded, atol=1e-5)
+        y, _ = predictor.lstm(d)
+        y_folded, _ = style.lstm[predictor.lstm](d_folded)
+        assert torch.allclose(y, y_folded, atol=1e-5)
+        en = d.transpose(-1, -2)
+        F0, N = predictor.F0Ntrain(en, s)
+        F0_folded, N_folded = predictor.F0Ntrain(en[:, :16], style)
+        assert torch.allclose(F0, F0_folded, atol=1e-5)
+        assert torch.allclose(N, N_folded, atol=1e-5)
+    # The x slice of each W_ih is shared across voices
+    other = prepare_style(predictor, torch.randn(1, 4), [predictor.shared], weights)
+    assert other.lstm[predictor.shared].weight_ih_l0 is style.lstm[predictor.shared].weight_ih_l0
+
+
+def test_prepared_style_adain_resblk():
+    torch.manual_seed(0)
+    block = AdainResBlk1d(16, 8, style_dim=4, upsample=True).eval()
+    s = torch.randn(1, 4)
+    x = torch.randn(1, 16, 11)
+    with torch.no_grad():
+        assert torch.allclose(block(x, s), block(x, prepare_style(block, s)), atol=1e-6)
+
+
+def test_forward_with_cached_voice_matches_plain(tiny_model, monkeypatch):
+    import kokoro.model
+    prepared = []
+    monkeypatch.setattr(kokoro.model, 'prepare_style', lambda *args: prepared.append(args[0]) or prepare_style(*args))
+    plain = tiny_model()
+    cached = tiny_model(voice_cache_size=2)
+    ref_s = torch.randn(1, 256)
+    for phonemes in ['hi.', 'the lazy dog', 'hi.']:
+        torch.manual_seed(1)
+        reference = plain(phonemes, ref_s, 2, return_output=True)
+        torch.manual_seed(1)
+        output = cached(phonemes, ref_s, 2, return_output=True)
+        assert torch.equal(output.pred_dur, reference.pred_dur)
+        # Folding the style into the biases only reorders float sums: ~4e-7
+        assert (output.audio - reference.audio).norm() <= 1e-6 * reference.audio.norm()
+    # One voice, prepared once (predictor and decoder) and then served from the cache
+    assert len(prepared) == 2 and len(cached.voice_cache) == 1
+    voice = cached.prepare_voice(ref_s)
+    assert next(iter(cached.voice_cache.values())) is voice
+    # A prepared voice passed explicitly on the uncached model takes the same path
+    torch.manual_seed(1)
+    audio, pred_dur = plain.forward_with_tokens(plain._input_ids('hi.'), plain.prepare_voice(ref_s), 2)
+    torch.manual_seed(1)
+    reference = plain('hi.', ref_s, 2, return_output=True)
+    assert torch.equal(pred_dur.cpu(), reference.pred_dur)
+    assert (audio.squeeze().cpu() - reference.audio).norm() <= 1e-6 * reference.audio.norm()
@@ -0,0 +1,32 @@
+import pytest
+import torch
+from kokoro.voices import BankVoice, VoiceBank
+
+
+@pytest.mark.parametrize("dtype, atol", [('float32', 0), ('float16', 1e-3)])
+def test_bank_roundtrip(tmp_path, dtype, atol):
+    torch.manual_seed(0)
+    voices = {name: torch.rand(510, 1, 256) * 2 - 1 for name in ['af_heart', 'af_bella', 'am_adam']}
+    path = str(tmp_path / 'voices.kvb')
+    VoiceBank.build(path, voices, dtype=dtype)
+    bank = VoiceBank(path)
+    assert bank.names == list(voices) and len(bank) == 3
+    assert 'af_bella' in bank and 'bf_emma' not in bank
+    for name, pack in voices.items():
+        voice = bank[name]
+        assert isinstance(voice, BankVoice) and voice.shape == pack.shape
+        for i in [0, 41, 509]:
+            row = voice[i]
+            assert row.dtype == torch.float32 and row.shape == (1, 256)
+            assert torch.allclose(row, pack[i], atol=atol)
+        assert torch.allclose(voice.load(), pack, atol=atol)
+
+
+def test_bank_voice_in_infer(tmp_path):
+    from kokoro.pipeline import KPipeline
+
+    pack = torch.randn(510, 1, 256)
+    voice = VoiceBank.build(str(tmp_path / 'voices.kvb'), dict(af_heart=pack), dtype='float32')['af_heart']
+    model = lambda ps, ref_s, speed, return_output: ref_s
+    ref_s = KPipeline.infer(model, 'həlˈO', voice.to('cpu'))
+    assert torch.equal(ref_s, pack[4])
@@ -0,0 +1,38 @@
+import torch
+import pytest
+from kokoro.istftnet import AdainResBlk1d, Generator
+from kokoro.modules import TextEncoder, fold_weight_norm
+
+
+def build_text_encoder():
+    return TextEncoder(channels=16, kernel_size=5, depth=3, n_symbols=20), lambda: (
+        torch.randint(0, 20, (2, 9)), torch.LongTensor([9, 6]),
+        torch.arange(9).unsqueeze(0) >= torch.LongTensor([[9], [6]])
+    )
+
+def build_adain_resblk():
+    return AdainResBlk1d(16, 8, style_dim=4, upsample=True), lambda: (torch.randn(2, 16, 12), torch.randn(2, 4))
+
+def build_generator():
+    return Generator(
+        style_dim=8, resblock_kernel_sizes=[3, 7, 11], upsample_rates=[10, 6],
+        upsample_initial_channel=32, resblock_dilation_sizes=[[1, 3, 5]] * 3,
+        upsample_kernel_sizes=[20, 12], gen_istft_n_fft=20, gen_istft_hop_size=5
+    ), lambda: (torch.randn(1, 32, 10), torch.randn(1, 8), 100 + 20 * torch.rand(1, 10))
+
+
+@pytest.mark.parametrize("build", [build_text_encoder, build_adain_resblk, build_generator])
+def test_folding_preserves_outputs(build):
+    torch.manual_seed(0)
+    module, make_inputs = build()
+    module.eval()
+    inputs = make_inputs()
+    with torch.no_grad():
+        torch.manual_seed(1)
+        expected = module(*inputs)
+        assert fold_weight_norm(module) > 0
+        assert fold_weight_norm(module) == 0
+        torch.manual_seed(1)
+        actual = module(*inputs)
+    assert not any('parametrizations' in k for k in module.state_dict())
+    assert torch.allclose(actual, expected, atol=1e-5)